@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк проверки доступности на 1000 локальных заглушках (отдельный адрес 127.x.y.z
+на каждую, ответ с задержкой). Как было - /api/check-availability проверял один адрес
+за запрос новым httpx.AsyncClient, обход каталога шел по одному сервису; как стало -
+AvailabilityChecker: общий пул соединений и параллельные проверки в режимах http и tcp,
+повторный обход из кэша
+"""
+import argparse
+import asyncio
+import contextlib
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+
+from availability_checker import AvailabilityChecker
+from config import config
+from http_client import http_clients
+
+PORT = 18080
+
+
+async def check_service_availability(address: str, port: Optional[int] = None) -> bool:
+    """Прежняя проверка из routes.py"""
+    try:
+        url = f"http://{address}:{port}" if port else address
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.head(url)
+            return response.status_code < 400
+    except:
+        return False
+
+
+class StubEndpoints:
+    """HTTP-заглушки в отдельном потоке со своим event loop, чтобы не мешать замеряемому"""
+
+    def __init__(self, count: int, latency: float):
+        self.count = count
+        self.latency = latency
+        self.targets: List[Tuple[str, int]] = [(f"127.0.{1 + i // 250}.{1 + i % 250}", PORT) for i in range(count)]
+        self._connections = {}
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[asyncio.current_task()] = writer
+        with contextlib.suppress(OSError, asyncio.IncompleteReadError):
+            # keep-alive: отвечаем на каждый запрос в соединении
+            while await reader.readuntil(b"\r\n\r\n"):
+                await asyncio.sleep(self.latency)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        writer.close()
+        self._connections.pop(asyncio.current_task(), None)
+
+    async def _start(self):
+        self._servers = [await asyncio.start_server(self._handle, host, port) for host, port in self.targets]
+        self._ready.set()
+
+    async def _stop(self):
+        for server in self._servers:
+            server.close()
+        # Закрытие соединения завершает обработчик: readuntil получает конец потока
+        handlers = list(self._connections)
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._loop.run_forever()
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+async def timed(label: str, sweep) -> float:
+    started = time.perf_counter()
+    results = await sweep()
+    elapsed = time.perf_counter() - started
+    available = sum(1 for result in results if result is True or (isinstance(result, dict) and result["available"]))
+    print(f"  {label:<34} {elapsed * 1000:9.0f} ms  доступно: {available}/{len(results)}")
+    return elapsed
+
+
+async def run(args, targets: List[Tuple[str, int]]):
+    old_targets = targets[:args.old_sample]
+
+    async def old_sweep():
+        return [await check_service_availability(address, port) for address, port in old_targets]
+
+    old = await timed(f"по одному, новый клиент ({len(old_targets)})", old_sweep)
+    # Прежний обход масштабируется линейно: пересчет на весь набор
+    before = old * len(targets) / len(old_targets)
+    print(f"    на {len(targets)} адресов: ~{before * 1000:.0f} ms")
+
+    checker = AvailabilityChecker(concurrency=args.concurrency)
+    http = await timed(f"параллельно http, по {args.concurrency}",
+                       lambda: checker.check_many(targets, "http", use_cache=False))
+    tcp = await timed(f"параллельно tcp, по {args.concurrency}",
+                      lambda: checker.check_many(targets, "tcp", use_cache=False))
+    await timed("повторно из кэша", lambda: checker.check_many(targets, "http"))
+    print(f"    ускорение: http x{before / http:.0f}, tcp x{before / tcp:.0f}")
+    await http_clients.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка доступности: по одному адресу против AvailabilityChecker")
+    parser.add_argument("--endpoints", type=int, default=1000, help="заглушек (по умолчанию 1000)")
+    parser.add_argument("--latency", type=float, default=20, help="задержка ответа заглушки, ms (по умолчанию 20)")
+    parser.add_argument("--concurrency", type=int, default=config.AVAILABILITY_CONCURRENCY,
+                        help=f"одновременных проверок (по умолчанию AVAILABILITY_CONCURRENCY={config.AVAILABILITY_CONCURRENCY})")
+    parser.add_argument("--old-sample", type=int, default=200,
+                        help="сколько адресов проверить прежним способом (по умолчанию 200)")
+    args = parser.parse_args()
+
+    with StubEndpoints(args.endpoints, args.latency / 1000) as stubs:
+        print(f"{args.endpoints} заглушек, задержка ответа {args.latency} ms")
+        asyncio.run(run(args, stubs.targets))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Сравнение форматов хранения сырых метрик: server_metrics (DatabaseStorage: UUID, текстовый
+service_id и ISO-время в каждой строке) против metric_samples (ColumnarStorage).
+Размер файла БД после VACUUM и время типичных чтений на одинаковых данных
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+
+from bench_report import STORAGES, fill
+from models import InsertService
+
+
+async def measure(label: str, read, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = await read()
+        best = min(best, time.perf_counter() - started)
+    print(f"    {label:<26} {best * 1000:9.1f} ms  ({len(rows)} строк)")
+    return best
+
+
+async def run_storage(kind: str, args, end: datetime) -> int:
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-columnar-"), "services.db")
+    storage = STORAGES[kind](path)
+    services = [
+        await storage.create_service(InsertService(name=f"server {i}", category="Infrastructure", region="Production"))
+        for i in range(args.services)
+    ]
+    fill(storage, [service.id for service in services], args.samples, end)
+    storage._executor.write_sync(lambda conn: conn.execute("VACUUM"))
+    # В режиме WAL результат VACUUM лежит в -wal до контрольной точки
+    storage._executor.write_sync(lambda conn: conn.execute("PRAGMA wal_checkpoint(TRUNCATE)"))
+    size = os.path.getsize(path)
+    print(f"  {kind}: {size / 1024 / 1024:.1f} MB")
+
+    service_id = services[0].id
+    await measure("все сэмплы", lambda: storage.get_server_metrics(use_cache=False), args.repeat)
+    await measure("один сервис", lambda: storage.get_server_metrics(service_id, use_cache=False), args.repeat)
+    await measure("первая страница (1000)", lambda: storage.get_server_metrics(limit=1000, use_cache=False), args.repeat)
+    await measure("интервалы step=300", lambda: storage.get_server_metrics_buckets(300, use_cache=False), args.repeat)
+    storage.close()
+    return size
+
+
+async def run(args):
+    end = datetime.now()
+    print(f"{args.samples} сэмплов за сутки, {args.services} сервисов, лучший из {args.repeat}:")
+    row_size = await run_storage("row", args, end)
+    columnar_size = await run_storage("columnar", args, end)
+    print(f"    размер: в {row_size / columnar_size:.1f} раза меньше")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Размер и скорость чтения строкового и колоночного форматов метрик")
+    parser.add_argument("--samples", type=int, default=200000, help="сэмплов (по умолчанию 200000)")
+    parser.add_argument("--services", type=int, default=20, help="сервисов (по умолчанию 20)")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов, берется лучший результат")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
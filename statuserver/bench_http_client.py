@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк HTTP-клиента интеграций: новый httpx.AsyncClient на каждый запрос (как было)
+против общего пула keep-alive соединений (http_client). Один цикл - запросы пакетного
+опроса Metrics API: четыре общих эндпоинта и по запросу на сервер. Заглушка - локальный
+HTTP/1.1-сервер, который считает установленные соединения
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+
+import httpx
+
+from config import config
+from http_client import http_clients, request_timeout
+
+ENDPOINTS = ["/metrics/servers/all", "/metrics/servers", "/metrics/cpu/usage", "/metrics/memory/usage"]
+
+
+class StubUpstream:
+    """Минимальный keep-alive HTTP-сервер: одинаковый JSON на любой GET"""
+
+    def __init__(self, handshake: float):
+        self.handshake = handshake
+        self.connections = 0
+        self.requests = 0
+        body = json.dumps({"server_name": "server", "cpu_usage": 42.0, "memory_usage": 40.0}).encode()
+        self._response = (
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n" % len(body) + body
+        )
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        # Задержка на новом соединении - стоимость установки (RTT, TLS) в реальной сети
+        if self.handshake:
+            await asyncio.sleep(self.handshake)
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                self.requests += 1
+                writer.write(self._response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def per_request_get(url: str) -> httpx.Response:
+    """Как было: клиент (и соединение) создается и закрывается на каждый запрос"""
+    async with httpx.AsyncClient(timeout=config.METRICS_API_TIMEOUT) as client:
+        return await client.get(url)
+
+
+async def pooled_get(url: str) -> httpx.Response:
+    return await http_clients.client.get(url, timeout=request_timeout(config.METRICS_API_TIMEOUT))
+
+
+async def measure(label: str, get, upstream: StubUpstream, base_url: str, servers: int, cycles: int) -> float:
+    paths = ENDPOINTS + [f"/metrics/servers/server-{i}" for i in range(servers)]
+    semaphore = asyncio.Semaphore(max(1, config.METRICS_API_CONCURRENCY))
+
+    async def fetch(path: str):
+        async with semaphore:
+            response = await get(f"{base_url}{path}")
+            assert response.status_code == 200, response.status_code
+
+    connections, requests = upstream.connections, upstream.requests
+    best = float("inf")
+    for _ in range(cycles):
+        started = time.perf_counter()
+        await asyncio.gather(*(fetch(path) for path in paths))
+        best = min(best, time.perf_counter() - started)
+
+    per_cycle = (upstream.connections - connections) / cycles
+    print(f"  {label:<24} {best * 1000:8.1f} ms/цикл  соединений за цикл: {per_cycle:6.1f}  "
+          f"запросов за цикл: {(upstream.requests - requests) / cycles:.0f}")
+    return best
+
+
+async def run(args):
+    upstream = StubUpstream(args.handshake_ms / 1000)
+    server = await asyncio.start_server(upstream.handle, "127.0.0.1", 0)
+    base_url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    print(f"Цикл опроса Metrics API: {len(ENDPOINTS) + args.servers} запросов, "
+          f"параллельно {config.METRICS_API_CONCURRENCY}, установка соединения {args.handshake_ms:g} ms "
+          f"(лучший из {args.cycles}):")
+    async with server:
+        before = await measure("клиент на запрос", per_request_get, upstream, base_url, args.servers, args.cycles)
+        after = await measure("общий пул", pooled_get, upstream, base_url, args.servers, args.cycles)
+        print(f"    ускорение: x{before / after:.1f}")
+        await http_clients.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Клиент на запрос против общего пула соединений")
+    parser.add_argument("--servers", type=int, default=50, help="серверов, запрашиваемых по одному (по умолчанию 50)")
+    parser.add_argument("--cycles", type=int, default=10, help="циклов опроса, берется лучший результат")
+    parser.add_argument("--handshake-ms", type=float, default=0,
+                        help="задержка на каждом новом соединении, мс (0 - только localhost)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
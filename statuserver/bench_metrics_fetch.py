@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пакетного режима Metrics API (fetch_servers_snapshot) на локальной заглушке
+с задержкой ответа. Как было - эндпоинты запрашиваются строго по очереди (эквивалент
+METRICS_API_CONCURRENCY=1); как стало - параллельно с ограничением METRICS_API_CONCURRENCY.
+Два сценария: /metrics/servers/all отвечает и /metrics/servers/all отдает 503,
+тогда метрики догружаются по одному серверу
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+
+from circuit_breaker import CircuitBreaker
+from config import config
+from metrics_api_client import MetricsAPIClient
+
+
+def make_upstream(servers: int, latency: float, all_available: bool):
+    """Заглушка Monitoring API: каждый ответ приходит через latency секунд"""
+    names = [f"server-{i}" for i in range(servers)]
+    metrics = {name: {"server_name": name, "cpu_usage": 40.0 + i % 50, "memory_usage": 30.0, "disk_usage": 20.0}
+               for i, name in enumerate(names)}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        path = request.url.path
+        if path == "/metrics/servers/all":
+            if not all_available:
+                return httpx.Response(503)
+            return httpx.Response(200, json=list(metrics.values()))
+        if path == "/metrics/servers":
+            return httpx.Response(200, json={"servers": [{"name": name} for name in names], "total_count": servers})
+        if path == "/metrics/cpu/usage":
+            return httpx.Response(200, json={"data": [{"server": name, "value": m["cpu_usage"]} for name, m in metrics.items()]})
+        if path == "/metrics/memory/usage":
+            return httpx.Response(200, json={"data": [{"server": name, "value": m["memory_usage"]} for name, m in metrics.items()]})
+        name = path.rsplit("/", 1)[-1]
+        if name in metrics:
+            return httpx.Response(200, json={"cpu": metrics[name]["cpu_usage"], "memory": 30.0, "disk_usage": 20.0})
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+async def measure(args, all_available: bool, concurrency: int):
+    config.METRICS_API_CONCURRENCY = concurrency
+    best, servers = float("inf"), 0
+    async with httpx.AsyncClient(transport=make_upstream(args.servers, args.latency / 1000, all_available)) as http:
+        # Порог отказов недостижим: 503 от /servers/all не должен размыкать breaker между повторами
+        client = MetricsAPIClient(
+            base_url="http://metrics.test",
+            client=http,
+            breaker=CircuitBreaker("bench", failure_threshold=10 ** 9, cooldown=0)
+        )
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                snapshot = await client.fetch_servers_snapshot()
+            best = min(best, time.perf_counter() - started)
+            servers = len(snapshot)
+    return best, servers
+
+
+async def run(args):
+    print(f"Заглушка: {args.servers} серверов, задержка ответа {args.latency} ms, лучший из {args.repeat}")
+    for label, all_available in (("/servers/all отвечает", True), ("/servers/all -> 503", False)):
+        print(f"  {label}:")
+        before, servers = await measure(args, all_available, 1)
+        print(f"    {'последовательно':<24} {before * 1000:8.0f} ms  серверов: {servers}")
+        after, servers = await measure(args, all_available, args.concurrency)
+        print(f"    {f'параллельно, по {args.concurrency}':<24} {after * 1000:8.0f} ms  серверов: {servers}")
+        print(f"    ускорение: x{before / after:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Последовательный и параллельный опрос эндпоинтов Metrics API")
+    parser.add_argument("--servers", type=int, default=21, help="серверов в ответе заглушки (по умолчанию 21)")
+    parser.add_argument("--latency", type=float, default=200, help="задержка каждого ответа, ms (по умолчанию 200)")
+    parser.add_argument("--concurrency", type=int, default=config.METRICS_API_CONCURRENCY,
+                        help=f"одновременных запросов (по умолчанию METRICS_API_CONCURRENCY={config.METRICS_API_CONCURRENCY})")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов, берется лучший результат")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
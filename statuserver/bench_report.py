@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Регрессионный бенчмарк отчета по метрикам (get_metrics_report): сутки сэмплов по сотне
+сервисов, отчет до компакции (все сэмплы сырые - худший случай) и после нее (агрегаты 1m/1h).
+По умолчанию 10 млн сэмплов; заполнение идет прямо в таблицы хранилища пачками
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+
+from columnar_storage import ColumnarStorage, to_micros
+from db_storage import DatabaseStorage
+from models import InsertService
+
+BATCH_SIZE = 100000
+STORAGES = {"row": DatabaseStorage, "columnar": ColumnarStorage}
+
+
+def fill(storage: DatabaseStorage, service_ids, samples: int, end: datetime):
+    """samples сэмплов, равномерно за сутки до end, по кругу по сервисам"""
+    step = timedelta(days=1) / samples
+    columnar = isinstance(storage, ColumnarStorage)
+
+    def insert_batch(conn, first: int, count: int):
+        if columnar:
+            series = [storage._series_id(conn, service_id) for service_id in service_ids]
+            conn.executemany(
+                "INSERT INTO metric_samples (series, ts, cpu_usage, ram_usage, disk_usage) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (series[i % len(series)], to_micros(end - step * i), i % 100, i % 70, i % 40)
+                    for i in range(first, first + count)
+                )
+            )
+        else:
+            conn.executemany(
+                "INSERT INTO server_metrics (id, service_id, cpu_usage, ram_usage, disk_usage, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (str(uuid.uuid4()), service_ids[i % len(service_ids)], i % 100, i % 70, i % 40, (end - step * i).isoformat())
+                    for i in range(first, first + count)
+                )
+            )
+
+    for first in range(0, samples, BATCH_SIZE):
+        storage._executor.write_sync(insert_batch, first, min(BATCH_SIZE, samples - first))
+        print(f"\r  заполнение: {min(first + BATCH_SIZE, samples)}/{samples}", end="", flush=True)
+    print()
+
+
+async def measure(label: str, storage: DatabaseStorage, start: datetime, end: datetime, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        report = await storage.get_metrics_report(start, end)
+        best = min(best, time.perf_counter() - started)
+    samples = sum(summary.samples for summary in report)
+    print(f"  {label:<26} {best * 1000:10.1f} ms  строк отчета: {len(report)}, сэмплов: {samples}")
+    return best
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-report-"), "services.db")
+    storage = STORAGES[args.storage](path)
+    services = [
+        await storage.create_service(InsertService(name=f"server {i}", category="Infrastructure", region="Production"))
+        for i in range(args.services)
+    ]
+    # Конец чуть в прошлом: компакция сворачивает только завершившиеся часы
+    end = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(microseconds=1)
+    start = end - timedelta(days=1)
+
+    print(f"Отчет по метрикам ({args.storage}): {args.samples} сэмплов, {args.services} сервисов, "
+          f"лучший из {args.repeat}")
+    started = time.perf_counter()
+    fill(storage, [service.id for service in services], args.samples, end)
+    print(f"  заполнение заняло {time.perf_counter() - started:.1f} с")
+
+    raw = await measure("сырые сэмплы", storage, start, end, args.repeat)
+    started = time.perf_counter()
+    stats = await storage.compact(datetime.now())
+    print(f"  компакция: {time.perf_counter() - started:.1f} с, {stats}")
+    rolled = await measure("после компакции", storage, start, end, args.repeat)
+    print(f"    ускорение: x{raw / rolled:.0f}")
+    storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время построения отчета по метрикам")
+    parser.add_argument("--samples", type=int, default=10_000_000, help="сэмплов за сутки (по умолчанию 10 млн)")
+    parser.add_argument("--services", type=int, default=100, help="сервисов (по умолчанию 100)")
+    parser.add_argument("--storage", choices=sorted(STORAGES), default="row", help="формат хранения сырых метрик")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов, берется лучший результат")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
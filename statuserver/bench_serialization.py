@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк сериализации ответов API: стоимость кодирования N сэмплов метрик в JSON
+(путь FastAPI по умолчанию против fast_json со стандартным json и с orjson)
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+
+from fastapi.encoders import jsonable_encoder
+
+import fast_json
+from models import ServerMetrics
+
+
+def make_metrics(count: int):
+    now = datetime.now()
+    return [
+        ServerMetrics(
+            id=str(uuid.uuid4()),
+            service_id=f"service-{i % 500}",
+            cpu_usage=i % 100 + 0.5,
+            ram_usage=i % 70 + 0.25,
+            disk_usage=i % 40 + 0.125,
+            timestamp=now - timedelta(seconds=i)
+        )
+        for i in range(count)
+    ]
+
+
+def fastapi_default(metrics) -> bytes:
+    """Как было: словари из эндпоинта, jsonable_encoder внутри FastAPI, затем JSONResponse"""
+    content = jsonable_encoder([m.model_dump(by_alias=True) for m in metrics])
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def fast_json_response(metrics) -> bytes:
+    return fast_json.FastJSONResponse(fast_json.dump_models(metrics)).body
+
+
+def measure(label: str, encode, metrics, repeat: int) -> float:
+    encode(metrics)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode(metrics)
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<28} {best * 1000:8.1f} ms  {len(body) / 1024 / 1024:6.2f} MB")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость сериализации метрик в JSON")
+    parser.add_argument("--rows", type=int, default=10000, help="сэмплов в ответе (по умолчанию 10000)")
+    parser.add_argument("--repeat", type=int, default=10, help="повторов, берется лучший результат")
+    args = parser.parse_args()
+
+    metrics = make_metrics(args.rows)
+    print(f"Сериализация {args.rows} сэмплов метрик (лучший из {args.repeat}):")
+    baseline = measure("FastAPI по умолчанию", fastapi_default, metrics, args.repeat)
+
+    orjson = fast_json.orjson
+    fast_json.orjson = None
+    stdlib = measure("fast_json + json", fast_json_response, metrics, args.repeat)
+    fast_json.orjson = orjson
+    print(f"    ускорение: x{baseline / stdlib:.1f}")
+    if orjson is None:
+        print("  orjson не установлен")
+        return
+    fast = measure("fast_json + orjson", fast_json_response, metrics, args.repeat)
+    print(f"    ускорение: x{baseline / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сопоставления instance из Prometheus с сервисами (синхронизация Grafana).
+Как было - попарная проверка каждого instance с каждым сервисом; как стало - ServiceMatcher
+(автоматы Ахо-Корасик). Проверяется, что наборы совпадений одинаковы
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List, Set
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+
+from models import Service
+from service_matcher import ServiceMatcher
+
+
+def pairwise_match(instances: List[str], services: List[Service]) -> List[Set[str]]:
+    """Прежний цикл из GrafanaService.sync_service_statuses: id подходящих сервисов для каждого instance"""
+    result = []
+    for instance in instances:
+        matching = set()
+        for service in services:
+            if not service.address:
+                continue
+
+            service_address = f"{service.address}:{service.port}" if service.port else service.address
+
+            if (instance and service.address and service.address in instance) or \
+               instance == service_address or \
+               (service.name and instance and service.name.lower() in instance.lower()) or \
+               (instance and service.name and instance.lower() in service.name.lower()):
+                matching.add(service.id)
+        result.append(matching)
+    return result
+
+
+def make_services(count: int) -> List[Service]:
+    return [
+        Service(
+            id=f"svc-{i}",
+            name=f"Node-{i:05d}",
+            category="Infrastructure",
+            region="Production",
+            address=f"10.{i // 250}.{i % 250}.{i % 7 + 1}" if i % 10 else None,
+            port=9100 if i % 2 else None
+        )
+        for i in range(count)
+    ]
+
+
+def make_instances(count: int, services: int, rng: random.Random) -> List[str]:
+    """Адреса с портом, имена хостов, части имен и неизвестные адреса"""
+    instances = []
+    for _ in range(count):
+        i, kind = rng.randrange(services), rng.random()
+        if kind < 0.6:
+            instances.append(f"10.{i // 250}.{i % 250}.{i % 7 + 1}:9100")
+        elif kind < 0.8:
+            instances.append(f"node-{i:05d}.prod.local:9100")
+        elif kind < 0.85:
+            instances.append(f"node-{i:05d}"[:rng.randrange(9, 11)])
+        else:
+            instances.append(f"172.16.{rng.randrange(256)}.{rng.randrange(256)}:9100")
+    return instances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Попарное сопоставление instance с сервисами против ServiceMatcher")
+    parser.add_argument("--instances", type=int, default=5000, help="instance в ответе Prometheus (по умолчанию 5000)")
+    parser.add_argument("--services", type=int, default=2000, help="сервисов в каталоге (по умолчанию 2000)")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов сопоставления индексом, берется лучший результат")
+    args = parser.parse_args()
+
+    services = make_services(args.services)
+    instances = make_instances(args.instances, args.services, random.Random(42))
+    print(f"{args.instances} instance x {args.services} сервисов")
+
+    started = time.perf_counter()
+    expected = pairwise_match(instances, services)
+    before = time.perf_counter() - started
+    print(f"  {'попарно':<22} {before * 1000:9.1f} ms")
+
+    started = time.perf_counter()
+    matcher = ServiceMatcher(services)
+    build = time.perf_counter() - started
+    after = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        matched = matcher.match(instances)
+        after = min(after, time.perf_counter() - started)
+    print(f"  {'построение индекса':<22} {build * 1000:9.1f} ms")
+    print(f"  {'сопоставление индексом':<22} {after * 1000:9.1f} ms")
+
+    actual = [{matcher.services[index].id for index in indexes} for indexes in matched]
+    if actual != expected:
+        differ = sum(1 for a, b in zip(actual, expected) if a != b)
+        print(f"  ОШИБКА: совпадения различаются для {differ} instance")
+        sys.exit(1)
+    pairs = sum(len(found) for found in expected)
+    print(f"  совпадения одинаковы: {pairs} пар, без совпадений {sum(1 for found in expected if not found)} instance")
+    print(f"    ускорение: x{before / after:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пути чтения GET /api/services до и после снапшота.
+Раньше каждый запрос клиента проверял доступность Metrics API, забирал метрики всех серверов,
+сверял каждый сервис с хранилищем и писал сэмплы; теперь запрос отдает готовое тело снапшота.
+Metrics API - локальная заглушка (httpx.MockTransport) с задержкой ответа, хранилище - временная БД
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+# Глобальное хранилище создается при импорте routes - во временный каталог, а не в data/
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-snapshot-"), "services.db"))
+
+import httpx
+from fastapi import FastAPI
+
+from db_storage import DatabaseStorage
+from metrics_api_client import MetricsAPIClient
+from models import InsertService, InsertServerMetrics
+from routes import get_services as services_after
+from services_snapshot import services_snapshot
+
+
+class StubMetricsAPI:
+    """Заглушка Metrics API с задержкой ответа и счетчиком запросов"""
+
+    def __init__(self, servers: int, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self.servers = [
+            {"server_name": f"server {i}", "cpu_usage": 20.0 + i % 50, "memory_usage": 30.0, "disk_usage": 40.0}
+            for i in range(servers)
+        ]
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if request.url.path == "/metrics/available":
+            return httpx.Response(200, json={"available": True})
+        return httpx.Response(200, json=self.servers)
+
+
+def build_app(client: MetricsAPIClient, storage: DatabaseStorage) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before")
+    async def services_before():
+        """Как было до снапшота (routes.get_services при доступном Metrics API)"""
+        if not await client.check_availability():
+            return [s.model_dump(by_alias=True) for s in await storage.get_services()]
+
+        services, metrics_list = await client.convert_metrics_to_services(await client.get_all_servers_metrics())
+        for service in services:
+            existing = await storage.get_service(service.id)
+            if not existing:
+                await storage.create_service(InsertService(
+                    name=service.name, description=service.description, category=service.category,
+                    region=service.region, status=service.status, type=service.type, icon=service.icon
+                ))
+            else:
+                await storage.update_service_status(service.id, service.status)
+        for metrics_data in metrics_list:
+            await storage.create_server_metrics(InsertServerMetrics(
+                serviceId=metrics_data["service_id"],
+                cpuUsage=metrics_data["cpu_usage"],
+                ramUsage=metrics_data["memory_usage"],
+                diskUsage=metrics_data["disk_usage"]
+            ))
+        return [s.model_dump(by_alias=True) for s in services]
+
+    app.add_api_route("/after", services_after, methods=["GET"])
+    return app
+
+
+async def measure(label: str, http: httpx.AsyncClient, path: str, stub: StubMetricsAPI,
+                  requests: int, concurrency: int, headers=None) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await http.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code in (200, 304), response.status_code
+
+    upstream_before = stub.requests
+    started = time.perf_counter()
+    # Клиент Metrics API печатает каждый запрос - на время замера вывод подавляется
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"  {label:<26} p50 {statistics.median(latencies) * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms  "
+          f"{requests / elapsed:8.0f} req/s  запросов к Metrics API: {stub.requests - upstream_before}")
+    return statistics.median(latencies)
+
+
+async def run(args):
+    stub = StubMetricsAPI(args.servers, args.upstream_ms / 1000)
+    storage = DatabaseStorage(os.path.join(tempfile.mkdtemp(prefix="bench-snapshot-"), "services.db"))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(stub)) as upstream:
+        client = MetricsAPIClient(base_url="http://metrics.test", client=upstream)
+
+        # Снапшот публикует фоновая синхронизация - здесь один раз перед замером
+        with contextlib.redirect_stdout(io.StringIO()):
+            services_snapshot.publish((await client.sync_services_from_api()).services, "metrics_api")
+
+        transport = httpx.ASGITransport(app=build_app(client, storage))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            print(f"GET /api/services: {args.servers} серверов, {args.requests} запросов, "
+                  f"параллельно {args.concurrency}, задержка Metrics API {args.upstream_ms:g} ms")
+            before = await measure("до: запрос в Metrics API", http, "/before", stub, args.requests, args.concurrency)
+            after = await measure("после: снапшот", http, "/after", stub, args.requests, args.concurrency)
+            print(f"    ускорение p50: x{before / after:.0f}")
+            await measure("после: снапшот, 304", http, "/after", stub, args.requests, args.concurrency,
+                          headers={"If-None-Match": services_snapshot.etag})
+    storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Путь чтения списка сервисов: до и после снапшота")
+    parser.add_argument("--servers", type=int, default=50, help="серверов в ответе Metrics API (по умолчанию 50)")
+    parser.add_argument("--requests", type=int, default=200, help="запросов клиентов (по умолчанию 200)")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных клиентов (по умолчанию 20)")
+    parser.add_argument("--upstream-ms", type=float, default=20, help="задержка ответа Metrics API, мс")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
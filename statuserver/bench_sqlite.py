@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подключений SQLite под смешанной нагрузкой: одновременные чтения метрик сервиса
+и запись сэмплов. Как было - новое подключение на каждый запрос с настройками по умолчанию
+(журнал отката, synchronous=FULL); как стало - долгоживущие подключения DatabaseStorage
+(WAL и прагмы из config, один поток-писатель и пул читателей)
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "server_py"))
+
+from config import config
+from db_storage import DatabaseStorage
+
+SERVICES = 50
+
+
+def read_metrics(conn: sqlite3.Connection, service_id: str):
+    return conn.execute(
+        "SELECT * FROM server_metrics WHERE service_id = ? ORDER BY timestamp DESC LIMIT 100", (service_id,)
+    ).fetchall()
+
+
+def write_sample(conn: sqlite3.Connection, service_id: str):
+    conn.execute(
+        "INSERT INTO server_metrics (id, service_id, cpu_usage, ram_usage, disk_usage, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), service_id, 40.0, 50.0, 60.0, datetime.now().isoformat())
+    )
+
+
+class PerQueryConnections:
+    """Как было: подключение открывается и закрывается на каждый запрос"""
+
+    def __init__(self, db_path: str, threads: int):
+        self.db_path = db_path
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+
+    def _run(self, fn, args):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                return fn(conn, *args)
+        finally:
+            conn.close()
+
+    async def read(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._run, fn, args)
+
+    async def write(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._run, fn, args)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+def create_database(db_path: str, rows: int, journal_mode: str):
+    """Схема DatabaseStorage и rows сэмплов; затем режим журнала для варианта"""
+    storage = DatabaseStorage(db_path)
+    now = datetime.now()
+    storage._executor.write_sync(lambda conn: conn.executemany(
+        "INSERT INTO server_metrics (id, service_id, cpu_usage, ram_usage, disk_usage, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (str(uuid.uuid4()), f"service-{i % SERVICES}", 40.0, 50.0, 60.0, (now - timedelta(seconds=i)).isoformat())
+            for i in range(rows)
+        )
+    ))
+    storage.close()
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.close()
+
+
+async def run_workload(executor, ops: int, write_ratio: float, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {"read": [], "write": []}
+    rng = random.Random(42)
+    plan = ["write" if rng.random() < write_ratio else "read" for _ in range(ops)]
+
+    async def one(kind: str):
+        service_id = f"service-{rng.randrange(SERVICES)}"
+        async with semaphore:
+            started = time.perf_counter()
+            if kind == "read":
+                await executor.read(read_metrics, service_id)
+            else:
+                await executor.write(write_sample, service_id)
+            latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(kind) for kind in plan))
+    return time.perf_counter() - started, latencies
+
+
+def describe(values):
+    if not values:
+        return "        -"
+    values = sorted(values)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+    return f"p50 {statistics.median(values) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms"
+
+
+def report(label: str, elapsed: float, latencies) -> float:
+    ops = len(latencies["read"]) + len(latencies["write"])
+    print(f"  {label:<30} {ops / elapsed:8.0f} оп/с")
+    print(f"    чтение: {describe(latencies['read'])}   запись: {describe(latencies['write'])}")
+    return ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подключение на запрос против пула подключений WAL")
+    parser.add_argument("--rows", type=int, default=50000, help="сэмплов в БД до замера (по умолчанию 50000)")
+    parser.add_argument("--ops", type=int, default=4000, help="операций в замере (по умолчанию 4000)")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="доля записей (по умолчанию 0.2)")
+    parser.add_argument("--concurrency", type=int, default=16, help="одновременных операций (по умолчанию 16)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-sqlite-")
+    before_path = os.path.join(workdir, "per_query.db")
+    after_path = os.path.join(workdir, "pooled.db")
+    create_database(before_path, args.rows, "DELETE")
+    create_database(after_path, args.rows, config.SQLITE_JOURNAL_MODE)
+
+    print(f"Смешанная нагрузка: {args.ops} операций, записей {args.write_ratio:.0%}, "
+          f"параллельно {args.concurrency}, {args.rows} сэмплов в БД")
+
+    # Потоков столько же, сколько у DatabaseStorage: писатель и пул читателей
+    per_query = PerQueryConnections(before_path, config.SQLITE_READER_POOL_SIZE + 1)
+    before = report("подключение на запрос", *asyncio.run(run_workload(per_query, args.ops, args.write_ratio, args.concurrency)))
+    per_query.shutdown()
+
+    storage = DatabaseStorage(after_path)
+    after = report(f"пул подключений, {config.SQLITE_JOURNAL_MODE}",
+                   *asyncio.run(run_workload(storage._executor, args.ops, args.write_ratio, args.concurrency)))
+    storage.close()
+    print(f"    ускорение: x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
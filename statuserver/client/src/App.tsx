@@ -6,6 +6,7 @@ import { Toaster } from "@/components/ui/toaster";
 import { TooltipProvider } from "@/components/ui/tooltip";
 import { BarChart3, History, LayoutDashboard, Settings } from "lucide-react";
 import { Link, useLocation } from "wouter";
+import { useLiveUpdates } from "@/hooks/use-live-updates";
 
 import Dashboard from "@/pages/Dashboard";
 import Analytics from "@/pages/Analytics";
@@ -29,6 +30,7 @@ function Router() {
 
 function App() {
   const [location] = useLocation();
+  useLiveUpdates();
 
   const navigation = [
     { name: "Dashboard", path: "/", icon: LayoutDashboard },
@@ -0,0 +1,86 @@
+import { useEffect } from "react";
+import { Incident, Service, ServerMetrics } from "@shared/schema";
+import { queryClient } from "@/lib/queryClient";
+
+interface ServicesDelta {
+  changed: Service[];
+  removed: string[];
+}
+
+// Агрегированные метрики (с параметром step) и сводку аналитики из сырых сэмплов не пересчитываем - перезапрашиваем
+const isAggregatedMetricsQuery = (key: unknown) =>
+  typeof key === "string" && (key.startsWith("/api/server-metrics?") || key.startsWith("/api/analytics/summary"));
+
+function applyServicesDelta({ changed, removed }: ServicesDelta) {
+  queryClient.setQueryData<Service[]>(["/api/services"], (services) => {
+    if (!services) return services;
+    const changedById = new Map(changed.map((service) => [service.id, service]));
+    const next = services
+      .filter((service) => !removed.includes(service.id))
+      .map((service) => changedById.get(service.id) ?? service);
+    const known = new Set(next.map((service) => service.id));
+    return [...next, ...changed.filter((service) => !known.has(service.id))];
+  });
+
+  for (const service of changed) {
+    queryClient.setQueryData([`/api/services/${service.id}`], service);
+  }
+}
+
+function applyIncidents(incidents: Incident[]) {
+  queryClient.setQueryData<Incident[]>(["/api/incidents"], (current) =>
+    current ? [...incidents, ...current] : current,
+  );
+}
+
+function applyMetrics(metrics: ServerMetrics[]) {
+  // Сервер отдает метрики от новых к старым
+  queryClient.setQueryData<ServerMetrics[]>(["/api/server-metrics"], (current) =>
+    current ? [...[...metrics].reverse(), ...current] : current,
+  );
+}
+
+function resync() {
+  queryClient.invalidateQueries({
+    predicate: ({ queryKey: [key] }) =>
+      typeof key === "string" && (
+        key === "/api/services" ||
+        key.startsWith("/api/services/") ||
+        key === "/api/incidents" ||
+        key.startsWith("/api/server-metrics") ||
+        key.startsWith("/api/analytics/summary")
+      ),
+  });
+}
+
+/**
+ * Live-обновления через /api/stream (Server-Sent Events) вместо ежесекундного опроса.
+ * Пришедшие изменения дописываются в кэш react-query. При каждом (пере)подключении данные
+ * перезапрашиваются целиком: события, отправленные до подключения или за время разрыва, не повторяются.
+ */
+export function useLiveUpdates() {
+  useEffect(() => {
+    const source = new EventSource("/api/stream");
+
+    source.onopen = resync;
+    source.addEventListener("services", (event) => {
+      applyServicesDelta(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener("incidents", (event) => {
+      applyIncidents(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener("metrics", (event) => {
+      applyMetrics(JSON.parse((event as MessageEvent).data));
+    });
+
+    // Агрегаты обновляются не чаще раза в минуту
+    const timer = window.setInterval(() => {
+      queryClient.invalidateQueries({ predicate: ({ queryKey: [key] }) => isAggregatedMetricsQuery(key) });
+    }, 60_000);
+
+    return () => {
+      window.clearInterval(timer);
+      source.close();
+    };
+  }, []);
+}
@@ -1,5 +1,5 @@
 import { useQuery } from "@tanstack/react-query";
-import { Service, Incident, ServerMetrics } from "@shared/schema";
+import { Service, Incident, AnalyticsSummary } from "@shared/schema";
 import { MetricCard } from "@/components/MetricCard";
 import { Card } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
@@ -31,12 +31,6 @@ export default function Analytics() {
     queryKey: ["/api/incidents"],
   });
 
-  const { data: allMetrics = [] } = useQuery<ServerMetrics[]>({
-    queryKey: ["/api/server-metrics"],
-    refetchInterval: 1000,
-    refetchIntervalInBackground: true,
-  });
-
   const getDateRangeFilter = () => {
     const now = new Date();
     switch (dateRange) {
@@ -68,28 +62,23 @@ export default function Analytics() {
   });
 
   const range = getDateRangeFilter();
-  const filteredMetrics = allMetrics.filter((metric) =>
-    filterByDate(new Date(metric.timestamp))
-  );
+
+  // Средние метрики за период считает сервер из агрегатов (без выгрузки всех сэмплов)
+  const { data: summary } = useQuery<AnalyticsSummary>({
+    queryKey: [`/api/analytics/summary?start=${format(range.start, "yyyy-MM-dd")}&end=${format(range.end, "yyyy-MM-dd")}`],
+  });
+  const metricsByService = new Map((summary?.metrics.services ?? []).map((row) => [row.serviceId, row]));
+  const rangeMetrics = summary?.metrics.range;
 
   // Анализ нагрузки серверов
   const serverLoadAnalysis = services.map((service) => {
-    const serviceMetrics = filteredMetrics.filter((m) => m.serviceId === service.id);
-    const avgCpu = serviceMetrics.length > 0
-      ? serviceMetrics.reduce((sum, m) => sum + m.cpuUsage, 0) / serviceMetrics.length
-      : 0;
-    const avgRam = serviceMetrics.length > 0
-      ? serviceMetrics.reduce((sum, m) => sum + m.ramUsage, 0) / serviceMetrics.length
-      : 0;
-    const avgDisk = serviceMetrics.length > 0
-      ? serviceMetrics.reduce((sum, m) => sum + m.diskUsage, 0) / serviceMetrics.length
-      : 0;
-    const maxCpu = serviceMetrics.length > 0
-      ? Math.max(...serviceMetrics.map(m => m.cpuUsage))
-      : 0;
-    const maxRam = serviceMetrics.length > 0
-      ? Math.max(...serviceMetrics.map(m => m.ramUsage))
-      : 0;
+    const serviceMetrics = metricsByService.get(service.id);
+    const samples = serviceMetrics?.samples ?? 0;
+    const avgCpu = serviceMetrics?.cpuUsage ?? 0;
+    const avgRam = serviceMetrics?.ramUsage ?? 0;
+    const avgDisk = serviceMetrics?.diskUsage ?? 0;
+    const maxCpu = serviceMetrics?.maxCpu ?? 0;
+    const maxRam = serviceMetrics?.maxRam ?? 0;
 
     // Подсчет инцидентов для этого сервиса
     const serviceIncidents = incidents.filter(inc => inc.serviceId === service.id);
@@ -106,7 +95,7 @@ export default function Analytics() {
       totalLoad: Number(((avgCpu + avgRam + avgDisk) / 3).toFixed(1)),
       incidents: serviceIncidents.length,
       downtime,
-      stability: serviceMetrics.length > 0 ? Number((100 - (downtime / serviceMetrics.length * 100)).toFixed(1)) : 100,
+      stability: samples > 0 ? Number((100 - (downtime / samples * 100)).toFixed(1)) : 100,
     };
   }).sort((a, b) => b.totalLoad - a.totalLoad);
 
@@ -377,17 +366,17 @@ export default function Analytics() {
         ...inc,
         serviceName: getServiceName(inc.serviceId),
       })),
-      metricsData: filteredMetrics.length > 0 ? {
-        totalDataPoints: filteredMetrics.length,
+      metricsData: rangeMetrics && rangeMetrics.samples > 0 ? {
+        totalDataPoints: rangeMetrics.samples,
         averages: {
-          cpu: (filteredMetrics.reduce((sum, m) => sum + m.cpuUsage, 0) / filteredMetrics.length).toFixed(2),
-          ram: (filteredMetrics.reduce((sum, m) => sum + m.ramUsage, 0) / filteredMetrics.length).toFixed(2),
-          disk: (filteredMetrics.reduce((sum, m) => sum + m.diskUsage, 0) / filteredMetrics.length).toFixed(2),
+          cpu: rangeMetrics.cpuUsage!.toFixed(2),
+          ram: rangeMetrics.ramUsage!.toFixed(2),
+          disk: rangeMetrics.diskUsage!.toFixed(2),
         },
         peaks: {
-          cpu: Math.max(...filteredMetrics.map(m => m.cpuUsage)).toFixed(2),
-          ram: Math.max(...filteredMetrics.map(m => m.ramUsage)).toFixed(2),
-          disk: Math.max(...filteredMetrics.map(m => m.diskUsage)).toFixed(2),
+          cpu: rangeMetrics.maxCpu!.toFixed(2),
+          ram: rangeMetrics.maxRam!.toFixed(2),
+          disk: rangeMetrics.maxDisk!.toFixed(2),
         },
       } : null,
     };
@@ -819,7 +808,7 @@ export default function Analytics() {
         </Card>
       </div>
 
-      {filteredMetrics.length > 0 && (
+      {rangeMetrics && rangeMetrics.samples > 0 && (
         <div className="grid grid-cols-1 sm:grid-cols-3 gap-4">
           <Card className="p-4">
             <div className="flex items-center gap-3">
@@ -829,10 +818,10 @@ export default function Analytics() {
               <div>
                 <p className="text-sm text-muted-foreground">Avg CPU Usage</p>
                 <p className="text-2xl font-semibold">
-                  {(filteredMetrics.reduce((sum, m) => sum + m.cpuUsage, 0) / filteredMetrics.length).toFixed(1)}%
+                  {rangeMetrics.cpuUsage!.toFixed(1)}%
                 </p>
                 <p className="text-xs text-muted-foreground mt-1">
-                  Peak: {Math.max(...filteredMetrics.map(m => m.cpuUsage)).toFixed(1)}%
+                  Peak: {rangeMetrics.maxCpu!.toFixed(1)}%
                 </p>
               </div>
             </div>
@@ -845,10 +834,10 @@ export default function Analytics() {
               <div>
                 <p className="text-sm text-muted-foreground">Avg RAM Usage</p>
                 <p className="text-2xl font-semibold">
-                  {(filteredMetrics.reduce((sum, m) => sum + m.ramUsage, 0) / filteredMetrics.length).toFixed(1)}%
+                  {rangeMetrics.ramUsage!.toFixed(1)}%
                 </p>
                 <p className="text-xs text-muted-foreground mt-1">
-                  Peak: {Math.max(...filteredMetrics.map(m => m.ramUsage)).toFixed(1)}%
+                  Peak: {rangeMetrics.maxRam!.toFixed(1)}%
                 </p>
               </div>
             </div>
@@ -861,10 +850,10 @@ export default function Analytics() {
               <div>
                 <p className="text-sm text-muted-foreground">Avg Disk Usage</p>
                 <p className="text-2xl font-semibold">
-                  {(filteredMetrics.reduce((sum, m) => sum + m.diskUsage, 0) / filteredMetrics.length).toFixed(1)}%
+                  {rangeMetrics.diskUsage!.toFixed(1)}%
                 </p>
                 <p className="text-xs text-muted-foreground mt-1">
-                  Peak: {Math.max(...filteredMetrics.map(m => m.diskUsage)).toFixed(1)}%
+                  Peak: {rangeMetrics.maxDisk!.toFixed(1)}%
                 </p>
               </div>
             </div>
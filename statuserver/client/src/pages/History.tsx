@@ -13,6 +13,32 @@ import { useState, useEffect } from "react";
 
 type DateRange = "24hours" | "7days" | "30days" | "3months" | "all";
 
+// Шаг агрегации метрик на сервере для каждого периода (в секундах)
+const METRICS_STEP_SECONDS: Record<DateRange, number> = {
+  "24hours": 3600,
+  "7days": 6 * 3600,
+  "30days": 24 * 3600,
+  "3months": 24 * 3600,
+  all: 24 * 3600,
+};
+
+// Запрос агрегированных метрик: одна точка на интервал для каждого сервиса вместо всех сырых записей.
+// Начало периода округляется до начала дня, чтобы ключ запроса не менялся при каждом рендере.
+const getMetricsQuery = (dateRange: DateRange) => {
+  const params = new URLSearchParams({ step: String(METRICS_STEP_SECONDS[dateRange]) });
+  const now = new Date();
+  const start =
+    dateRange === "24hours" ? subDays(now, 1)
+    : dateRange === "7days" ? subDays(now, 7)
+    : dateRange === "30days" ? subDays(now, 30)
+    : dateRange === "3months" ? subMonths(now, 3)
+    : null;
+  if (start) {
+    params.set("from", startOfDay(start).toISOString());
+  }
+  return `/api/server-metrics?${params.toString()}`;
+};
+
 export default function History() {
   const [dateRange, setDateRange] = useState<DateRange>("30days");
   const [severityFilter, setSeverityFilter] = useState("all");
@@ -22,17 +48,14 @@ export default function History() {
 
   const { data: allIncidents = [], isLoading } = useQuery<Incident[]>({
     queryKey: ["/api/incidents"],
-    refetchInterval: 1000, // Обновление каждую секунду
   });
 
   const { data: services = [] } = useQuery<Service[]>({
     queryKey: ["/api/services"],
-    refetchInterval: 1000, // Обновление каждую секунду
   });
 
   const { data: allMetrics = [] } = useQuery<ServerMetrics[]>({
-    queryKey: ["/api/server-metrics"],
-    refetchInterval: 1000, // Обновление каждую секунду
+    queryKey: [getMetricsQuery(dateRange)],
   });
 
   const getDateRangeFilter = () => {
@@ -2,8 +2,11 @@
 """
 Скрипт для импорта сервисов из текстового файла в базу данных приложения
 """
+import argparse
 import asyncio
 import sys
+import tempfile
+import time
 from pathlib import Path
 from datetime import datetime
 
@@ -93,8 +96,23 @@ SERVICES_DATA = {
     }
 }
 
-async def import_services_from_file(file_path: str):
-    """Импорт сервисов из текстового файла"""
+def print_progress(done: int, total: int):
+    print(f"  … записано {done}/{total}")
+
+
+def print_report(report: dict, total: int, elapsed: float):
+    """Итог импорта: diff и скорость"""
+    print(f"  Создано: {report['created']}, изменено: {report['updated']}, без изменений: {report['unchanged']}"
+          + (f", повторов: {report['duplicates']}" if report["duplicates"] else ""))
+    for change in report["changes"][:20]:
+        fields = ", ".join(f"{field}: {old!r} → {new!r}" for field, (old, new) in change["fields"].items())
+        print(f"    {'+' if change['action'] == 'create' else '~'} {change['name']}" + (f" ({fields})" if fields else ""))
+    if elapsed > 0:
+        print(f"  ⏱️ {elapsed:.2f} сек, {total / elapsed:.0f} сервисов/сек")
+
+
+async def import_services_from_file(file_path: str, dry_run: bool = False):
+    """Импорт сервисов из текстового файла одной транзакцией"""
     print(f"📁 Читаем файл: {file_path}")
     
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -105,8 +123,7 @@ async def import_services_from_file(file_path: str):
     print(f"✓ Найдено уникальных сервисов: {len(unique_services)}")
     print(f"✓ Всего записей: {len(lines)}")
     
-    imported_count = 0
-    
+    services = []
     for service_name in sorted(unique_services):
         service_info = SERVICES_DATA.get(service_name, {
             "category": "Other",
@@ -115,7 +132,7 @@ async def import_services_from_file(file_path: str):
             "icon": "server"
         })
         
-        service = InsertService(
+        services.append(InsertService(
             name=service_name,
             description=service_info.get("description", service_name),
             category=service_info.get("category", "Other"),
@@ -125,27 +142,80 @@ async def import_services_from_file(file_path: str):
             icon=service_info.get("icon", "server"),
             address=None,
             port=None
+        ))
+    
+    started = time.perf_counter()
+    report = await storage.upsert_services(services, dry_run=dry_run, progress=print_progress)
+    print_report(report, len(services), time.perf_counter() - started)
+    
+    if dry_run:
+        print("\n🔍 Пробный запуск: изменения не записаны")
+        return 0
+    imported_count = report["created"] + report["updated"]
+    print(f"\n✅ Импорт завершен! Добавлено/обновлено сервисов: {imported_count}")
+    return imported_count
+
+async def run_benchmark(count: int):
+    """Импорт count синтетических сервисов во временную БД: построчно (старый путь) и пачкой"""
+    from db_storage import DatabaseStorage
+    
+    services = [
+        InsertService(
+            name=f"bench-service-{i:06d}",
+            description="Synthetic service",
+            category=f"Category {i % 20}",
+            region=("Production", "Staging", "Development")[i % 3],
+            type="Server",
+            icon="server",
+            address=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            port=8000 + i % 1000
         )
+        for i in range(count)
+    ]
+    
+    with tempfile.TemporaryDirectory() as directory:
+        legacy = DatabaseStorage(str(Path(directory) / "legacy.db"))
+        started = time.perf_counter()
+        for service in services:
+            await legacy.create_service(service)
+        elapsed = time.perf_counter() - started
+        legacy.close()
+        print(f"Построчно (create_service), {count} новых: {elapsed:.2f} сек, {count / elapsed:.0f} сервисов/сек")
         
-        try:
-            created_service = await storage.create_service(service)
-            print(f"  ✓ Импортирован: {service_name} (ID: {created_service.id})")
-            imported_count += 1
-        except Exception as e:
-            print(f"  ✗ Ошибка при импорте {service_name}: {e}")
-    
-    print(f"\n✅ Импорт завершен! Добавлено сервисов: {imported_count}")
-    return imported_count
+        bench = DatabaseStorage(str(Path(directory) / "bulk.db"))
+        print(f"\nПачкой (upsert_services), {count} новых:")
+        started = time.perf_counter()
+        report = await bench.upsert_services(services, progress=print_progress)
+        print_report({**report, "changes": []}, count, time.perf_counter() - started)
+        
+        changed = [s.model_copy(update={"description": "Updated synthetic service"}) if i % 10 == 0 else s for i, s in enumerate(services)]
+        for label, dry_run in (("Пробный запуск, изменен каждый 10-й", True), ("Повторный импорт, изменен каждый 10-й", False)):
+            print(f"\n{label}:")
+            started = time.perf_counter()
+            report = await bench.upsert_services(changed, dry_run=dry_run)
+            print_report({**report, "changes": []}, count, time.perf_counter() - started)
+        bench.close()
 
 async def main():
     """Главная функция"""
-    if len(sys.argv) < 2:
-        print("❌ Использование: python import_services.py <путь_к_файлу>")
+    parser = argparse.ArgumentParser(description="Импорт сервисов из текстового файла (одно имя на строку)")
+    parser.add_argument("file", nargs="?", help="путь к файлу со списком сервисов")
+    parser.add_argument("--dry-run", action="store_true", help="показать изменения без записи")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="импортировать N синтетических сервисов во временную БД")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        await run_benchmark(args.benchmark)
+        return
+    
+    if not args.file:
+        print("❌ Использование: python import_services.py <путь_к_файлу> [--dry-run]")
         print("\nПример:")
         print("  python import_services.py services.txt")
+        print("  python import_services.py --benchmark 50000")
         sys.exit(1)
     
-    file_path = sys.argv[1]
+    file_path = args.file
     
     if not Path(file_path).exists():
         print(f"❌ Файл не найден: {file_path}")
@@ -156,7 +226,7 @@ async def main():
     print()
     
     await storage.seed_data()
-    await import_services_from_file(file_path)
+    await import_services_from_file(file_path, args.dry_run)
     
     # Показываем статистику
     all_services = await storage.get_services()
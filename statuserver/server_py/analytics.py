@@ -0,0 +1,331 @@
+"""
+Агрегаты для страницы аналитики (/api/analytics/summary)
+Суммы метрик и счетчики инцидентов обновляются при каждой записи (события event_hub),
+а не пересчитываются из сырых строк: ответ собирается из готовых сумм по дням и минутам
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import config
+from event_hub import event_hub
+from models import Incident, ServerMetrics, ServerMetricsBucket
+from services_snapshot import services_snapshot
+from timeseries import to_epoch, to_local_naive
+from uptime import add_durations, empty_durations, uptime_summary
+
+DAY = 86400
+MINUTE = 60
+STATUSES = ("operational", "degraded", "down", "maintenance", "loading")
+SEVERITIES = ("minor", "major", "critical")
+# Сколько разных диапазонов дат держать в кэше сумм (страница использует 3-4 пресета)
+CLOSED_DAYS_CACHE_SIZE = 16
+
+# Суммы метрик: [samples, cpu_sum, cpu_max, ram_sum, ram_max, disk_sum, disk_max]
+MetricSums = List[float]
+# Счетчики инцидентов: [total, minor, major, critical, active, resolved, resolved_minutes]
+IncidentCounters = List[float]
+
+
+def _new_sums() -> MetricSums:
+    return [0, 0.0, float("-inf"), 0.0, float("-inf"), 0.0, float("-inf")]
+
+
+def _add_sums(target: MetricSums, samples: int, cpu: Tuple[float, float], ram: Tuple[float, float],
+              disk: Tuple[float, float]):
+    """Добавить (сумма, максимум) по каждой метрике"""
+    target[0] += samples
+    for offset, (total, maximum) in zip((1, 3, 5), (cpu, ram, disk)):
+        target[offset] += total
+        if maximum > target[offset + 1]:
+            target[offset + 1] = maximum
+
+
+def _merge_sums(target: MetricSums, source: MetricSums):
+    _add_sums(target, source[0], (source[1], source[2]), (source[3], source[4]), (source[5], source[6]))
+
+
+def _means(sums: Optional[MetricSums]) -> Dict[str, Any]:
+    if not sums or not sums[0]:
+        return {"samples": 0, "cpuUsage": None, "ramUsage": None, "diskUsage": None,
+                "maxCpu": None, "maxRam": None, "maxDisk": None}
+    samples = sums[0]
+    return {
+        "samples": samples,
+        "cpuUsage": round(sums[1] / samples, 2),
+        "ramUsage": round(sums[3] / samples, 2),
+        "diskUsage": round(sums[5] / samples, 2),
+        "maxCpu": round(sums[2], 2),
+        "maxRam": round(sums[4], 2),
+        "maxDisk": round(sums[6], 2),
+    }
+
+
+def _day(moment: datetime) -> int:
+    return to_epoch(moment) // DAY
+
+
+class AnalyticsAggregates:
+    """Инкрементально поддерживаемые суммы: метрики по дням и минутам, инциденты по дням"""
+
+    def __init__(self):
+        # день -> сервис -> суммы метрик (для средних за выбранный диапазон дат)
+        self._daily: Dict[int, Dict[str, MetricSums]] = {}
+        # минута -> сервис -> суммы метрик (скользящее окно ANALYTICS_ROLLING_WINDOW_SECONDS)
+        self._recent: Dict[int, Dict[str, MetricSums]] = {}
+        # день начала инцидента -> сервис -> счетчики
+        self._incidents: Dict[int, Dict[str, IncidentCounters]] = {}
+        self._latest_day = 0
+        self._latest_minute = 0
+        # Суммы за завершившиеся дни не меняются: (первый, последний день) -> сервис -> суммы
+        self._closed_days_cache: Dict[Tuple[int, int], Dict[str, MetricSums]] = {}
+        # Сводка по сервисам зависит только от снапшота и пересчитывается при смене его версии
+        self._services_version: Optional[int] = None
+        self._services_summary: Dict[str, Any] = {}
+
+    async def rebuild(self, storage):
+        """Начальное заполнение из хранилища (при старте): метрики берутся из готовых агрегатов по дням и минутам"""
+        now = datetime.now()
+        first_day = datetime.combine(now.date() - timedelta(days=config.ANALYTICS_RETENTION_DAYS - 1), time())
+        daily = await storage.get_server_metrics_buckets(DAY, start=first_day, use_cache=False)
+        recent = await storage.get_server_metrics_buckets(
+            MINUTE, start=now - timedelta(seconds=config.ANALYTICS_ROLLING_WINDOW_SECONDS), use_cache=False
+        )
+        incidents = await storage.get_incidents()
+
+        self._daily, self._recent, self._incidents = {}, {}, {}
+        self._closed_days_cache = {}
+        self._latest_day = self._latest_minute = 0
+        for bucket in daily:
+            self._add_bucket(self._daily, to_epoch(bucket.timestamp) // DAY, bucket)
+        for bucket in recent:
+            self._add_bucket(self._recent, to_epoch(bucket.timestamp) // MINUTE, bucket)
+        self.record_incidents(incidents)
+        self._prune(to_epoch(now))
+        print(f"📊 Аналитика: {len(daily)} дневных и {len(recent)} минутных агрегатов, {len(incidents)} инцидентов")
+
+    @staticmethod
+    def _add_bucket(target: Dict[int, Dict[str, MetricSums]], key: int, bucket: ServerMetricsBucket):
+        sums = target.setdefault(key, {}).setdefault(bucket.service_id, _new_sums())
+        samples = bucket.samples
+        _add_sums(
+            sums, samples,
+            (bucket.cpu_usage * samples, bucket.cpu_max),
+            (bucket.ram_usage * samples, bucket.ram_max),
+            (bucket.disk_usage * samples, bucket.disk_max),
+        )
+
+    def record_metrics(self, metrics: Iterable[ServerMetrics]):
+        """Учесть новые сэмплы (обработчик события metrics)"""
+        latest = 0
+        for sample in metrics:
+            seconds = to_epoch(sample.timestamp)
+            latest = max(latest, seconds)
+            if self._closed_days_cache and seconds // DAY < self._latest_day:
+                # Опоздавший сэмпл за прошедший день
+                self._closed_days_cache = {}
+            for target, key in ((self._daily, seconds // DAY), (self._recent, seconds // MINUTE)):
+                sums = target.setdefault(key, {}).setdefault(sample.service_id, _new_sums())
+                _add_sums(
+                    sums, 1,
+                    (sample.cpu_usage, sample.cpu_usage),
+                    (sample.ram_usage, sample.ram_usage),
+                    (sample.disk_usage, sample.disk_usage),
+                )
+        if latest:
+            self._prune(latest)
+
+    def record_incidents(self, incidents: Iterable[Incident]):
+        """Учесть новые инциденты (обработчик события incidents)"""
+        for incident in incidents:
+            started = to_local_naive(incident.started_at or incident.created_at)
+            counters = self._incidents.setdefault(_day(started), {}).setdefault(
+                incident.service_id, [0, 0, 0, 0, 0, 0, 0.0]
+            )
+            counters[0] += 1
+            if incident.severity in SEVERITIES:
+                counters[1 + SEVERITIES.index(incident.severity)] += 1
+            if incident.status != "resolved":
+                counters[4] += 1
+            if incident.resolved_at:
+                counters[5] += 1
+                counters[6] += (to_local_naive(incident.resolved_at) - started).total_seconds() / 60
+
+    def _prune(self, now_seconds: int):
+        """Удалить дни старше ANALYTICS_RETENTION_DAYS и минуты вне скользящего окна"""
+        day, minute = now_seconds // DAY, now_seconds // MINUTE
+        if day > self._latest_day:
+            self._latest_day = day
+            first_day = day - config.ANALYTICS_RETENTION_DAYS + 1
+            for store in (self._daily, self._incidents):
+                for key in [key for key in store if key < first_day]:
+                    del store[key]
+            self._closed_days_cache = {}
+        if minute > self._latest_minute:
+            self._latest_minute = minute
+            first_minute = minute - config.ANALYTICS_ROLLING_WINDOW_SECONDS // MINUTE
+            for key in [key for key in self._recent if key < first_minute]:
+                del self._recent[key]
+
+    def _services(self) -> Dict[str, Any]:
+        """Счетчики по статусам, категориям, типам и регионам из текущего снапшота"""
+        if self._services_version == services_snapshot.version:
+            return self._services_summary
+
+        status_counts = dict.fromkeys(STATUSES, 0)
+        categories: Dict[str, Dict[str, Any]] = {}
+        types: Dict[str, int] = {}
+        regions: Dict[str, int] = {}
+        for service in services_snapshot.payload:
+            status = service.get("status")
+            status_counts[status] = status_counts.get(status, 0) + 1
+            category = categories.setdefault(service.get("category") or "Unknown", {"total": 0, **dict.fromkeys(STATUSES, 0)})
+            category["total"] += 1
+            category[status] = category.get(status, 0) + 1
+            service_type = service.get("type") or "Unknown"
+            types[service_type] = types.get(service_type, 0) + 1
+            region = service.get("region") or "Unknown"
+            regions[region] = regions.get(region, 0) + 1
+
+        total = sum(status_counts.values())
+        for category in categories.values():
+            category["operationalPercentage"] = round(category["operational"] / category["total"] * 100, 2)
+        self._services_summary = {
+            "total": total,
+            "statusCounts": status_counts,
+            "operationalPercentage": round(status_counts["operational"] / total * 100, 2) if total else 0.0,
+            "categories": categories,
+            "types": types,
+            "regions": regions,
+        }
+        self._services_version = services_snapshot.version
+        return self._services_summary
+
+    def summary(self, start: date, end: date, uptime: Dict[str, List[int]]) -> Dict[str, Any]:
+        """
+        Сводка для страницы аналитики за дни [start, end] (средние по сервисам и инциденты).
+        uptime - длительности статусов по сервисам за тот же диапазон (storage.get_uptime)
+        """
+        first_day = _day(datetime.combine(start, time()))
+        last_day = _day(datetime.combine(end, time()))
+        services = self._services()
+        # Скользящее окно отсчитывается от текущего времени, даже если новые сэмплы перестали приходить
+        self._prune(to_epoch(datetime.now()))
+
+        # Средние за диапазон дат: прошедшие дни - из кэша, текущий день досуммируется при каждом запросе
+        current_day = max(self._latest_day, _day(datetime.now()))
+        range_sums = {
+            service_id: list(sums)
+            for service_id, sums in self._closed_days(first_day, min(last_day, current_day - 1)).items()
+        }
+        if first_day <= current_day <= last_day:
+            for service_id, sums in self._daily.get(current_day, {}).items():
+                _merge_sums(range_sums.setdefault(service_id, _new_sums()), sums)
+
+        # Скользящие средние по сервисам
+        rolling_sums: Dict[str, MetricSums] = {}
+        for per_service in self._recent.values():
+            for service_id, sums in per_service.items():
+                _merge_sums(rolling_sums.setdefault(service_id, _new_sums()), sums)
+
+        # Инциденты за диапазон: итоги, по сервисам и по дням
+        incident_totals = [0, 0, 0, 0, 0, 0, 0.0]
+        incidents_by_service: Dict[str, IncidentCounters] = {}
+        incidents_by_day = []
+        for day in range(first_day, last_day + 1):
+            day_totals = [0, 0, 0, 0]
+            for service_id, counters in self._incidents.get(day, {}).items():
+                per_service = incidents_by_service.setdefault(service_id, [0, 0, 0, 0, 0, 0, 0.0])
+                for index, value in enumerate(counters):
+                    per_service[index] += value
+                    incident_totals[index] += value
+                for index in range(4):
+                    day_totals[index] += counters[index]
+            incidents_by_day.append({
+                "date": (date(1970, 1, 1) + timedelta(days=day)).isoformat(),
+                "total": day_totals[0],
+                **{severity: day_totals[1 + index] for index, severity in enumerate(SEVERITIES)},
+            })
+
+        # Нагрузка по сервисам, скользящие средние и доступность за диапазон по категориям
+        category_rolling: Dict[str, MetricSums] = {}
+        overall_uptime = empty_durations()
+        category_uptime: Dict[str, List[int]] = {}
+        service_rows = []
+        for service in services_snapshot.payload:
+            service_id = service["id"]
+            category = service.get("category") or "Unknown"
+            rolling = rolling_sums.get(service_id)
+            if rolling:
+                _merge_sums(category_rolling.setdefault(category, _new_sums()), rolling)
+            durations = uptime.get(service_id) or ()
+            add_durations(overall_uptime, durations)
+            add_durations(category_uptime.setdefault(category, empty_durations()), durations)
+            incidents = incidents_by_service.get(service_id, [0, 0, 0, 0])
+            service_rows.append({
+                "serviceId": service_id,
+                "name": service.get("name"),
+                "category": service.get("category"),
+                "status": service.get("status"),
+                **_means(range_sums.get(service_id)),
+                "incidents": incidents[0],
+                "critical": incidents[3],
+            })
+
+        resolved = incident_totals[5]
+        return {
+            "generatedAt": datetime.now().isoformat(),
+            "range": {"start": start.isoformat(), "end": end.isoformat()},
+            "services": {
+                **services,
+                "uptimePercentage": uptime_summary(overall_uptime)["uptimePercentage"],
+                "categories": {
+                    name: {
+                        **category,
+                        "uptimePercentage": uptime_summary(category_uptime.get(name) or empty_durations())["uptimePercentage"],
+                        "rolling": _means(category_rolling.get(name)),
+                    }
+                    for name, category in services["categories"].items()
+                },
+            },
+            "incidents": {
+                "total": incident_totals[0],
+                "active": incident_totals[4],
+                "bySeverity": {severity: incident_totals[1 + index] for index, severity in enumerate(SEVERITIES)},
+                "mttrMinutes": round(incident_totals[6] / resolved) if resolved else 0,
+                "byDay": incidents_by_day,
+            },
+            "metrics": {
+                "rollingWindowSeconds": config.ANALYTICS_ROLLING_WINDOW_SECONDS,
+                "rolling": _means(self._total(rolling_sums)),
+                "range": _means(self._total(range_sums)),
+                "services": service_rows,
+            },
+        }
+
+    def _closed_days(self, first_day: int, last_day: int) -> Dict[str, MetricSums]:
+        if first_day > last_day:
+            return {}
+        key = (first_day, last_day)
+        cached = self._closed_days_cache.get(key)
+        if cached is None:
+            cached = {}
+            for day in range(first_day, last_day + 1):
+                for service_id, sums in self._daily.get(day, {}).items():
+                    _merge_sums(cached.setdefault(service_id, _new_sums()), sums)
+            if len(self._closed_days_cache) >= CLOSED_DAYS_CACHE_SIZE:
+                self._closed_days_cache = {}
+            self._closed_days_cache[key] = cached
+        return cached
+
+    @staticmethod
+    def _total(per_service: Dict[str, MetricSums]) -> MetricSums:
+        total = _new_sums()
+        for sums in per_service.values():
+            _merge_sums(total, sums)
+        return total
+
+
+# Глобальный экземпляр: обновляется событиями записи метрик и инцидентов
+analytics = AnalyticsAggregates()
+event_hub.listen("metrics", analytics.record_metrics)
+event_hub.listen("incidents", analytics.record_incidents)
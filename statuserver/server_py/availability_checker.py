@@ -0,0 +1,202 @@
+"""
+Проверка доступности сервисов по адресу
+Массовая проверка всего каталога: общий пул соединений, ограничение параллельности,
+ограничение частоты запросов к одному хосту, быстрый режим (только TCP-соединение)
+и кэш результатов с TTL. В хранилище записываются только смены статуса
+"""
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import config
+from http_client import get_http_client, request_timeout
+from models import Service, ServiceStatus
+
+# http - HEAD-запрос (код ответа < 400), tcp - только установка TCP-соединения
+ProbeMode = Literal["http", "tcp"]
+PROBE_MODES = ("http", "tcp")
+
+
+class ProbeResult:
+    """Результат одной проверки"""
+
+    def __init__(self, address: str, port: Optional[int], mode: ProbeMode, available: bool,
+                 latency: float, error: Optional[str] = None):
+        self.address = address
+        self.port = port
+        self.mode = mode
+        self.available = available
+        self.latency = latency
+        self.error = error
+        self.checked_at = time.monotonic()
+
+    def to_dict(self, cached: bool = False) -> Dict[str, Any]:
+        return {
+            "address": self.address,
+            "port": self.port,
+            "mode": self.mode,
+            "available": self.available,
+            "latencyMs": round(self.latency * 1000, 1),
+            "error": self.error,
+            "cached": cached,
+        }
+
+
+def probe_target(address: str, port: Optional[int]) -> Tuple[str, str, int]:
+    """URL для HTTP-проверки, хост и порт для TCP-проверки"""
+    if "://" in address:
+        parts = urlsplit(address)
+        host = parts.hostname or ""
+        default_port = 443 if parts.scheme == "https" else 80
+        tcp_port = port or parts.port or default_port
+        url = address if not port else f"{parts.scheme}://{host}:{port}{parts.path}"
+        return url, host, tcp_port
+
+    host = address.split("/", 1)[0]
+    if ":" in host and not port:
+        host, _, raw_port = host.rpartition(":")
+        port = int(raw_port) if raw_port.isdigit() else None
+    url = f"http://{host}:{port}" if port else f"http://{address}"
+    return url, host, port or 80
+
+
+class AvailabilityChecker:
+    """Параллельные проверки доступности с кэшем и ограничением частоты по хостам"""
+
+    def __init__(
+        self,
+        concurrency: int = config.AVAILABILITY_CONCURRENCY,
+        per_host_interval: float = config.AVAILABILITY_PER_HOST_INTERVAL,
+        cache_ttl: float = config.AVAILABILITY_CACHE_TTL_SECONDS,
+        timeout: float = config.AVAILABILITY_TIMEOUT
+    ):
+        self.concurrency = max(1, concurrency)
+        self.per_host_interval = per_host_interval
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._cache: Dict[Tuple[str, Optional[int], str], ProbeResult] = {}
+        # Время, раньше которого нельзя начинать следующую проверку хоста
+        self._host_next_slot: Dict[str, float] = {}
+        self.stats = {"sweeps": 0, "probes": 0, "cacheHits": 0, "transitions": 0, "lastSweepMs": None}
+
+    async def check(self, address: str, port: Optional[int] = None, mode: ProbeMode = "http",
+                    use_cache: bool = True) -> Dict[str, Any]:
+        """Проверить один адрес"""
+        return (await self.check_many([(address, port)], mode, use_cache))[0]
+
+    async def check_many(self, targets: Iterable[Tuple[str, Optional[int]]], mode: ProbeMode = "http",
+                         use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Проверить адреса параллельно, результаты - в порядке targets"""
+        self._prune_cache()
+        return await asyncio.gather(*(self._check_cached(address, port, mode, use_cache) for address, port in targets))
+
+    async def sweep(self, storage, mode: Optional[ProbeMode] = None, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Проверить все сервисы с адресом и записать смены статуса:
+        доступен -> operational, недоступен -> down. Статусы maintenance и degraded
+        (для доступного сервиса) проверкой не перезаписываются
+        """
+        mode = mode or config.AVAILABILITY_MODE
+        started = time.monotonic()
+        services = [service for service in await storage.get_services() if service.address]
+        results = await self.check_many(((s.address, s.port) for s in services), mode, use_cache)
+
+        changes: Dict[str, ServiceStatus] = {}
+        for service, result in zip(services, results):
+            status = self._transition(service, result["available"])
+            if status:
+                changes[service.id] = status
+        if changes:
+            await storage.update_service_statuses(changes)
+
+        elapsed = time.monotonic() - started
+        self.stats["sweeps"] += 1
+        self.stats["transitions"] += len(changes)
+        self.stats["lastSweepMs"] = round(elapsed * 1000, 1)
+        return {
+            "checked": len(results),
+            "available": sum(1 for result in results if result["available"]),
+            "updated": len(changes),
+            "durationMs": self.stats["lastSweepMs"],
+            "results": [
+                {"serviceId": service.id, "name": service.name, **result}
+                for service, result in zip(services, results)
+            ],
+        }
+
+    @staticmethod
+    def _transition(service: Service, available: bool) -> Optional[ServiceStatus]:
+        if service.status == "maintenance":
+            return None
+        if available:
+            return None if service.status in ("operational", "degraded") else "operational"
+        return None if service.status == "down" else "down"
+
+    async def _check_cached(self, address: str, port: Optional[int], mode: ProbeMode,
+                            use_cache: bool) -> Dict[str, Any]:
+        key = (address, port, mode)
+        cached = self._cache.get(key)
+        if use_cache and cached and time.monotonic() - cached.checked_at < self.cache_ttl:
+            self.stats["cacheHits"] += 1
+            return cached.to_dict(cached=True)
+
+        result = await self._probe(address, port, mode)
+        self._cache[key] = result
+        return result.to_dict()
+
+    async def _probe(self, address: str, port: Optional[int], mode: ProbeMode) -> ProbeResult:
+        try:
+            url, host, tcp_port = probe_target(address, port)
+        except ValueError as error:
+            return ProbeResult(address, port, mode, False, 0.0, str(error))
+        await self._wait_host_slot(host)
+
+        async with self._semaphore:
+            self.stats["probes"] += 1
+            started = time.monotonic()
+            try:
+                if mode == "tcp":
+                    await self._probe_tcp(host, tcp_port)
+                    available = True
+                else:
+                    response = await get_http_client().head(url, timeout=request_timeout(self.timeout))
+                    available = response.status_code < 400
+                return ProbeResult(address, port, mode, available, time.monotonic() - started)
+            except (OSError, asyncio.TimeoutError, httpx.HTTPError, httpx.InvalidURL, ValueError) as error:
+                return ProbeResult(address, port, mode, False, time.monotonic() - started,
+                                   str(error) or type(error).__name__)
+
+    async def _probe_tcp(self, host: str, port: int):
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    async def _wait_host_slot(self, host: str):
+        """Не чаще одной проверки хоста за per_host_interval: слот резервируется до ожидания"""
+        if self.per_host_interval <= 0:
+            return
+        now = time.monotonic()
+        slot = max(now, self._host_next_slot.get(host, 0.0))
+        self._host_next_slot[host] = slot + self.per_host_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _prune_cache(self):
+        now = time.monotonic()
+        expired = [key for key, result in self._cache.items() if now - result.checked_at >= self.cache_ttl]
+        for key in expired:
+            del self._cache[key]
+        stale_hosts = [host for host, slot in self._host_next_slot.items() if slot < now]
+        for host in stale_hosts:
+            del self._host_next_slot[host]
+
+
+# Глобальный экземпляр
+availability_checker = AvailabilityChecker()
@@ -0,0 +1,82 @@
+"""
+Circuit breaker для внешних API
+Доступность источника определяется по результатам реальных запросов, а не отдельной проверкой
+"""
+import time
+from typing import Any, Callable, Dict, Literal, Optional
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: источник считается недоступным до конца паузы"""
+
+
+class CircuitBreaker:
+    """
+    closed    - запросы идут как обычно, подряд идущие ошибки считаются;
+    open      - после failure_threshold ошибок запросы не отправляются cooldown секунд;
+    half_open - после паузы пропускается один пробный запрос: успех закрывает цепь, ошибка снова открывает
+
+    clock - источник монотонного времени в секундах (в тестах подменяется)
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._clock = clock
+        self._state: CircuitState = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == "open" and self._clock() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return self._state
+
+    @property
+    def is_healthy(self) -> bool:
+        """Цепь закрыта и последний запрос был успешным"""
+        return self._state == "closed" and self._failures == 0
+
+    def allow_request(self) -> bool:
+        """Можно ли отправить запрос сейчас (в half_open - только один пробный одновременно)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+
+        now = self._clock()
+        # Пробный запрос, который так и не завершился (например, отменен), не блокирует цепь навсегда
+        if self._probe_started_at is not None and now - self._probe_started_at < self.cooldown:
+            return False
+        self._state = "half_open"
+        self._probe_started_at = now
+        return True
+
+    def record_success(self):
+        if self._state != "closed":
+            print(f"✓ {self.name}: соединение восстановлено")
+        self._state = "closed"
+        self._failures = 0
+        self._probe_started_at = None
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_started_at = None
+        if self._state == "half_open" or self._failures >= self.failure_threshold:
+            if self._state == "closed":
+                print(f"⚡ {self.name} недоступен: запросы приостановлены на {self.cooldown:g} сек")
+            self._state = "open"
+            self._opened_at = self._clock()
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self._state == "open":
+            retry_in = round(max(0.0, self.cooldown - (self._clock() - self._opened_at)), 1)
+        return {"state": self.state, "failures": self._failures, "retryIn": retry_in}
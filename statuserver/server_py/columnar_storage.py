@@ -0,0 +1,255 @@
+"""
+Хранилище SQLite с компактным форматом сырых метрик
+Сэмпл - это целочисленный id, номер серии (сервиса), время в микросекундах от эпохи и три REAL-колонки
+вместо UUID-ключа, текстового service_id и ISO-строки времени в каждой строке server_metrics
+"""
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from db_storage import DatabaseStorage
+from models import ServerMetrics, InsertServerMetrics
+from timeseries import EPOCH, narrow_range
+
+# Метка времени сэмпла - микросекунды от эпохи, как и в остальном хранилище "как UTC"
+MICROSECONDS = 1_000_000
+
+# Размер пачки при переносе сэмплов из server_metrics
+MIGRATION_BATCH_SIZE = 50000
+
+# id сэмпла - псевдоним rowid (INTEGER PRIMARY KEY): он отдается клиентам и входит в курсор
+# пагинации, поэтому объявлен явно - неявные rowid VACUUM может перенумеровать
+SAMPLES_COLUMNS = "(id INTEGER PRIMARY KEY, series INTEGER NOT NULL, ts INTEGER NOT NULL, cpu_usage REAL, ram_usage REAL, disk_usage REAL)"
+
+
+def to_micros(dt: datetime) -> int:
+    """Наивное время -> микросекунды от эпохи"""
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(micros: int) -> datetime:
+    """Микросекунды от эпохи -> наивное время"""
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class ColumnarStorage(DatabaseStorage):
+    """
+    DatabaseStorage, в котором сырые метрики лежат в metric_samples.
+    Сервисы, инциденты, история статусов и агрегаты 1m/1h - те же таблицы, что и у DatabaseStorage.
+    """
+
+    def __init__(self, db_path: str = "data/services.db"):
+        # service_id -> номер серии, изменяется только в потоке-писателе
+        self._series: Dict[str, int] = {}
+        super().__init__(db_path)
+
+    def _init_db(self, conn: sqlite3.Connection):
+        """Таблицы DatabaseStorage + серии и сэмплы метрик"""
+        super()._init_db(conn)
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS metric_series (
+                id INTEGER PRIMARY KEY,
+                service_id TEXT NOT NULL UNIQUE
+            )
+        """)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS metric_samples {SAMPLES_COLUMNS}")
+        self._migrate_implicit_rowid(conn)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_samples_series_ts ON metric_samples(series, ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_samples_ts ON metric_samples(ts)")
+
+        self._migrate_server_metrics(conn)
+        self._series = {row["service_id"]: row["id"] for row in cursor.execute("SELECT * FROM metric_series")}
+
+    def _migrate_implicit_rowid(self, conn: sqlite3.Connection):
+        """Пересоздать metric_samples без явного id (ранний формат), сохранив текущие rowid как id"""
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(metric_samples)")]
+        if "id" in columns:
+            return
+
+        conn.execute("ALTER TABLE metric_samples RENAME TO metric_samples_old")
+        conn.execute("DROP INDEX IF EXISTS idx_samples_series_ts")
+        conn.execute("DROP INDEX IF EXISTS idx_samples_ts")
+        conn.execute(f"CREATE TABLE metric_samples {SAMPLES_COLUMNS}")
+        conn.execute("""
+            INSERT INTO metric_samples (id, series, ts, cpu_usage, ram_usage, disk_usage)
+            SELECT rowid, series, ts, cpu_usage, ram_usage, disk_usage FROM metric_samples_old
+        """)
+        conn.execute("DROP TABLE metric_samples_old")
+        print("🗜️ metric_samples: id сэмплов закреплены явным первичным ключом")
+
+    def _migrate_server_metrics(self, conn: sqlite3.Connection):
+        """Перенести сырые метрики, записанные DatabaseStorage, в metric_samples (при смене STORAGE_TYPE)"""
+        total = conn.execute("SELECT COUNT(*) FROM server_metrics").fetchone()[0]
+        if not total:
+            return
+
+        conn.execute("INSERT OR IGNORE INTO metric_series (service_id) SELECT DISTINCT service_id FROM server_metrics")
+        series = {row["service_id"]: row["id"] for row in conn.execute("SELECT * FROM metric_series")}
+
+        rows = conn.execute("""
+            SELECT service_id, timestamp, cpu_usage, ram_usage, disk_usage
+            FROM server_metrics ORDER BY timestamp
+        """)
+        while True:
+            batch = rows.fetchmany(MIGRATION_BATCH_SIZE)
+            if not batch:
+                break
+            conn.executemany(
+                "INSERT INTO metric_samples (series, ts, cpu_usage, ram_usage, disk_usage) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (series[row[0]], to_micros(datetime.fromisoformat(row[1])), row[2], row[3], row[4])
+                    for row in batch
+                ]
+            )
+        conn.execute("DELETE FROM server_metrics")
+        print(f"🗜️ Метрики перенесены в колоночный формат: {total} записей")
+
+    def _series_id(self, conn: sqlite3.Connection, service_id: str) -> int:
+        """Номер серии сервиса, серия создается при первой записи (только в потоке-писателе)"""
+        series = self._series.get(service_id)
+        if series is None:
+            conn.execute("INSERT OR IGNORE INTO metric_series (service_id) VALUES (?)", (service_id,))
+            series = conn.execute("SELECT id FROM metric_series WHERE service_id = ?", (service_id,)).fetchone()[0]
+            self._series[service_id] = series
+        return series
+
+    @staticmethod
+    def _samples_filter(
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime]
+    ) -> Tuple[List[str], list]:
+        """Условия WHERE по серии и диапазону времени (индекс series, ts)"""
+        conditions, params = [], []
+        if service_id:
+            conditions.append("m.series = (SELECT id FROM metric_series WHERE service_id = ?)")
+            params.append(service_id)
+        if start:
+            conditions.append("m.ts >= ?")
+            params.append(to_micros(start))
+        if end:
+            conditions.append("m.ts <= ?")
+            params.append(to_micros(end))
+        return conditions, params
+
+    def _get_server_metrics(
+        self,
+        conn: sqlite3.Connection,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        limit: Optional[int],
+        cursor: Optional[Tuple[datetime, str]]
+    ) -> List[ServerMetrics]:
+        conditions, params = self._samples_filter(service_id, start, end)
+        if cursor:
+            cursor_timestamp, cursor_id = cursor
+            if not cursor_id.isdigit():
+                raise ValueError("Invalid cursor")
+            cursor_ts = to_micros(cursor_timestamp)
+            conditions.append("m.ts <= ? AND (m.ts < ? OR m.id < ?)")
+            params.extend([cursor_ts, cursor_ts, int(cursor_id)])
+
+        sql = """
+            SELECT m.id, s.service_id, m.ts, m.cpu_usage, m.ram_usage, m.disk_usage
+            FROM metric_samples m JOIN metric_series s ON s.id = m.series
+        """
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY m.ts DESC, m.id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        # Все сэмплы одного цикла синхронизации имеют общую метку времени - переводим ее один раз
+        timestamps: Dict[int, datetime] = {}
+        metrics = []
+        for sample_id, service, ts, cpu, ram, disk in conn.execute(sql, params):
+            timestamp = timestamps.get(ts)
+            if timestamp is None:
+                timestamp = timestamps[ts] = from_micros(ts)
+            metrics.append(ServerMetrics(
+                id=str(sample_id),
+                service_id=service,
+                cpu_usage=cpu,
+                ram_usage=ram,
+                disk_usage=disk,
+                timestamp=timestamp
+            ))
+        return metrics
+
+    def _raw_partials_sql(
+        self,
+        step: int,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        lower: Optional[int],
+        upper: Optional[int]
+    ) -> Tuple[str, list]:
+        start, end, lower, upper = narrow_range(start, end, lower, upper)
+        conditions, params = self._samples_filter(service_id, start, end)
+        if lower is not None:
+            conditions.append("m.ts >= ?")
+            params.append(lower * MICROSECONDS)
+        if upper is not None:
+            conditions.append("m.ts < ?")
+            params.append(upper * MICROSECONDS)
+
+        sql = """
+            SELECT s.service_id, m.ts / ? * ? AS bucket,
+                   COUNT(*),
+                   SUM(m.cpu_usage), MIN(m.cpu_usage), MAX(m.cpu_usage),
+                   SUM(m.ram_usage), MIN(m.ram_usage), MAX(m.ram_usage),
+                   SUM(m.disk_usage), MIN(m.disk_usage), MAX(m.disk_usage)
+            FROM metric_samples m JOIN metric_series s ON s.id = m.series
+        """
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " GROUP BY m.series, bucket"
+        # Интервал в микросекундах: делим на step * 10^6 и переводим начало обратно в секунды
+        return sql, [step * MICROSECONDS, step] + params
+
+    async def _delete_raw_metrics_before(self, cutoff: int) -> int:
+        return await self._delete_in_batches(
+            "DELETE FROM metric_samples WHERE id IN "
+            "(SELECT id FROM metric_samples WHERE ts < ? LIMIT ?)",
+            cutoff * MICROSECONDS
+        )
+
+    def _create_server_metrics_bulk(self, conn: sqlite3.Connection, insert_metrics_list: List[InsertServerMetrics]) -> List[ServerMetrics]:
+        try:
+            return self._insert_samples(conn, insert_metrics_list)
+        except Exception:
+            # Новые серии откатились вместе с транзакцией - кэш перечитается при следующей записи
+            self._series.clear()
+            raise
+
+    def _insert_samples(self, conn: sqlite3.Connection, insert_metrics_list: List[InsertServerMetrics]) -> List[ServerMetrics]:
+        timestamp = datetime.now()
+        ts = to_micros(timestamp)
+        series = [self._series_id(conn, item.service_id) for item in insert_metrics_list]
+        # id назначаются явно, чтобы вставить все одним executemany (lastrowid есть только у execute).
+        # Сэмплы пишет только поток-писатель; чужая запись между MAX и INSERT дала бы ошибку
+        # уникальности и откат транзакции, а не перепутанные id
+        first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM metric_samples").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO metric_samples (id, series, ts, cpu_usage, ram_usage, disk_usage) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (first_id + offset, series[offset], ts, item.cpu_usage, item.ram_usage, item.disk_usage)
+                for offset, item in enumerate(insert_metrics_list)
+            ]
+        )
+        return [
+            ServerMetrics(
+                id=str(first_id + offset),
+                service_id=item.service_id,
+                cpu_usage=item.cpu_usage,
+                ram_usage=item.ram_usage,
+                disk_usage=item.disk_usage,
+                timestamp=timestamp
+            )
+            for offset, item in enumerate(insert_metrics_list)
+        ]
@@ -0,0 +1,197 @@
+"""
+Сжатие ответов (br, если установлен пакет brotli, иначе gzip)
+Ответ целиком сжимается, только если он не меньше COMPRESSION_MIN_SIZE; потоковые ответы
+(экспорт, статика) сжимаются по частям со сбросом буфера на каждой части. SSE не сжимается:
+события должны доходить до клиента сразу.
+Сжатое тело - другое представление ресурса, поэтому к его сильному ETag добавляется
+суффикс кодировки ("...-gzip"), а из If-None-Match суффикс снимается до передачи в приложение.
+Vary: Accept-Encoding ставится на все ответы, в том числе несжатые: иначе общий кэш
+может отдать несжатое тело клиенту с gzip/br или наоборот
+"""
+import zlib
+from typing import Optional, Set
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Кодировки в порядке предпочтения
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "image/svg+xml", "text/")
+STREAM_TYPE = "text/event-stream"
+
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """Кодировка из заголовка Accept-Encoding (с учетом q=0 и *)"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def is_compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return (
+        "content-encoding" not in headers
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+        and not content_type.startswith(STREAM_TYPE)
+    )
+
+
+def vary_accept_encoding(start: Message) -> Message:
+    """Добавить Accept-Encoding в Vary начала ответа"""
+    headers = MutableHeaders(raw=list(start["headers"]))
+    headers.add_vary_header("Accept-Encoding")
+    return {**start, "headers": headers.raw}
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag сжатого представления: "abc" -> "abc-gzip" """
+    return etag[:-1] + f'-{encoding}"' if etag.endswith('"') else etag
+
+
+class Compressor:
+    """Потоковый компрессор выбранной кодировки"""
+
+    def __init__(self, encoding: str):
+        self._brotli = encoding == "br"
+        if self._brotli:
+            self._compressor = brotli.Compressor(quality=config.BROTLI_QUALITY)
+        else:
+            # 16 + MAX_WBITS - формат gzip (заголовок и контрольная сумма)
+            self._compressor = zlib.compressobj(config.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Сжать часть тела; промежуточные части сбрасываются, чтобы клиент получал их сразу"""
+        if self._brotli:
+            return self._compressor.process(data) + (self._compressor.finish() if final else self._compressor.flush())
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: сжатие ответов по Accept-Encoding клиента"""
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = config.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            async def send_with_vary(message: Message):
+                if message["type"] == "http.response.start":
+                    message = vary_accept_encoding(message)
+                await send(message)
+
+            await self.app(scope, receive, send_with_vary)
+            return
+
+        scope, revalidated = self._strip_etag_suffix(scope, encoding)
+        responder = CompressionResponder(send, encoding, self.minimum_size, revalidated)
+        await self.app(scope, receive, responder.send)
+
+    @staticmethod
+    def _strip_etag_suffix(scope: Scope, encoding: str):
+        """
+        Снять суффикс кодировки с ETag в If-None-Match. Возвращает новый scope
+        и ETag, которые клиент прислал с суффиксом (в ответе 304 суффикс возвращается)
+        """
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        suffix = f'-{encoding}"'
+        if not if_none_match or suffix not in if_none_match:
+            return scope, set()
+
+        revalidated = set()
+        candidates = []
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate.endswith(suffix):
+                candidate = candidate[:-len(suffix)] + '"'
+                revalidated.add(candidate[2:] if candidate.startswith("W/") else candidate)
+            candidates.append(candidate)
+
+        headers = MutableHeaders(raw=list(scope["headers"]))
+        headers["if-none-match"] = ", ".join(candidates)
+        return {**scope, "headers": headers.raw}, revalidated
+
+
+class CompressionResponder:
+    """
+    Обертка send одного ответа. Заголовки задерживаются до первой части тела:
+    по ней видно, потоковый ли ответ и какого он размера
+    """
+
+    def __init__(self, send: Send, encoding: str, minimum_size: int, revalidated: Set[str]):
+        self._send = send
+        self._encoding = encoding
+        self._minimum_size = minimum_size
+        self._revalidated = revalidated
+        self._start: Optional[Message] = None
+        self._compressor: Optional[Compressor] = None
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            self._start = message
+            return
+
+        if self._start is not None:
+            start, self._start = self._start, None
+            if message["type"] == "http.response.body":
+                start, message = self._begin(start, message)
+            await self._send(start)
+        elif self._compressor is not None and message["type"] == "http.response.body":
+            final = not message.get("more_body", False)
+            message = {**message, "body": self._compressor.compress(message.get("body", b""), final)}
+        await self._send(message)
+
+    def _begin(self, start: Message, message: Message):
+        start = vary_accept_encoding(start)
+        headers = MutableHeaders(raw=start["headers"])
+        body = message.get("body", b"")
+        streaming = message.get("more_body", False)
+        etag = headers.get("etag")
+
+        if start["status"] == 304:
+            # Клиент проверял сжатое представление - подтверждаем его же ETag
+            if etag and etag.removeprefix("W/") in self._revalidated:
+                headers["etag"] = encoded_etag(etag, self._encoding)
+            return start, message
+
+        if start["status"] < 200 or start["status"] == 204 or not is_compressible(headers):
+            return start, message
+        if not streaming and len(body) < self._minimum_size:
+            return start, message
+
+        self._compressor = Compressor(self._encoding)
+        body = self._compressor.compress(body, final=not streaming)
+        headers["content-encoding"] = self._encoding
+        if etag:
+            headers["etag"] = encoded_etag(etag, self._encoding)
+        if streaming:
+            del headers["content-length"]
+        else:
+            headers["content-length"] = str(len(body))
+        return {**start, "headers": headers.raw}, {**message, "body": body}
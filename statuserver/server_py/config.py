@@ -23,6 +23,75 @@ class Config:
     GRAFANA_URL: Optional[str] = os.getenv("GRAFANA_URL")
     GRAFANA_API_TOKEN: Optional[str] = os.getenv("GRAFANA_API_TOKEN")
     
+    # Общий HTTP-клиент для интеграций (пул keep-alive соединений)
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+    METRICS_API_TIMEOUT: float = float(os.getenv("METRICS_API_TIMEOUT", "30"))
+    GRAFANA_TIMEOUT: float = float(os.getenv("GRAFANA_TIMEOUT", "10"))
+    
+    # Circuit breaker Metrics API: после N ошибок подряд запросы приостанавливаются на паузу
+    METRICS_API_FAILURE_THRESHOLD: int = int(os.getenv("METRICS_API_FAILURE_THRESHOLD", "3"))
+    METRICS_API_COOLDOWN_SECONDS: float = float(os.getenv("METRICS_API_COOLDOWN_SECONDS", "30"))
+    # Режим опроса: all - только /metrics/servers/all, batched - параллельно все эндпоинты со слиянием по серверу
+    METRICS_API_FETCH_MODE: str = os.getenv("METRICS_API_FETCH_MODE", "all")
+    METRICS_API_CONCURRENCY: int = int(os.getenv("METRICS_API_CONCURRENCY", "8"))
+    
+    # SQLite: долгоживущие соединения и настройки производительности
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_READER_POOL_SIZE: int = int(os.getenv("SQLITE_READER_POOL_SIZE", "4"))
+    # Read-through кэш результатов чтения (сервисы, инциденты, история, метрики), 0 - отключен
+    QUERY_CACHE_MAX_MB: float = float(os.getenv("QUERY_CACHE_MAX_MB", "64"))
+    # Как часто проверять записи в БД других процессов (скрипт импорта) для сброса версий и кэша
+    EXTERNAL_WRITES_CHECK_SECONDS: float = float(os.getenv("EXTERNAL_WRITES_CHECK_SECONDS", "5"))
+    
+    # Хранение метрик: сырые данные -> 1-минутные -> 1-часовые агрегаты
+    METRICS_RAW_RETENTION_HOURS: float = float(os.getenv("METRICS_RAW_RETENTION_HOURS", "24"))
+    METRICS_1M_RETENTION_DAYS: float = float(os.getenv("METRICS_1M_RETENTION_DAYS", "30"))
+    METRICS_1H_RETENTION_DAYS: float = float(os.getenv("METRICS_1H_RETENTION_DAYS", "365"))
+    STATUS_HISTORY_RETENTION_DAYS: float = float(os.getenv("STATUS_HISTORY_RETENTION_DAYS", "365"))
+    COMPACTION_INTERVAL_SECONDS: int = int(os.getenv("COMPACTION_INTERVAL_SECONDS", "300"))
+    
+    # Планировщик синхронизаций с внешними источниками
+    METRICS_SYNC_INTERVAL_SECONDS: float = float(os.getenv("METRICS_SYNC_INTERVAL_SECONDS", "1"))
+    GRAFANA_SYNC_INTERVAL_SECONDS: float = float(os.getenv("GRAFANA_SYNC_INTERVAL_SECONDS", "30"))
+    SYNC_JITTER: float = float(os.getenv("SYNC_JITTER", "0.1"))
+    SYNC_MAX_BACKOFF_SECONDS: float = float(os.getenv("SYNC_MAX_BACKOFF_SECONDS", "60"))
+    # Через сколько секунд без успешной синхронизации Grafana сервисы с адресом показываются как loading
+    GRAFANA_STALE_AFTER_SECONDS: float = float(os.getenv("GRAFANA_STALE_AFTER_SECONDS", "0"))
+    
+    # Проверка доступности сервисов по адресу (/api/check-availability)
+    AVAILABILITY_MODE: str = os.getenv("AVAILABILITY_MODE", "http")  # http - HEAD-запрос, tcp - только соединение
+    AVAILABILITY_CONCURRENCY: int = int(os.getenv("AVAILABILITY_CONCURRENCY", "50"))
+    AVAILABILITY_PER_HOST_INTERVAL: float = float(os.getenv("AVAILABILITY_PER_HOST_INTERVAL", "0.2"))
+    AVAILABILITY_CACHE_TTL_SECONDS: float = float(os.getenv("AVAILABILITY_CACHE_TTL_SECONDS", "30"))
+    AVAILABILITY_TIMEOUT: float = float(os.getenv("AVAILABILITY_TIMEOUT", "5"))
+    # Фоновая проверка всего каталога, 0 - отключена
+    AVAILABILITY_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("AVAILABILITY_SWEEP_INTERVAL_SECONDS", "0"))
+    
+    # Агрегаты страницы аналитики: сколько дней хранить суммы и окно скользящих средних
+    ANALYTICS_RETENTION_DAYS: int = int(os.getenv("ANALYTICS_RETENTION_DAYS", "92"))
+    ANALYTICS_ROLLING_WINDOW_SECONDS: int = int(os.getenv("ANALYTICS_ROLLING_WINDOW_SECONDS", "3600"))
+    
+    # Потоковый экспорт (/api/export-services, /api/export-metrics): строк на одно чтение из хранилища
+    EXPORT_CHUNK_SIZE: int = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+    
+    # Сжатие ответов: gzip или br (если установлен пакет brotli), ответы меньше порога не сжимаются
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    GZIP_LEVEL: int = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", "4"))
+    
+    # Live-обновления через Server-Sent Events (/api/stream)
+    STREAM_MAX_SUBSCRIBERS: int = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "5000"))
+    STREAM_QUEUE_SIZE: int = int(os.getenv("STREAM_QUEUE_SIZE", "256"))
+    STREAM_HEARTBEAT_SECONDS: float = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+    
     @classmethod
     def is_development(cls) -> bool:
         """Проверка режима разработки"""
@@ -0,0 +1,68 @@
+"""
+Исполнитель запросов SQLite вне event loop
+Один поток-писатель с очередью задач и пул потоков-читателей, у каждого потока свое соединение
+"""
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, TypeVar
+
+T = TypeVar("T")
+
+
+class StorageExecutor:
+    """Выполняет блокирующие sqlite3-вызовы в выделенных потоках"""
+
+    def __init__(self, open_connection: Callable[..., sqlite3.Connection], readers: int = 4):
+        self._open_connection = open_connection
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        # ThreadPoolExecutor с одним потоком - это поток-писатель с FIFO-очередью задач:
+        # все записи сериализуются без блокировок на стороне вызывающего кода
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        self._readers = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix="sqlite-reader")
+
+    def _connection(self, readonly: bool) -> sqlite3.Connection:
+        """Соединение текущего потока (открывается при первом обращении)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open_connection(readonly=readonly)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _run_read(self, fn: Callable[..., T], args: tuple) -> T:
+        return fn(self._connection(readonly=True), *args)
+
+    def _run_write(self, fn: Callable[..., T], args: tuple) -> T:
+        conn = self._connection(readonly=False)
+        # Одна задача - одна транзакция: коммит при успехе, откат при исключении
+        with conn:
+            return fn(conn, *args)
+
+    async def read(self, fn: Callable[..., T], *args) -> T:
+        """Выполнить fn(conn, *args) в пуле читателей"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_read, fn, args)
+
+    async def write(self, fn: Callable[..., T], *args) -> T:
+        """Выполнить fn(conn, *args) в потоке-писателе одной транзакцией"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._run_write, fn, args)
+
+    def write_sync(self, fn: Callable[..., T], *args) -> T:
+        """Синхронная запись (инициализация схемы и миграции до старта event loop)"""
+        return self._writer.submit(self._run_write, fn, args).result()
+
+    def shutdown(self):
+        """Дождаться завершения задач и закрыть все соединения"""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
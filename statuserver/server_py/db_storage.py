@@ -1,21 +1,46 @@
 """
 Постоянное хранилище данных с использованием SQLite/PostgreSQL
 """
-import os
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 import sqlite3
 import json
 
+from config import config
+from db_executor import StorageExecutor
 from models import (
     Service, InsertService,
     Incident, InsertIncident,
     StatusHistory, InsertStatusHistory,
     ServerMetrics, InsertServerMetrics,
-    ServiceStatus
+    ServerMetricsBucket, ServiceStatus, MetricsPeriodSummary
 )
+from timeseries import (
+    RAW_RESOLUTION, ROLLUP_NAMES, from_epoch, to_epoch, retention,
+    select_resolution, resolution_ranges, merge_partials, narrow_range,
+    REPORT_STEP, report_period_sql, report_summary
+)
+from import_data import ImportProgress, plan_services_upsert
+from uptime import DAY, UPTIME_STATUSES, Transition, accumulate_intervals, split_window, sum_by_service
+from table_versions import TABLES, TableVersions, compacted_tables
+from query_cache import QueryCache, metrics_table
+
+# Таблицы агрегатов метрик по разрешению (секунды), от детального к грубому
+ROLLUP_TABLES = {resolution: f"server_metrics_{name}" for resolution, name in ROLLUP_NAMES.items()}
+
+# Размер пачки при удалении устаревших сырых метрик
+COMPACTION_BATCH_SIZE = 20000
+
+# Строк на один executemany при массовом импорте (шаг отчета о прогрессе)
+IMPORT_CHUNK_SIZE = 5000
+
+# Сколько суток истории статусов сводится за одну транзакцию компакции
+UPTIME_SUMMARY_CHUNK_DAYS = 31
+
+# Максимум параметров в одном IN (...) (лимит SQLite по умолчанию - 999 в старых сборках)
+SQL_VARIABLES_CHUNK = 900
 
 
 class DatabaseStorage:
@@ -24,17 +49,61 @@ class DatabaseStorage:
     def __init__(self, db_path: str = "data/services.db"):
         self.db_path = db_path
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-        self._init_db()
+        
+        # Все обращения к sqlite3 идут через выделенные потоки: один писатель + пул читателей.
+        # В режиме WAL читатели не блокируют писателя и наоборот.
+        self._executor = StorageExecutor(self._open_connection, readers=config.SQLITE_READER_POOL_SIZE)
+        self._executor.write_sync(self._init_db)
+        # Версии таблиц для условных GET и кэша запросов, растут после фиксации каждой записи
+        self.versions = TableVersions()
+        self.query_cache = QueryCache(self.versions)
+        self._data_version: Optional[int] = None
+        self._executor.write_sync(self._data_version_changed)
     
-    def _get_connection(self):
-        """Получить подключение к БД"""
-        conn = sqlite3.connect(self.db_path)
+    def _open_connection(self, readonly: bool = False) -> sqlite3.Connection:
+        """Открыть долгоживущее подключение к БД с настройками из config"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False
+        )
         conn.row_factory = sqlite3.Row
+        if not readonly:
+            conn.execute(f"PRAGMA journal_mode = {config.SQLITE_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA mmap_size = {int(config.SQLITE_MMAP_SIZE)}")
+        # Отрицательное значение cache_size задается в килобайтах
+        conn.execute(f"PRAGMA cache_size = -{int(config.SQLITE_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA busy_timeout = {int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
         return conn
     
-    def _init_db(self):
+    def close(self):
+        """Дождаться завершения запросов и закрыть соединения с БД"""
+        self._executor.shutdown()
+    
+    async def detect_external_writes(self) -> bool:
+        """
+        Проверить, писали ли в БД другие процессы (например, import_services.py).
+        Их записи счетчики не видят, поэтому при изменении растут версии всех таблиц
+        """
+        if await self._executor.write(self._data_version_changed):
+            self.versions.bump(*TABLES)
+            return True
+        return False
+    
+    def _data_version_changed(self, conn: sqlite3.Connection) -> bool:
+        # data_version соединения меняется только от коммитов других соединений,
+        # а читатели пула ничего не пишут - значит, писал другой процесс
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = self._data_version is not None and version != self._data_version
+        self._data_version = version
+        return changed
+    
+    def _init_db(self, conn: sqlite3.Connection):
         """Инициализация таблиц БД"""
-        conn = self._get_connection()
         cursor = conn.cursor()
         
         # Таблица сервисов
@@ -94,14 +163,83 @@ class DatabaseStorage:
             )
         """)
         
+        # Агрегаты метрик (1 мин и 1 час): суммы хранятся, чтобы корректно пересчитывать среднее
+        for table in ROLLUP_TABLES.values():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    service_id TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    samples INTEGER NOT NULL,
+                    cpu_sum REAL, cpu_min REAL, cpu_max REAL,
+                    ram_sum REAL, ram_min REAL, ram_max REAL,
+                    disk_sum REAL, disk_min REAL, disk_max REAL,
+                    PRIMARY KEY (service_id, bucket)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table}(bucket)")
+        
+        # Граница, до которой данные уже свернуты в агрегат каждого уровня
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                resolution INTEGER PRIMARY KEY,
+                watermark INTEGER NOT NULL
+            )
+        """)
+        
+        # Посуточные сводки истории статусов: секунды в каждом статусе
+        status_columns = ", ".join(f"{status} INTEGER NOT NULL DEFAULT 0" for status in UPTIME_STATUSES)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS status_daily (
+                service_id TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                {status_columns},
+                PRIMARY KEY (service_id, day)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_status_daily_day ON status_daily(day)")
+        
+        # Граница (начало суток), до которой история статусов уже сведена в status_daily
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS uptime_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                watermark INTEGER NOT NULL
+            )
+        """)
+        
         # Индексы
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_services_status ON services(status)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_services_category ON services(category)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_service ON status_history(service_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_service ON server_metrics(service_id)")
+        cursor.execute("DROP INDEX IF EXISTS idx_history_service")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_service_time ON status_history(service_id, timestamp)")
+        # Покрывающий: переходы за диапазон читаются без обращения к таблице
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_time ON status_history(timestamp, service_id, status)")
+        # Составной индекс покрывает и фильтр по service_id, и диапазон по времени
+        cursor.execute("DROP INDEX IF EXISTS idx_metrics_service")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_service_time ON server_metrics(service_id, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_time ON server_metrics(timestamp)")
         
-        conn.commit()
-        conn.close()
+        # Миграции схемы/данных по PRAGMA user_version
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # История раньше писалась на каждой синхронизации: схлопываем подряд идущие одинаковые статусы
+            removed = self._collapse_status_history_duplicates(conn)
+            if removed:
+                print(f"🗜️ Миграция status_history: удалено {removed} повторяющихся записей")
+            cursor.execute("PRAGMA user_version = 1")
+    
+    @staticmethod
+    def _collapse_status_history_duplicates(conn: sqlite3.Connection) -> int:
+        """Оставить в истории только переходы: удалить записи со статусом, равным предыдущему"""
+        return conn.execute("""
+            DELETE FROM status_history WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, status,
+                           LAG(status) OVER (PARTITION BY service_id ORDER BY timestamp, id) AS previous_status
+                    FROM status_history
+                )
+                WHERE previous_status = status
+            )
+        """).rowcount
     
     async def seed_data(self):
         """Начальные данные (опционально)"""
@@ -118,42 +256,8 @@ class DatabaseStorage:
         hash_str = format(abs(hash_val), '030x')
         return f"{hash_str[0:8]}-{hash_str[8:12]}-4{hash_str[12:15]}-a{hash_str[15:18]}-{hash_str[18:30]}"
     
-    async def get_services(self) -> List[Service]:
-        """Получить все сервисы"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM services ORDER BY name")
-        rows = cursor.fetchall()
-        conn.close()
-        
-        services = []
-        for row in rows:
-            services.append(Service(
-                id=row["id"],
-                name=row["name"],
-                description=row["description"],
-                category=row["category"],
-                region=row["region"],
-                status=row["status"],
-                type=row["type"],
-                icon=row["icon"],
-                address=row["address"],
-                port=row["port"],
-                updated_at=datetime.fromisoformat(row["updated_at"])
-            ))
-        return services
-    
-    async def get_service(self, service_id: str) -> Optional[Service]:
-        """Получить сервис по ID"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM services WHERE id = ?", (service_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if not row:
-            return None
-        
+    @staticmethod
+    def _row_to_service(row: sqlite3.Row) -> Service:
         return Service(
             id=row["id"],
             name=row["name"],
@@ -168,16 +272,83 @@ class DatabaseStorage:
             updated_at=datetime.fromisoformat(row["updated_at"])
         )
     
+    @staticmethod
+    def _row_to_incident(row: sqlite3.Row) -> Incident:
+        return Incident(
+            id=row["id"],
+            service_id=row["service_id"],
+            title=row["title"],
+            description=row["description"],
+            status=row["status"],
+            severity=row["severity"],
+            started_at=datetime.fromisoformat(row["started_at"]),
+            resolved_at=datetime.fromisoformat(row["resolved_at"]) if row["resolved_at"] else None,
+            created_at=datetime.fromisoformat(row["created_at"])
+        )
+    
+    @staticmethod
+    def _row_to_status_history(row: sqlite3.Row) -> StatusHistory:
+        return StatusHistory(
+            id=row["id"],
+            service_id=row["service_id"],
+            status=row["status"],
+            timestamp=datetime.fromisoformat(row["timestamp"])
+        )
+    
+    @staticmethod
+    def _row_to_server_metrics(row: sqlite3.Row) -> ServerMetrics:
+        return ServerMetrics(
+            id=row["id"],
+            service_id=row["service_id"],
+            cpu_usage=row["cpu_usage"],
+            ram_usage=row["ram_usage"],
+            disk_usage=row["disk_usage"],
+            timestamp=datetime.fromisoformat(row["timestamp"])
+        )
+    
+    async def get_services(self) -> List[Service]:
+        """Получить все сервисы"""
+        return await self.query_cache.get("services", (), "services", lambda: self._executor.read(self._get_services))
+    
+    def _get_services(self, conn: sqlite3.Connection) -> List[Service]:
+        rows = conn.execute("SELECT * FROM services ORDER BY name").fetchall()
+        return [self._row_to_service(row) for row in rows]
+    
+    async def get_services_page(self, limit: int, after: Optional[Tuple[str, str]] = None) -> List[Service]:
+        """Страница сервисов в порядке (name, id) после ключа after - для потокового экспорта"""
+        return await self._executor.read(self._get_services_page, limit, after)
+    
+    def _get_services_page(self, conn: sqlite3.Connection, limit: int, after: Optional[Tuple[str, str]]) -> List[Service]:
+        if after:
+            rows = conn.execute(
+                "SELECT * FROM services WHERE (name, id) > (?, ?) ORDER BY name, id LIMIT ?",
+                (*after, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM services ORDER BY name, id LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_service(row) for row in rows]
+    
+    async def get_service(self, service_id: str) -> Optional[Service]:
+        """Получить сервис по ID"""
+        return await self._executor.read(self._get_service, service_id)
+    
+    def _get_service(self, conn: sqlite3.Connection, service_id: str) -> Optional[Service]:
+        row = conn.execute("SELECT * FROM services WHERE id = ?", (service_id,)).fetchone()
+        return self._row_to_service(row) if row else None
+    
     async def create_service(self, insert_service: InsertService) -> Service:
         """Создать сервис"""
+        service = await self._executor.write(self._create_service, insert_service)
+        self.versions.bump("services", "status_history")
+        return service
+    
+    def _create_service(self, conn: sqlite3.Connection, insert_service: InsertService) -> Service:
         service_id = self._generate_deterministic_id(insert_service)
         updated_at = datetime.now()
-        
-        conn = self._get_connection()
         cursor = conn.cursor()
         
         # Проверяем, существует ли сервис
-        cursor.execute("SELECT id FROM services WHERE id = ?", (service_id,))
+        cursor.execute("SELECT id, status FROM services WHERE id = ?", (service_id,))
         existing = cursor.fetchone()
         
         if existing:
@@ -212,9 +383,6 @@ class DatabaseStorage:
                 updated_at.isoformat()
             ))
         
-        conn.commit()
-        conn.close()
-        
         service = Service(
             id=service_id,
             name=insert_service.name,
@@ -229,95 +397,182 @@ class DatabaseStorage:
             updated_at=updated_at
         )
         
-        await self.create_status_history(InsertStatusHistory(
-            service_id=service_id,
-            status=service.status,
-            timestamp=updated_at
-        ))
+        # История пишется в той же транзакции и только при смене статуса
+        if not existing or existing["status"] != service.status:
+            self._create_status_history(conn, InsertStatusHistory(
+                service_id=service_id,
+                status=service.status,
+                timestamp=updated_at
+            ))
         
         return service
     
+    async def upsert_services(
+        self,
+        services: List[InsertService],
+        dry_run: bool = False,
+        progress: Optional[ImportProgress] = None
+    ) -> Dict[str, Any]:
+        """
+        Массовый импорт: одна транзакция, INSERT ... ON CONFLICT DO UPDATE пачками,
+        неизменные сервисы не перезаписываются. dry_run - только diff, без записи
+        """
+        if dry_run:
+            return await self._executor.read(self._upsert_services, services, True, None)
+        report = await self._executor.write(self._upsert_services, services, False, progress)
+        if report["created"] or report["updated"]:
+            self.versions.bump("services", "status_history")
+        return report
+    
+    def _upsert_services(
+        self,
+        conn: sqlite3.Connection,
+        services: List[InsertService],
+        dry_run: bool,
+        progress: Optional[ImportProgress]
+    ) -> Dict[str, Any]:
+        incoming = [(self._generate_deterministic_id(service), service) for service in services]
+        service_ids = list({service_id for service_id, _ in incoming})
+        existing: Dict[str, Service] = {}
+        for offset in range(0, len(service_ids), SQL_VARIABLES_CHUNK):
+            chunk = service_ids[offset:offset + SQL_VARIABLES_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT * FROM services WHERE id IN ({placeholders})", chunk):
+                existing[row["id"]] = self._row_to_service(row)
+        
+        writes, report = plan_services_upsert(incoming, existing)
+        if dry_run:
+            return report
+        
+        updated_at = datetime.now().isoformat()
+        for offset in range(0, len(writes), IMPORT_CHUNK_SIZE):
+            chunk = writes[offset:offset + IMPORT_CHUNK_SIZE]
+            conn.executemany("""
+                INSERT INTO services (
+                    id, name, description, category, region, status,
+                    type, icon, address, port, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    name = excluded.name, description = excluded.description,
+                    category = excluded.category, region = excluded.region, status = excluded.status,
+                    type = excluded.type, icon = excluded.icon,
+                    address = excluded.address, port = excluded.port,
+                    updated_at = excluded.updated_at
+            """, [
+                (
+                    service_id, s.name, s.description, s.category, s.region, s.status or "operational",
+                    s.type, s.icon, s.address, s.port, updated_at
+                )
+                for service_id, s, _ in chunk
+            ])
+            # История - для новых сервисов и смены статуса, как в create_service
+            conn.executemany(
+                "INSERT INTO status_history (id, service_id, status, timestamp) VALUES (?, ?, ?, ?)",
+                [
+                    (str(uuid.uuid4()), service_id, s.status or "operational", updated_at)
+                    for service_id, s, record_history in chunk if record_history
+                ]
+            )
+            if progress:
+                progress(offset + len(chunk), len(writes))
+        return report
+    
     async def update_service_status(self, service_id: str, status: ServiceStatus) -> Optional[Service]:
-        """Обновить статус сервиса"""
-        updated_at = datetime.now()
+        """Обновить статус сервиса (запись в историю только при смене статуса)"""
+        service, changed = await self._executor.write(self._update_service_status, service_id, status)
+        if changed:
+            self.versions.bump("services", "status_history")
+        return service
+    
+    def _update_service_status(self, conn: sqlite3.Connection, service_id: str, status: ServiceStatus) -> Tuple[Optional[Service], bool]:
+        """Сервис после обновления и признак, что запись действительно изменилась"""
+        current = self._get_service(conn, service_id)
+        if current is None or current.status == status:
+            return current, False
         
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        updated_at = datetime.now()
+        conn.execute("""
             UPDATE services SET status = ?, updated_at = ?
             WHERE id = ?
         """, (status, updated_at.isoformat(), service_id))
         
-        if cursor.rowcount == 0:
-            conn.close()
-            return None
-        
-        conn.commit()
-        conn.close()
-        
-        await self.create_status_history(InsertStatusHistory(
+        self._create_status_history(conn, InsertStatusHistory(
             service_id=service_id,
             status=status,
             timestamp=updated_at
         ))
         
-        return await self.get_service(service_id)
+        return current.model_copy(update={"status": status, "updated_at": updated_at}), True
+    
+    async def update_service_statuses(self, statuses: Dict[str, ServiceStatus]) -> List[Service]:
+        """
+        Обновить статусы нескольких сервисов одной транзакцией.
+        Пишутся только реальные переходы, возвращаются изменившиеся сервисы.
+        Неизвестные ID пропускаются.
+        """
+        if not statuses:
+            return []
+        changed = await self._executor.write(self._update_service_statuses, statuses)
+        if changed:
+            self.versions.bump("services", "status_history")
+        return changed
+    
+    def _update_service_statuses(self, conn: sqlite3.Connection, statuses: Dict[str, ServiceStatus]) -> List[Service]:
+        service_ids = list(statuses)
+        current: Dict[str, Service] = {}
+        for offset in range(0, len(service_ids), SQL_VARIABLES_CHUNK):
+            chunk = service_ids[offset:offset + SQL_VARIABLES_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT * FROM services WHERE id IN ({placeholders})", chunk):
+                current[row["id"]] = self._row_to_service(row)
+        
+        updated_at = datetime.now()
+        changed = [
+            service.model_copy(update={"status": statuses[service_id], "updated_at": updated_at})
+            for service_id, service in current.items()
+            if service.status != statuses[service_id]
+        ]
+        if not changed:
+            return []
+        
+        conn.executemany(
+            "UPDATE services SET status = ?, updated_at = ? WHERE id = ?",
+            [(s.status, updated_at.isoformat(), s.id) for s in changed]
+        )
+        conn.executemany(
+            "INSERT INTO status_history (id, service_id, status, timestamp) VALUES (?, ?, ?, ?)",
+            [(str(uuid.uuid4()), s.id, s.status, updated_at.isoformat()) for s in changed]
+        )
+        return changed
     
     async def get_incidents(self) -> List[Incident]:
         """Получить все инциденты"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM incidents ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        conn.close()
-        
-        incidents = []
-        for row in rows:
-            incidents.append(Incident(
-                id=row["id"],
-                service_id=row["service_id"],
-                title=row["title"],
-                description=row["description"],
-                status=row["status"],
-                severity=row["severity"],
-                started_at=datetime.fromisoformat(row["started_at"]),
-                resolved_at=datetime.fromisoformat(row["resolved_at"]) if row["resolved_at"] else None,
-                created_at=datetime.fromisoformat(row["created_at"])
-            ))
-        return incidents
+        return await self.query_cache.get("incidents", (), "incidents", lambda: self._executor.read(self._get_incidents))
+    
+    def _get_incidents(self, conn: sqlite3.Connection) -> List[Incident]:
+        rows = conn.execute("SELECT * FROM incidents ORDER BY created_at DESC").fetchall()
+        return [self._row_to_incident(row) for row in rows]
     
     async def get_incident(self, incident_id: str) -> Optional[Incident]:
         """Получить инцидент по ID"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM incidents WHERE id = ?", (incident_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if not row:
-            return None
-        
-        return Incident(
-            id=row["id"],
-            service_id=row["service_id"],
-            title=row["title"],
-            description=row["description"],
-            status=row["status"],
-            severity=row["severity"],
-            started_at=datetime.fromisoformat(row["started_at"]),
-            resolved_at=datetime.fromisoformat(row["resolved_at"]) if row["resolved_at"] else None,
-            created_at=datetime.fromisoformat(row["created_at"])
-        )
+        return await self._executor.read(self._get_incident, incident_id)
+    
+    def _get_incident(self, conn: sqlite3.Connection, incident_id: str) -> Optional[Incident]:
+        row = conn.execute("SELECT * FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+        return self._row_to_incident(row) if row else None
     
     async def create_incident(self, insert_incident: InsertIncident) -> Incident:
         """Создать инцидент"""
+        incident = await self._executor.write(self._create_incident, insert_incident)
+        self.versions.bump("incidents")
+        return incident
+    
+    def _create_incident(self, conn: sqlite3.Connection, insert_incident: InsertIncident) -> Incident:
         incident_id = str(uuid.uuid4())
         created_at = datetime.now()
         started_at = insert_incident.started_at or created_at
         
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        conn.execute("""
             INSERT INTO incidents (
                 id, service_id, title, description, status, severity,
                 started_at, resolved_at, created_at
@@ -329,8 +584,6 @@ class DatabaseStorage:
             insert_incident.resolved_at.isoformat() if insert_incident.resolved_at else None,
             created_at.isoformat()
         ))
-        conn.commit()
-        conn.close()
         
         return Incident(
             id=incident_id,
@@ -346,39 +599,38 @@ class DatabaseStorage:
     
     async def get_status_history(self, service_id: str) -> List[StatusHistory]:
         """Получить историю статусов"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        return await self.query_cache.get(
+            "status_history", service_id, "status_history",
+            lambda: self._executor.read(self._get_status_history, service_id)
+        )
+    
+    def _get_status_history(self, conn: sqlite3.Connection, service_id: str) -> List[StatusHistory]:
+        rows = conn.execute("""
             SELECT * FROM status_history
             WHERE service_id = ?
             ORDER BY timestamp DESC
-        """, (service_id,))
-        rows = cursor.fetchall()
-        conn.close()
-        
-        history = []
-        for row in rows:
-            history.append(StatusHistory(
-                id=row["id"],
-                service_id=row["service_id"],
-                status=row["status"],
-                timestamp=datetime.fromisoformat(row["timestamp"])
-            ))
-        return history
+        """, (service_id,)).fetchall()
+        return [self._row_to_status_history(row) for row in rows]
     
     async def create_status_history(self, insert_history: InsertStatusHistory) -> StatusHistory:
         """Создать запись истории статуса"""
+        history = await self._executor.write(self._create_status_history, insert_history)
+        self.versions.bump("status_history")
+        return history
+    
+    def _create_status_history(self, conn: sqlite3.Connection, insert_history: InsertStatusHistory) -> StatusHistory:
         history_id = str(uuid.uuid4())
         timestamp = insert_history.timestamp or datetime.now()
         
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        conn.execute("""
             INSERT INTO status_history (id, service_id, status, timestamp)
             VALUES (?, ?, ?, ?)
         """, (history_id, insert_history.service_id, insert_history.status, timestamp.isoformat()))
-        conn.commit()
-        conn.close()
+        # Запись задним числом: уже сведенные сутки пересчитаются на следующей компакции
+        conn.execute(
+            "UPDATE uptime_state SET watermark = ? WHERE watermark > ?",
+            (to_epoch(timestamp) // DAY * DAY, to_epoch(timestamp))
+        )
         
         return StatusHistory(
             id=history_id,
@@ -386,77 +638,508 @@ class DatabaseStorage:
             status=insert_history.status,
             timestamp=timestamp
         )
+
+    async def get_uptime(self, start: datetime, end: datetime, service_id: Optional[str] = None) -> Dict[str, List[int]]:
+        """Секунды в каждом статусе (порядок UPTIME_STATUSES) по сервисам за [start, end)"""
+        return await self._executor.read(self._get_uptime, start, end, service_id)
+
+    def _get_uptime(self, conn: sqlite3.Connection, start: datetime, end: datetime, service_id: Optional[str]) -> Dict[str, List[int]]:
+        conn.execute("BEGIN")
+        try:
+            full_days, edges = split_window(to_epoch(start), to_epoch(end), self._get_uptime_watermark(conn))
+            by_service: Dict[str, List[int]] = {}
+            if full_days:
+                # По первичному ключу (service_id, day): диапазон суток для каждого сервиса каталога
+                service_filter = "service_id = ?" if service_id else "service_id IN (SELECT id FROM services)"
+                sums = ", ".join(f"SUM({status})" for status in UPTIME_STATUSES)
+                rows = conn.execute(f"""
+                    SELECT service_id, {sums} FROM status_daily
+                    WHERE {service_filter} AND day >= ? AND day < ?
+                    GROUP BY service_id
+                """, (*([service_id] if service_id else []), *full_days)).fetchall()
+                by_service = {row[0]: list(row[1:]) for row in rows}
+            for lower, upper in edges:
+                sum_by_service(accumulate_intervals(self._history_transitions(conn, lower, upper, service_id), lower, upper), by_service)
+        finally:
+            conn.execute("COMMIT")
+        return by_service
+
+    @staticmethod
+    def _history_transitions(conn: sqlite3.Connection, lower: int, upper: int, service_id: Optional[str] = None) -> List[Transition]:
+        """
+        Переходы внутри (lower, upper) и последняя запись каждого сервиса не позже lower
+        (статус на начало диапазона) - по индексам, без просмотра всей истории
+        """
+        lower_ts, upper_ts = from_epoch(lower).isoformat(), from_epoch(upper).isoformat()
+        service_filter = "AND service_id = ?" if service_id else ""
+        rows = conn.execute(f"""
+            SELECT h.service_id, h.status, h.timestamp FROM services s
+            JOIN status_history h ON h.rowid = (
+                SELECT rowid FROM status_history
+                WHERE service_id = s.id AND timestamp <= ?
+                ORDER BY timestamp DESC LIMIT 1
+            )
+            {"WHERE s.id = ?" if service_id else ""}
+            UNION ALL
+            SELECT service_id, status, timestamp FROM status_history
+            WHERE timestamp > ? AND timestamp < ? {service_filter}
+            ORDER BY 1, 3
+        """, (
+            lower_ts, *([service_id] if service_id else []),
+            lower_ts, upper_ts, *([service_id] if service_id else [])
+        )).fetchall()
+        return [(row[0], row[1], to_epoch(datetime.fromisoformat(row[2]))) for row in rows]
+
+    @staticmethod
+    def _get_uptime_watermark(conn: sqlite3.Connection) -> Optional[int]:
+        row = conn.execute("SELECT watermark FROM uptime_state WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    async def get_server_metrics(
+        self,
+        service_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[Tuple[datetime, str]] = None,
+        use_cache: bool = True
+    ) -> List[ServerMetrics]:
+        """
+        Получить метрики серверов (новые сначала), с фильтром по времени и keyset-пагинацией.
+        use_cache=False - мимо кэша запросов (однократные чтения вроде экспорта)
+        """
+        load = lambda: self._executor.read(self._get_server_metrics, service_id, start, end, limit, cursor)
+        if not use_cache:
+            return await load()
+        return await self.query_cache.get(
+            "server_metrics", (service_id, start, end, limit, cursor), metrics_table(end, cursor), load
+        )
     
-    async def get_server_metrics(self, service_id: Optional[str] = None) -> List[ServerMetrics]:
-        """Получить метрики серверов"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    @staticmethod
+    def _metrics_filter(service_id: Optional[str], start: Optional[datetime], end: Optional[datetime]) -> Tuple[List[str], list]:
+        """Условия WHERE по сервису и диапазону времени (индекс service_id, timestamp)"""
+        conditions, params = [], []
+        if service_id:
+            conditions.append("service_id = ?")
+            params.append(service_id)
+        if start:
+            conditions.append("timestamp >= ?")
+            params.append(start.isoformat())
+        if end:
+            conditions.append("timestamp <= ?")
+            params.append(end.isoformat())
+        return conditions, params
+    
+    def _get_server_metrics(
+        self,
+        conn: sqlite3.Connection,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        limit: Optional[int],
+        cursor: Optional[Tuple[datetime, str]]
+    ) -> List[ServerMetrics]:
+        conditions, params = self._metrics_filter(service_id, start, end)
+        if cursor:
+            cursor_timestamp, cursor_id = cursor
+            # Одна граница по индексу времени: с "a < ? OR (a = ? AND ...)" SQLite объединяет два поиска и сортирует все
+            conditions.append("timestamp <= ? AND (timestamp < ? OR id < ?)")
+            params.extend([cursor_timestamp.isoformat(), cursor_timestamp.isoformat(), cursor_id])
+        
+        sql = "SELECT * FROM server_metrics"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        rows = conn.execute(sql, params).fetchall()
+        return [self._row_to_server_metrics(row) for row in rows]
+    
+    async def get_server_metrics_buckets(
+        self,
+        step: int,
+        service_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        use_cache: bool = True
+    ) -> List[ServerMetricsBucket]:
+        """Метрики, агрегированные по интервалам step секунд (avg/min/max на стороне SQLite)"""
+        load = lambda: self._executor.read(self._get_server_metrics_buckets, step, service_id, start, end, limit)
+        if not use_cache:
+            return await load()
+        return await self.query_cache.get(
+            "server_metrics_buckets", (step, service_id, start, end, limit), metrics_table(end), load
+        )
+    
+    def _get_server_metrics_buckets(
+        self,
+        conn: sqlite3.Connection,
+        step: int,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        limit: Optional[int]
+    ) -> List[ServerMetricsBucket]:
+        resolution = select_resolution(step, start, datetime.now())
+        
+        # Watermark и агрегаты читаются в одной транзакции, чтобы компакция не дала дублей или пропусков
+        conn.execute("BEGIN")
+        try:
+            watermarks = self._get_watermarks(conn)
+            rows = []
+            for level, lower, upper in resolution_ranges(resolution, watermarks):
+                if level == RAW_RESOLUTION:
+                    rows.extend(self._raw_partials(conn, step, service_id, start, end, lower))
+                else:
+                    rows.extend(self._rollup_partials(conn, level, step, service_id, start, end, lower, upper))
+        finally:
+            conn.execute("COMMIT")
         
+        buckets = merge_partials(rows, step)
+        return buckets[:limit] if limit else buckets
+    
+    def _raw_partials(
+        self,
+        conn: sqlite3.Connection,
+        step: int,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        lower: Optional[int]
+    ) -> list:
+        """Частичные агрегаты по сырым записям (avg/min/max на стороне SQLite)"""
+        sql, params = self._raw_partials_sql(step, service_id, start, end, lower, None)
+        return [tuple(row) for row in conn.execute(sql, params)]
+    
+    def _raw_partials_sql(
+        self,
+        step: int,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        lower: Optional[int],
+        upper: Optional[int]
+    ) -> Tuple[str, list]:
+        """SELECT частичных агрегатов по сырым записям в диапазоне [lower, upper) с шагом step"""
+        start, end, lower, upper = narrow_range(start, end, lower, upper)
+        conditions, params = self._metrics_filter(service_id, start, end)
+        if lower is not None:
+            conditions.append("timestamp >= ?")
+            params.append(from_epoch(lower).isoformat())
+        if upper is not None:
+            conditions.append("timestamp < ?")
+            params.append(from_epoch(upper).isoformat())
+        
+        # strftime округляет дробные секунды до миллисекунд ("...:59.9996" -> следующая секунда),
+        # поэтому они отбрасываются заранее: сэмпл попадает в свой интервал, как в to_epoch
+        sql = """
+            SELECT service_id,
+                   CAST(strftime('%s', substr(timestamp, 1, 19)) AS INTEGER) / ? * ? AS bucket,
+                   COUNT(*),
+                   SUM(cpu_usage), MIN(cpu_usage), MAX(cpu_usage),
+                   SUM(ram_usage), MIN(ram_usage), MAX(ram_usage),
+                   SUM(disk_usage), MIN(disk_usage), MAX(disk_usage)
+            FROM server_metrics
+        """
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " GROUP BY service_id, bucket"
+        return sql, [step, step] + params
+    
+    def _rollup_partials(
+        self,
+        conn: sqlite3.Connection,
+        resolution: int,
+        step: int,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        lower: Optional[int],
+        upper: Optional[int]
+    ) -> list:
+        """Частичные агрегаты из таблицы уровня resolution в диапазоне [lower, upper)"""
+        sql, params = self._rollup_partials_sql(resolution, step, service_id, start, end, lower, upper)
+        return [tuple(row) for row in conn.execute(sql, params)]
+    
+    @staticmethod
+    def _rollup_partials_sql(
+        resolution: int,
+        step: int,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        lower: Optional[int],
+        upper: Optional[int]
+    ) -> Tuple[str, list]:
+        """SELECT частичных агрегатов из таблицы уровня resolution"""
+        conditions, params = [], []
         if service_id:
-            cursor.execute("""
-                SELECT * FROM server_metrics
-                WHERE service_id = ?
-                ORDER BY timestamp DESC
-            """, (service_id,))
-        else:
-            cursor.execute("SELECT * FROM server_metrics ORDER BY timestamp DESC")
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        metrics = []
-        for row in rows:
-            metrics.append(ServerMetrics(
-                id=row["id"],
-                service_id=row["service_id"],
-                cpu_usage=row["cpu_usage"],
-                ram_usage=row["ram_usage"],
-                disk_usage=row["disk_usage"],
-                timestamp=datetime.fromisoformat(row["timestamp"])
-            ))
-        return metrics
+            conditions.append("service_id = ?")
+            params.append(service_id)
+        
+        # Границы сводятся к одному диапазону [first, last], чтобы индекс по bucket использовался с обеих сторон
+        first_bounds, last_bounds = [], []
+        if start:
+            # Интервал агрегата, в который попадает начало диапазона, тоже нужен
+            first_bounds.append(to_epoch(start) - resolution + 1)
+        if lower is not None:
+            first_bounds.append(lower)
+        if end:
+            last_bounds.append(to_epoch(end))
+        if upper is not None:
+            last_bounds.append(upper - 1)
+        if first_bounds:
+            conditions.append("bucket >= ?")
+            params.append(max(first_bounds))
+        if last_bounds:
+            conditions.append("bucket <= ?")
+            params.append(min(last_bounds))
+        
+        sql = f"""
+            SELECT service_id, bucket / ? * ? AS b, SUM(samples),
+                   SUM(cpu_sum), MIN(cpu_min), MAX(cpu_max),
+                   SUM(ram_sum), MIN(ram_min), MAX(ram_max),
+                   SUM(disk_sum), MIN(disk_min), MAX(disk_max)
+            FROM {ROLLUP_TABLES[resolution]}
+        """
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " GROUP BY service_id, b"
+        return sql, [step, step] + params
+    
+    async def get_metrics_report(self, start: datetime, end: datetime) -> List[MetricsPeriodSummary]:
+        """Средние метрики каждого сервиса по времени суток за [start, end]"""
+        return await self._executor.read(self._get_metrics_report, start, end)
+    
+    def _get_metrics_report(self, conn: sqlite3.Connection, start: datetime, end: datetime) -> List[MetricsPeriodSummary]:
+        """
+        Один запрос: почасовые частичные агрегаты со всех уровней хранения (UNION ALL по
+        диапазонам времени, каждый - по индексу), свертка по сервису и времени суток и имя из services
+        """
+        resolution = select_resolution(REPORT_STEP, start, datetime.now())
+        
+        conn.execute("BEGIN")
+        try:
+            selects, params = [], []
+            for level, lower, upper in resolution_ranges(resolution, self._get_watermarks(conn)):
+                if level == RAW_RESOLUTION:
+                    sql, level_params = self._raw_partials_sql(REPORT_STEP, None, start, end, lower, upper)
+                else:
+                    sql, level_params = self._rollup_partials_sql(level, REPORT_STEP, None, start, end, lower, upper)
+                selects.append(sql)
+                params.extend(level_params)
+            
+            rows = conn.execute(f"""
+                WITH partials (
+                    service_id, bucket, samples,
+                    cpu_sum, cpu_min, cpu_max, ram_sum, ram_min, ram_max, disk_sum, disk_min, disk_max
+                ) AS ({" UNION ALL ".join(selects)})
+                SELECT p.service_id, s.name, s.category, {report_period_sql("p.bucket")} AS period,
+                       SUM(p.samples), SUM(p.cpu_sum), SUM(p.ram_sum), SUM(p.disk_sum)
+                FROM partials p JOIN services s ON s.id = p.service_id
+                GROUP BY p.service_id, period
+            """, params).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        
+        return [report_summary(*row) for row in rows]
+    
+    @staticmethod
+    def _get_watermarks(conn: sqlite3.Connection) -> Dict[int, int]:
+        return {row["resolution"]: row["watermark"] for row in conn.execute("SELECT * FROM rollup_state")}
+    
+    async def compact(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Компакция: свернуть сырые метрики в 1-минутные и 1-часовые агрегаты,
+        затем удалить данные старше сроков хранения из config
+        """
+        now = now or datetime.now()
+        stats = await self._executor.write(self._rollup_metrics, now)
+        watermarks = await self._executor.read(lambda conn: self._get_watermarks(conn))
+        
+        # Удаляем только то, что уже свернуто в следующий уровень
+        raw_cutoff = min(to_epoch(now - retention(RAW_RESOLUTION)), watermarks.get(60, 0))
+        stats["deleted_raw"] = await self._delete_raw_metrics_before(raw_cutoff)
+
+        # Закрытые сутки истории статусов -> status_daily, пачками по UPTIME_SUMMARY_CHUNK_DAYS
+        stats["summarized_status_days"] = 0
+        while True:
+            days = await self._executor.write(self._summarize_status_history, now)
+            stats["summarized_status_days"] += days
+            if days < UPTIME_SUMMARY_CHUNK_DAYS:
+                break
+
+        stats.update(await self._executor.write(self._expire_rollups_and_history, now, watermarks))
+        self.versions.bump(*compacted_tables(stats))
+        return stats
+
+    def _summarize_status_history(self, conn: sqlite3.Connection, now: datetime) -> int:
+        """Свести в status_daily следующую пачку закрытых суток, вернуть их количество"""
+        watermark = self._get_uptime_watermark(conn)
+        if watermark is None:
+            first = conn.execute("SELECT MIN(timestamp) FROM status_history").fetchone()[0]
+            if first is None:
+                return 0
+            watermark = to_epoch(datetime.fromisoformat(first)) // DAY * DAY
+
+        cutoff = min(to_epoch(now) // DAY * DAY, watermark + UPTIME_SUMMARY_CHUNK_DAYS * DAY)
+        if cutoff <= watermark:
+            return 0
+
+        durations = accumulate_intervals(self._history_transitions(conn, watermark, cutoff), watermark, cutoff)
+        columns = ", ".join(UPTIME_STATUSES)
+        placeholders = ", ".join("?" * len(UPTIME_STATUSES))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO status_daily (service_id, day, {columns}) VALUES (?, ?, {placeholders})",
+            [(service_id, day, *values) for (service_id, day), values in durations.items()]
+        )
+        conn.execute("""
+            INSERT INTO uptime_state (id, watermark) VALUES (1, ?)
+            ON CONFLICT (id) DO UPDATE SET watermark = excluded.watermark
+        """, (cutoff,))
+        return (cutoff - watermark) // DAY
+    
+    def _rollup_metrics(self, conn: sqlite3.Connection, now: datetime) -> Dict[str, int]:
+        watermarks = self._get_watermarks(conn)
+        stats = {}
+        source_watermark = None
+        
+        for resolution, table in ROLLUP_TABLES.items():
+            lower = watermarks.get(resolution, 0)
+            cutoff = to_epoch(now) // resolution * resolution
+            if source_watermark is not None:
+                # Свертываем только то, что уже полностью есть в предыдущем уровне
+                cutoff = min(cutoff, source_watermark // resolution * resolution)
+            
+            rolled = 0
+            if cutoff > lower:
+                if source_watermark is None:
+                    source_sql, params = self._raw_partials_sql(resolution, None, None, None, lower, cutoff)
+                else:
+                    source_sql = f"""
+                        SELECT service_id, bucket / ? * ? AS b, SUM(samples),
+                               SUM(cpu_sum), MIN(cpu_min), MAX(cpu_max),
+                               SUM(ram_sum), MIN(ram_min), MAX(ram_max),
+                               SUM(disk_sum), MIN(disk_min), MAX(disk_max)
+                        FROM {source_table}
+                        WHERE bucket >= ? AND bucket < ?
+                        GROUP BY service_id, b
+                    """
+                    params = [resolution, resolution, lower, cutoff]
+                
+                rolled = conn.execute(f"""
+                    INSERT INTO {table} (
+                        service_id, bucket, samples,
+                        cpu_sum, cpu_min, cpu_max, ram_sum, ram_min, ram_max, disk_sum, disk_min, disk_max
+                    )
+                    {source_sql}
+                    ON CONFLICT (service_id, bucket) DO UPDATE SET
+                        samples = samples + excluded.samples,
+                        cpu_sum = cpu_sum + excluded.cpu_sum,
+                        cpu_min = MIN(cpu_min, excluded.cpu_min),
+                        cpu_max = MAX(cpu_max, excluded.cpu_max),
+                        ram_sum = ram_sum + excluded.ram_sum,
+                        ram_min = MIN(ram_min, excluded.ram_min),
+                        ram_max = MAX(ram_max, excluded.ram_max),
+                        disk_sum = disk_sum + excluded.disk_sum,
+                        disk_min = MIN(disk_min, excluded.disk_min),
+                        disk_max = MAX(disk_max, excluded.disk_max)
+                """, params).rowcount
+                conn.execute("""
+                    INSERT INTO rollup_state (resolution, watermark) VALUES (?, ?)
+                    ON CONFLICT (resolution) DO UPDATE SET watermark = excluded.watermark
+                """, (resolution, cutoff))
+                watermarks[resolution] = cutoff
+            
+            stats[f"rolled_{ROLLUP_NAMES[resolution]}"] = max(rolled, 0)
+            source_watermark = watermarks.get(resolution, 0)
+            source_table = table
+        
+        return stats
+    
+    def _expire_rollups_and_history(self, conn: sqlite3.Connection, now: datetime, watermarks: Dict[int, int]) -> Dict[str, int]:
+        stats = {}
+        resolutions = list(ROLLUP_TABLES)
+        for index, (resolution, table) in enumerate(ROLLUP_TABLES.items()):
+            cutoff = to_epoch(now - retention(resolution))
+            if index + 1 < len(resolutions):
+                cutoff = min(cutoff, watermarks.get(resolutions[index + 1], 0))
+            stats[f"deleted_{ROLLUP_NAMES[resolution]}"] = conn.execute(f"DELETE FROM {table} WHERE bucket < ?", (cutoff,)).rowcount
+        
+        # Сводки статусов хранятся столько же, сколько история
+        history_cutoff = now - timedelta(days=config.STATUS_HISTORY_RETENTION_DAYS)
+        stats["deleted_status_daily"] = conn.execute(
+            "DELETE FROM status_daily WHERE day < ?", (to_epoch(history_cutoff) // DAY * DAY,)
+        ).rowcount
+
+        # Для каждого сервиса сохраняем последнюю запись до границы, чтобы не потерять текущее состояние.
+        # Удаляется только история, уже сведенная в status_daily
+        history_cutoff = min(history_cutoff, from_epoch(self._get_uptime_watermark(conn) or 0)).isoformat()
+        stats["deleted_status_history"] = conn.execute("""
+            DELETE FROM status_history
+            WHERE timestamp < ?
+              AND timestamp < (
+                  SELECT MAX(h.timestamp) FROM status_history h
+                  WHERE h.service_id = status_history.service_id AND h.timestamp < ?
+              )
+        """, (history_cutoff, history_cutoff)).rowcount
+        return stats
+    
+    async def _delete_raw_metrics_before(self, cutoff: int) -> int:
+        """Удалить сырые метрики старше cutoff (секунды от эпохи)"""
+        return await self._delete_in_batches(
+            "DELETE FROM server_metrics WHERE rowid IN "
+            "(SELECT rowid FROM server_metrics WHERE timestamp < ? LIMIT ?)",
+            from_epoch(cutoff).isoformat()
+        )
+    
+    async def _delete_in_batches(self, sql: str, *params) -> int:
+        """Удаление пачками: каждая пачка - своя короткая транзакция, запись метрик не простаивает"""
+        total = 0
+        while True:
+            deleted = await self._executor.write(
+                lambda conn: conn.execute(sql, (*params, COMPACTION_BATCH_SIZE)).rowcount
+            )
+            total += deleted
+            if deleted < COMPACTION_BATCH_SIZE:
+                return total
     
     async def create_server_metrics(self, insert_metrics: InsertServerMetrics) -> ServerMetrics:
         """Создать запись метрик"""
-        metrics_id = str(uuid.uuid4())
+        return (await self.create_server_metrics_bulk([insert_metrics]))[0]
+    
+    async def create_server_metrics_bulk(self, insert_metrics_list: List[InsertServerMetrics]) -> List[ServerMetrics]:
+        """Создать записи метрик одной транзакцией (весь цикл синхронизации)"""
+        if not insert_metrics_list:
+            return []
+        created = await self._executor.write(self._create_server_metrics_bulk, insert_metrics_list)
+        self.versions.bump("server_metrics")
+        return created
+    
+    def _create_server_metrics_bulk(self, conn: sqlite3.Connection, insert_metrics_list: List[InsertServerMetrics]) -> List[ServerMetrics]:
         timestamp = datetime.now()
+        metrics = [
+            ServerMetrics(
+                id=str(uuid.uuid4()),
+                service_id=item.service_id,
+                cpu_usage=item.cpu_usage,
+                ram_usage=item.ram_usage,
+                disk_usage=item.disk_usage,
+                timestamp=timestamp
+            )
+            for item in insert_metrics_list
+        ]
         
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        conn.executemany("""
             INSERT INTO server_metrics (
                 id, service_id, cpu_usage, ram_usage, disk_usage, timestamp
             ) VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            metrics_id, insert_metrics.service_id,
-            insert_metrics.cpu_usage, insert_metrics.ram_usage,
-            insert_metrics.disk_usage, timestamp.isoformat()
-        ))
-        conn.commit()
-        conn.close()
+        """, [
+            (m.id, m.service_id, m.cpu_usage, m.ram_usage, m.disk_usage, timestamp.isoformat())
+            for m in metrics
+        ])
         
-        return ServerMetrics(
-            id=metrics_id,
-            service_id=insert_metrics.service_id,
-            cpu_usage=insert_metrics.cpu_usage,
-            ram_usage=insert_metrics.ram_usage,
-            disk_usage=insert_metrics.disk_usage,
-            timestamp=timestamp
-        )
-
-
-# Выбор хранилища на основе переменной окружения
-def get_storage():
-    """Получить экземпляр хранилища"""
-    storage_type = os.getenv("STORAGE_TYPE", "database")
-    
-    if storage_type == "memory":
-        from storage import MemStorage
-        return MemStorage()
-    else:
-        db_path = os.getenv("DATABASE_PATH", "data/services.db")
-        return DatabaseStorage(db_path)
-
-
-# Глобальный экземпляр хранилища
-storage = get_storage()
+        return metrics
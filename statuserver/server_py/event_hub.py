@@ -0,0 +1,101 @@
+"""
+Рассылка live-обновлений подписчикам /api/stream (Server-Sent Events)
+Событие кодируется один раз и раскладывается по ограниченным очередям подписчиков.
+Подписчик, который не успевает читать, отключается: клиент переподключится и заново загрузит данные
+"""
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from pydantic import BaseModel
+
+from config import config
+from fast_json import dumps
+
+# Через сколько миллисекунд браузер переподключается после разрыва
+STREAM_RETRY_MS = 3000
+
+
+def _jsonable(data: Any) -> Any:
+    """Модели pydantic -> JSON-совместимые структуры (алиасы полей, как в REST API)"""
+    if isinstance(data, BaseModel):
+        return data.model_dump(by_alias=True)
+    if isinstance(data, (list, tuple)):
+        return [_jsonable(item) for item in data]
+    return data
+
+
+def encode_event(event_id: int, event: str, data: Any) -> bytes:
+    """Кадр SSE: id, тип события и JSON в поле data"""
+    return f"id: {event_id}\nevent: {event}\ndata: ".encode() + dumps(_jsonable(data)) + b"\n\n"
+
+
+class Subscriber:
+    """Подписчик потока с ограниченной очередью готовых кадров"""
+
+    def __init__(self, queue_size: int):
+        # None в очереди - сигнал завершить поток
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=queue_size)
+
+
+class EventHub:
+    """Fan-out событий синхронизации всем подключенным клиентам"""
+
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._listeners: Dict[str, List[Callable[[Any], None]]] = {}
+        self._last_event_id = 0
+
+    def listen(self, event: str, callback: Callable[[Any], None]):
+        """Обработчик внутри процесса: вызывается синхронно на каждое событие, даже без подписчиков потока"""
+        self._listeners.setdefault(event, []).append(callback)
+
+    def is_full(self) -> bool:
+        return len(self._subscribers) >= config.STREAM_MAX_SUBSCRIBERS
+
+    def publish(self, event: str, data: Any):
+        """Разослать событие. Вызывается из event loop, не блокируется на медленных клиентах"""
+        for callback in self._listeners.get(event, ()):
+            try:
+                callback(data)
+            except Exception as error:
+                print(f"Event listener for '{event}' failed: {error}")
+
+        if not self._subscribers:
+            return
+
+        self._last_event_id += 1
+        frame = encode_event(self._last_event_id, event, data)
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        """Отключить медленного подписчика: очередь заменяется сигналом завершения"""
+        self._subscribers.discard(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Поток кадров SSE для одного клиента, с heartbeat-комментариями при простое"""
+        subscriber = Subscriber(config.STREAM_QUEUE_SIZE)
+        self._subscribers.add(subscriber)
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n".encode()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), config.STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self._subscribers.discard(subscriber)
+
+
+# Глобальный хаб событий
+event_hub = EventHub()
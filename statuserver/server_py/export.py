@@ -0,0 +1,163 @@
+"""
+Потоковый экспорт сервисов и метрик (JSON, NDJSON, CSV)
+Данные читаются из хранилища пачками по EXPORT_CHUNK_SIZE строк (keyset-пагинация: каждая
+пачка - отдельный короткий запрос по индексу) и кодируются по мере чтения, поэтому память
+не зависит от объема выгрузки, а первые байты уходят сразу после первой пачки.
+Пачки читаются мимо кэша запросов: они нужны один раз и вытеснили бы из него все остальное
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from config import config
+from fast_json import dumps
+from timeseries import from_epoch, retention, select_resolution, to_epoch
+
+EXPORT_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+Rows = AsyncIterator[List[Dict[str, Any]]]
+
+
+def export_fields(model: Type[BaseModel]) -> List[str]:
+    """Колонки CSV - поля модели под именами из REST API"""
+    return [field.alias or name for name, field in model.model_fields.items()]
+
+
+async def services_chunks(storage, chunk_size: Optional[int] = None) -> Rows:
+    """Сервисы пачками в порядке имени"""
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+    after = None
+    while True:
+        services = await storage.get_services_page(chunk_size, after)
+        if services:
+            yield [s.model_dump(mode="json", by_alias=True) for s in services]
+        if len(services) < chunk_size:
+            return
+        after = (services[-1].name, services[-1].id)
+
+
+async def metrics_chunks(
+    storage,
+    service_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: Optional[int] = None
+) -> Rows:
+    """Сырые сэмплы метрик пачками, новые сначала (тот же курсор, что у /api/server-metrics)"""
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+    cursor = None
+    while True:
+        metrics = await storage.get_server_metrics(service_id, start, end, chunk_size, cursor, use_cache=False)
+        if metrics:
+            yield [m.model_dump(mode="json", by_alias=True) for m in metrics]
+        if len(metrics) < chunk_size:
+            return
+        cursor = (metrics[-1].timestamp, metrics[-1].id)
+
+
+async def metric_buckets_chunks(
+    storage,
+    step: int,
+    service_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: Optional[int] = None
+) -> Rows:
+    """
+    Агрегаты по интервалам step, новые сначала. Диапазон режется на окна, кратные step;
+    размер окна подстраивается так, чтобы в него попадало около chunk_size интервалов
+    """
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+    now = datetime.now()
+    end = min(end or now, now)
+    # По умолчанию - все, что хранит уровень, из которого строятся интервалы step
+    start = start or now - retention(select_resolution(step, None, now))
+    services = 1 if service_id else max(1, len(await storage.get_services()))
+    span = step * max(1, chunk_size // services)
+
+    # Окна выровнены по step: интервал целиком попадает ровно в одно окно
+    upper = to_epoch(end) // step * step + step
+    lower_bound = to_epoch(start)
+    while upper > lower_bound:
+        lower = max(upper - span, lower_bound // step * step)
+        window_start = max(from_epoch(lower), start)
+        window_end = min(from_epoch(upper) - timedelta(microseconds=1), end)
+        buckets = await storage.get_server_metrics_buckets(step, service_id, window_start, window_end, use_cache=False)
+        if buckets:
+            yield [b.model_dump(mode="json", by_alias=True) for b in buckets]
+        upper = lower
+
+        # Пустые и редкие окна расширяем, слишком крупные - сужаем
+        if len(buckets) < chunk_size // 2:
+            span *= 2
+        elif len(buckets) > chunk_size * 2:
+            span = max(step, span // 2 // step * step)
+
+
+async def encode_json(chunks: Rows) -> AsyncIterator[bytes]:
+    """JSON-массив, который собирается по частям"""
+    separator = b"["
+    async for rows in chunks:
+        if rows:
+            # Пачка кодируется одним вызовом, от массива отрезаются скобки
+            yield separator + dumps(rows)[1:-1]
+            separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+
+async def encode_ndjson(chunks: Rows) -> AsyncIterator[bytes]:
+    """Одна JSON-запись на строку"""
+    async for rows in chunks:
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+
+
+async def encode_csv(chunks: Rows, fieldnames: List[str]) -> AsyncIterator[bytes]:
+    """CSV с заголовком: каждая пачка пишется в небольшой буфер и сразу отдается"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    async for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def export_response(chunks: Rows, format: str, filename: str, model: Type[BaseModel]) -> StreamingResponse:
+    """
+    Потоковый ответ. Первая пачка читается до отправки заголовков,
+    чтобы ошибка хранилища вернулась обычным HTTP-ответом, а не оборванным файлом
+    """
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def primed() -> Rows:
+        if first is not None:
+            yield first
+            async for rows in chunks:
+                yield rows
+
+    if format == "csv":
+        body = encode_csv(primed(), export_fields(model))
+    elif format == "ndjson":
+        body = encode_ndjson(primed())
+    else:
+        body = encode_json(primed())
+
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}.{format}"}
+    )
@@ -0,0 +1,48 @@
+"""
+Быстрая сериализация JSON для ответов API
+Если установлен orjson, структуры (включая datetime) кодируются им сразу в bytes,
+иначе - стандартным json. Эндпоинты возвращают FastJSONResponse сами: FastAPI тогда
+не прогоняет результат повторно через jsonable_encoder, и каждая модель сериализуется один раз
+"""
+import json
+from datetime import date
+from typing import Any, Dict, Iterable, List
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Типы, которых нет в JSON: даты - ISO 8601, модели - словари с алиасами полей"""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(data: Any) -> bytes:
+    """Компактный JSON в UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+def dump_models(models: Iterable[BaseModel]) -> List[Dict[str, Any]]:
+    """
+    Модели -> словари для dumps. datetime остаются объектами: orjson кодирует их сам,
+    это в несколько раз быстрее model_dump(mode="json")
+    """
+    return [model.model_dump(by_alias=True) for model in models]
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse, который кодирует содержимое через dumps"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,7 +1,10 @@
 import os
-import httpx
 from typing import Dict, List, Any, Optional
-from models import ServiceStatus
+from models import Service, ServiceStatus
+from config import config
+from http_client import get_http_client, request_timeout
+from service_matcher import ServiceMatcher
+from source_health import GRAFANA_SOURCE, source_health
 
 class GrafanaService:
     def __init__(self, storage):
@@ -9,6 +12,8 @@ class GrafanaService:
         self.api_token = os.getenv('GRAFANA_API_TOKEN', '')
         self.dashboard_id = os.getenv('GRAFANA_DASHBOARD_ID', '')
         self.storage = storage
+        self._matcher: Optional[ServiceMatcher] = None
+        self._matcher_key: Optional[int] = None
         
         if not self.grafana_url or not self.api_token:
             print("Grafana configuration is incomplete. Syncing will be disabled.")
@@ -21,82 +26,78 @@ class GrafanaService:
         url = f"{base_url}?query={query}"
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    url,
-                    headers={
-                        'Authorization': f'Bearer {self.api_token}',
-                        'Content-Type': 'application/json',
-                    }
-                )
+            client = get_http_client()
+            response = await client.get(
+                url,
+                headers={
+                    'Authorization': f'Bearer {self.api_token}',
+                    'Content-Type': 'application/json',
+                },
+                timeout=request_timeout(config.GRAFANA_TIMEOUT)
+            )
                 
-                if response.status_code != 200:
-                    raise Exception(f"Grafana API error: {response.status_code} {response.text}")
+            if response.status_code != 200:
+                raise Exception(f"Grafana API error: {response.status_code} {response.text}")
                 
-                data = response.json()
+            data = response.json()
                 
-                if data.get('status') != 'success':
-                    raise Exception(f"Grafana query failed: {data.get('status')}")
+            if data.get('status') != 'success':
+                raise Exception(f"Grafana query failed: {data.get('status')}")
                 
-                return data.get('data', {}).get('result', [])
+            return data.get('data', {}).get('result', [])
         except Exception as error:
             print(f"Failed to fetch Grafana metrics: {error}")
             raise error
     
+    def _get_matcher(self, services: List[Service]) -> ServiceMatcher:
+        """Индекс сопоставления пересобирается только при изменении набора сервисов"""
+        key = ServiceMatcher.fingerprint(services)
+        if self._matcher is None or key != self._matcher_key:
+            self._matcher = ServiceMatcher(services)
+            self._matcher_key = key
+        return self._matcher
+    
     async def sync_service_statuses(self) -> Dict[str, Any]:
         updated = 0
         errors = 0
         
         try:
             metrics = await self.fetch_metrics()
-            services = await self.storage.get_services()
-            
-            for metric in metrics:
-                instance = metric.get('metric', {}).get('instance', '')
-                is_up = metric.get('value', [None, '0'])[1] == '1'
-                new_status: ServiceStatus = 'operational' if is_up else 'down'
-                
-                matching_services = []
-                for service in services:
-                    if not service.address:
-                        continue
-                    
-                    service_address = f"{service.address}:{service.port}" if service.port else service.address
-                    
-                    if (instance and service.address and service.address in instance) or \
-                       instance == service_address or \
-                       (service.name and instance and service.name.lower() in instance.lower()) or \
-                       (instance and service.name and instance.lower() in service.name.lower()):
-                        matching_services.append(service)
-                
-                for service in matching_services:
-                    if service.status != new_status:
-                        try:
-                            await self.storage.update_service_status(service.id, new_status)
-                            updated += 1
-                            print(f"Updated {service.name}: {service.status} -> {new_status}")
-                        except Exception as err:
-                            print(f"Failed to update service {service.id}: {err}")
-                            errors += 1
-            
-            print(f"Grafana sync completed: {updated} updated, {errors} errors")
-            return {'updated': updated, 'errors': errors}
         except Exception as error:
-            print(f"Grafana sync failed - setting all services to loading state: {error}")
-            
-            services = await self.storage.get_services()
-            loading_count = 0
-            
-            for service in services:
-                if service.status != 'loading':
-                    try:
-                        await self.storage.update_service_status(service.id, 'loading')
-                        loading_count += 1
-                    except Exception as err:
-                        print(f"Failed to set loading status for {service.id}: {err}")
-            
-            print(f"Set {loading_count} services to loading state due to Grafana unavailability")
-            return {'updated': loading_count, 'errors': 0, 'skipped': True}
+            # Хранилище не трогаем: "loading" вычисляется при чтении по состоянию источника
+            print(f"Grafana sync failed - statuses will be shown as loading: {error}")
+            source_health.mark_failure(GRAFANA_SOURCE)
+            return {'updated': 0, 'errors': 0, 'skipped': True}
+        
+        services = await self.storage.get_services()
+        matcher = self._get_matcher(services)
+        
+        instances = [metric.get('metric', {}).get('instance', '') for metric in metrics]
+        new_statuses: Dict[str, ServiceStatus] = {}
+        for metric, matched in zip(metrics, matcher.match(instances)):
+            is_up = metric.get('value', [None, '0'])[1] == '1'
+            for index in matched:
+                # Если сервис подходит к нескольким instance, побеждает последний, как и раньше
+                new_statuses[matcher.services[index].id] = 'operational' if is_up else 'down'
+        
+        current = {service.id: service for service in services}
+        changes = {
+            service_id: status for service_id, status in new_statuses.items()
+            if current[service_id].status != status
+        }
+        if changes:
+            try:
+                await self.storage.update_service_statuses(changes)
+                updated = len(changes)
+                for service_id, status in changes.items():
+                    print(f"Updated {current[service_id].name}: {current[service_id].status} -> {status}")
+            except Exception as err:
+                print(f"Failed to update service statuses: {err}")
+                errors = len(changes)
+        
+        source_health.mark_success(GRAFANA_SOURCE)
+        print(f"Grafana sync completed: {updated} updated, {errors} errors")
+        return {'updated': updated, 'errors': errors}
     
     def is_configured(self) -> bool:
         return bool(self.grafana_url and self.api_token)
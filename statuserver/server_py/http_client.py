@@ -0,0 +1,68 @@
+"""
+Общий HTTP-клиент для внешних интеграций
+Один пул keep-alive соединений на процесс вместо нового httpx.AsyncClient на каждый запрос
+"""
+from typing import Optional
+
+import httpx
+
+from config import config
+
+
+def _http2_available() -> bool:
+    """HTTP/2 требует пакет h2 (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HTTPClientManager:
+    """Владелец общего httpx.AsyncClient, жизненным циклом управляет lifespan приложения"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = config.HTTP2_ENABLED
+        if http2 and not _http2_available():
+            print("⚠️ HTTP2_ENABLED=true, но пакет h2 не установлен - используется HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=http2,
+            timeout=httpx.Timeout(config.METRICS_API_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Клиент создается лениво, чтобы им могли пользоваться и скрипты вне lifespan"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+def request_timeout(total: float) -> httpx.Timeout:
+    """Таймаут для конкретного эндпоинта с общим лимитом на установку соединения"""
+    return httpx.Timeout(total, connect=min(total, config.HTTP_CONNECT_TIMEOUT))
+
+
+# Глобальный менеджер HTTP-клиента
+http_clients = HTTPClientManager()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Получить общий HTTP-клиент"""
+    return http_clients.client
@@ -1,5 +1,19 @@
-from typing import Dict, List, Any
-from models import InsertService
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models import InsertService, Service
+
+# Поля каталога, которые задает импорт: по ним строится diff с текущими данными
+IMPORT_FIELDS = ("name", "description", "category", "region", "status", "type", "icon", "address", "port")
+
+# Сколько изменений и ошибок перечислять в отчете, остальные только считаются
+IMPORT_REPORT_LIMIT = 100
+
+# Прогресс импорта: (записано, всего)
+ImportProgress = Callable[[int, int], None]
+
 
 def get_icon_for_type(service_type: str) -> str:
     type_map = {
@@ -18,28 +32,119 @@ def get_icon_for_type(service_type: str) -> str:
     }
     return type_map.get(service_type, 'server')
 
-async def import_services_from_data(storage, data: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> int:
+
+def parse_import_data(data: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> Tuple[List[InsertService], List[Dict[str, Any]]]:
+    """
+    Проверка всего файла до записи: корректные сервисы и список ошибок
+    (окружение, категория, позиция в списке) - одна ошибка не отменяет импорт остальных
+    """
     services: List[InsertService] = []
-    
-    for environment in data.keys():
-        for category in data[environment].keys():
-            items = data[environment][category]
-            
-            for item in items:
-                service = InsertService(
-                    name=item.get('Name', ''),
-                    description=f"{item.get('Type', '')} service",
-                    category=category,
-                    region=environment,
-                    status="operational",
-                    type=item.get('Type'),
-                    icon=get_icon_for_type(item.get('Type', '')),
-                    address=item.get('Address'),
-                    port=item.get('Port')
-                )
-                services.append(service)
-    
-    for service in services:
-        await storage.create_service(service)
-    
-    return len(services)
+    invalid: List[Dict[str, Any]] = []
+
+    for environment, categories in data.items():
+        if not isinstance(categories, dict):
+            invalid.append({"region": environment, "errors": ["Expected an object of categories"]})
+            continue
+        for category, items in categories.items():
+            if not isinstance(items, list):
+                invalid.append({"region": environment, "category": category, "errors": ["Expected a list of services"]})
+                continue
+            for index, item in enumerate(items):
+                if not isinstance(item, dict):
+                    invalid.append({"region": environment, "category": category, "index": index, "errors": ["Expected an object"]})
+                    continue
+                try:
+                    services.append(InsertService(
+                        name=item.get('Name', ''),
+                        description=f"{item.get('Type', '')} service",
+                        category=category,
+                        region=environment,
+                        status="operational",
+                        type=item.get('Type'),
+                        icon=get_icon_for_type(item.get('Type', '')),
+                        address=item.get('Address'),
+                        port=item.get('Port')
+                    ))
+                except ValidationError as e:
+                    errors = [error["msg"] for error in e.errors()]
+                    invalid.append({"region": environment, "category": category, "index": index, "errors": errors})
+
+    return services, invalid
+
+
+def changed_fields(current: Service, incoming: InsertService) -> Dict[str, List[Any]]:
+    """Поля, которые импорт изменит: {поле: [было, станет]}"""
+    changes = {}
+    for field in IMPORT_FIELDS:
+        old, new = getattr(current, field), getattr(incoming, field)
+        if field == "status":
+            new = new or "operational"
+        if old != new:
+            changes[field] = [old, new]
+    return changes
+
+
+def plan_services_upsert(
+    incoming: List[Tuple[str, InsertService]],
+    existing: Dict[str, Service]
+) -> Tuple[List[Tuple[str, InsertService, bool]], Dict[str, Any]]:
+    """
+    Разделить импорт на новые, измененные и неизменные сервисы.
+    Повторы одного ID внутри файла схлопываются (побеждает последний).
+    Возвращает записи (id, сервис, писать ли историю статуса) и отчет с diff
+    """
+    unique: Dict[str, InsertService] = {}
+    for service_id, service in incoming:
+        unique[service_id] = service
+
+    writes: List[Tuple[str, InsertService, bool]] = []
+    report: Dict[str, Any] = {
+        "created": 0, "updated": 0, "unchanged": 0,
+        "duplicates": len(incoming) - len(unique),
+        "changes": [],
+    }
+    for service_id, service in unique.items():
+        current = existing.get(service_id)
+        if current is None:
+            action, fields = "create", {}
+            writes.append((service_id, service, True))
+        else:
+            fields = changed_fields(current, service)
+            if not fields:
+                report["unchanged"] += 1
+                continue
+            action = "update"
+            writes.append((service_id, service, "status" in fields))
+        report["created" if action == "create" else "updated"] += 1
+        if len(report["changes"]) < IMPORT_REPORT_LIMIT:
+            report["changes"].append({"id": service_id, "name": service.name, "action": action, "fields": fields})
+
+    return writes, report
+
+
+async def import_services_from_data(
+    storage,
+    data: Dict[str, Dict[str, List[Dict[str, Any]]]],
+    dry_run: bool = False,
+    progress: Optional[ImportProgress] = None
+) -> Dict[str, Any]:
+    """Импорт каталога одной транзакцией (dry_run - только diff), с отчетом о скорости"""
+    started = time.perf_counter()
+    services, invalid = parse_import_data(data)
+    report = await storage.upsert_services(services, dry_run=dry_run, progress=progress)
+    return import_report(report, len(services), invalid, dry_run, time.perf_counter() - started)
+
+
+def import_report(report: Dict[str, Any], total: int, invalid: List[Dict[str, Any]],
+                  dry_run: bool, elapsed: float) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "dryRun": dry_run,
+        "imported": 0 if dry_run else report["created"] + report["updated"] + report["unchanged"],
+        **{key: report[key] for key in ("created", "updated", "unchanged", "duplicates")},
+        "invalid": len(invalid),
+        "errors": invalid[:IMPORT_REPORT_LIMIT],
+        "changes": report["changes"],
+        "durationMs": round(elapsed * 1000, 1),
+        "servicesPerSecond": round(total / elapsed) if elapsed > 0 else None,
+    }
@@ -9,51 +9,130 @@ from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import httpx
 import time
+from typing import Any, Dict, List
 
 from config import config
 from routes import router
 from storage import storage
 from grafana_service import create_grafana_service
 from metrics_api_client import metrics_client
-from models import InsertServerMetrics
+from models import InsertService, InsertServerMetrics
+from services_snapshot import services_snapshot
+from event_hub import event_hub
+from http_client import http_clients
+from scheduler import sync_scheduler
+from availability_checker import availability_checker
+from analytics import analytics
+from compression import CompressionMiddleware
+
+def build_metrics_batch(metrics_list: List[Dict[str, Any]], service_ids: Dict[str, str]) -> List[InsertServerMetrics]:
+    """
+    Подготовить метрики цикла синхронизации для пакетной записи.
+    Сэмплы пишутся под id сервиса в хранилище (service_ids: id в Metrics API -> id в хранилище),
+    иначе отчеты и выборки по сервису их не увидят
+    """
+    batch = []
+    for metrics_data in metrics_list:
+        service_id = service_ids.get(metrics_data.get('service_id'))
+        cpu_usage = metrics_data.get('cpu_usage')
+        memory_usage = metrics_data.get('memory_usage')
+        disk_usage = metrics_data.get('disk_usage')
+
+        if service_id is None or cpu_usage is None or memory_usage is None or disk_usage is None:
+            print(f"Skipping metrics due to missing data: {metrics_data}")
+            continue
 
-async def sync_metrics_periodically():
-    """Периодическая синхронизация метрик каждые 30 секунд"""
-    while True:
         try:
-            await asyncio.sleep(30)  # Ждем 30 секунд
-
-            api_available = await metrics_client.check_availability()
-            if api_available:
-                # Получаем метрики через правильный метод
-                services, metrics_list = await metrics_client.sync_services_from_api()
-
-                # Сохраняем метрики в базу данных
-                for metrics_data in metrics_list:
-                    try:
-                        # Ensure all required fields are present and handle potential missing keys
-                        service_id = metrics_data.get('service_id')
-                        cpu_usage = metrics_data.get('cpu_usage')
-                        memory_usage = metrics_data.get('memory_usage')
-                        disk_usage = metrics_data.get('disk_usage')
-
-                        if service_id is None or cpu_usage is None or memory_usage is None or disk_usage is None:
-                            print(f"Skipping metrics due to missing data: {metrics_data}")
-                            continue
-
-                        metrics = InsertServerMetrics(
-                            serviceId=service_id,
-                            cpuUsage=cpu_usage,
-                            ramUsage=memory_usage,
-                            diskUsage=disk_usage
-                        )
-                        await storage.create_server_metrics(metrics)
-                    except Exception as e:
-                        print(f"Error saving metrics for service {metrics_data.get('service_id', 'N/A')}: {e}")
-
-                print(f"🔄 Автообновление: {len(metrics_list)} метрик сохранено")
+            batch.append(InsertServerMetrics(
+                serviceId=service_id,
+                cpuUsage=cpu_usage,
+                ramUsage=memory_usage,
+                diskUsage=disk_usage
+            ))
         except Exception as e:
-            print(f"Error in metrics sync: {e}")
+            print(f"Error preparing metrics for service {service_id}: {e}")
+    return batch
+
+
+# id сервера в Metrics API (srv-...) -> id записи в хранилище (детерминированный, по полям сервиса)
+storage_service_ids: Dict[str, str] = {}
+
+
+async def sync_metrics_api() -> bool:
+    """Один цикл синхронизации с Metrics API: сервисы, статусы, метрики и снапшот"""
+    # Доступность определяет circuit breaker клиента по результату самого запроса
+    delta = await metrics_client.sync_services_from_api()
+    if not metrics_client.is_available:
+        # API недоступен - отдаем данные из локального хранилища
+        await services_snapshot.refresh(storage)
+        return False
+
+    if not delta.services:
+        await services_snapshot.refresh(storage)
+        return True
+
+    # В хранилище пишутся только изменения: новые сервисы, смена статуса и новые сэмплы.
+    # Сервер без записи в хранилище создается (или обновляется, если уже есть) через create_service.
+    # Проверяются все серверы цикла, а не только впервые увиденные: если запись упала,
+    # diff уже считает сервер известным, и без этого его сэмплы терялись бы до рестарта
+    for service in delta.services:
+        if service.id in storage_service_ids:
+            continue
+        stored = await storage.create_service(InsertService(
+            name=service.name,
+            description=service.description,
+            category=service.category,
+            region=service.region,
+            status=service.status,
+            type=service.type,
+            icon=service.icon,
+            address=service.address,
+            port=service.port
+        ))
+        storage_service_ids[service.id] = stored.id
+
+    statuses = {
+        storage_service_ids[service_id]: status
+        for service_id, status in delta.status_changes.items()
+        if service_id in storage_service_ids
+    }
+    if statuses:
+        await storage.update_service_statuses(statuses)
+
+    # Сохраняем метрики всего цикла одной транзакцией
+    if delta.metrics_list:
+        created = await storage.create_server_metrics_bulk(build_metrics_batch(delta.metrics_list, storage_service_ids))
+        event_hub.publish("metrics", created)
+
+    # Снапшот отдает те же id, что и хранилище: по ним клиенты фильтруют метрики и историю
+    if delta.changed or services_snapshot.source != "metrics_api":
+        services_snapshot.publish(
+            [service.model_copy(update={"id": storage_service_ids[service.id]}) for service in delta.services],
+            "metrics_api"
+        )
+    return True
+
+
+async def compact_storage():
+    """Компакция: свертка метрик в агрегаты и удаление устаревших данных"""
+    stats = await storage.compact()
+    print(f"🧹 Компакция хранилища: {stats}")
+
+
+async def check_external_writes():
+    """Подхватить записи в БД других процессов (например, import_services.py)"""
+    if await storage.detect_external_writes():
+        print("🔄 БД изменена другим процессом: версии таблиц и кэш запросов сброшены")
+        await services_snapshot.refresh_local(storage)
+
+
+async def sweep_availability():
+    """Фоновая проверка доступности всех сервисов с адресом"""
+    result = await availability_checker.sweep(storage)
+    if result["updated"]:
+        await services_snapshot.refresh_local(storage)
+    print(f"🔎 Проверка доступности: {result['available']}/{result['checked']} доступны, "
+          f"{result['updated']} изменений за {result['durationMs']} мс")
 
 
 @asynccontextmanager
@@ -63,6 +142,10 @@ async def lifespan(app: FastAPI):
         await storage.seed_data() # Ensure seed_data is called
         print("Storage initialized and data seeded")
 
+        # Первичный снапшот сервисов из локального хранилища
+        await services_snapshot.refresh(storage)
+        await analytics.rebuild(storage)
+
         # Проверяем доступность Metrics API
         metrics_available = await metrics_client.check_availability()
         if metrics_available:
@@ -73,80 +156,54 @@ async def lifespan(app: FastAPI):
 
         grafana_service = create_grafana_service(storage)
 
-        # Запускаем периодическую синхронизацию с Metrics API
-        async def metrics_sync_task():
-            """Синхронизация метрик каждую минуту"""
-            await asyncio.sleep(5)  # Начальная задержка
-
-            while True:
-                try:
-                    if await metrics_client.check_availability():
-                        # Получаем метрики и синхронизируем
-                        services, metrics_list = await metrics_client.sync_services_from_api()
-
-                        # Обновляем статусы сервисов
-                        for service in services:
-                            existing = await storage.get_service(service.id)
-                            if existing:
-                                await storage.update_service_status(service.id, service.status)
-
-                        # Сохраняем метрики
-                        for metrics_data in metrics_list:
-                            try:
-                                from models import InsertServerMetrics
-                                metrics = InsertServerMetrics(
-                                    serviceId=metrics_data['service_id'],
-                                    cpuUsage=metrics_data.get('cpu_usage'),
-                                    ramUsage=metrics_data.get('memory_usage'),
-                                    diskUsage=metrics_data.get('disk_usage')
-                                )
-                                await storage.create_server_metrics(metrics)
-                            except Exception as e:
-                                print(f"Error saving metrics for {metrics_data['service_id']}: {e}")
-
-                        print(f"✓ Метрики обновлены: {len(services)} сервисов, {len(metrics_list)} метрик")
-                except Exception as error:
-                    print(f"Metrics sync error: {error}")
-
-                await asyncio.sleep(1)  # Обновление каждую 1 секунду
-
-        # Запускаем задачу синхронизации метрик
-        asyncio.create_task(metrics_sync_task())
-        print("🔄 Запущена автоматическая синхронизация метрик (каждую секунду)")
+        # Все фоновые опросы источников и обслуживание хранилища - через единый планировщик
+        sync_scheduler.add_job(
+            "metrics_api", sync_metrics_api,
+            interval=config.METRICS_SYNC_INTERVAL_SECONDS, initial_delay=5
+        )
 
         if grafana_service.is_configured():
             print("Grafana integration is configured. Starting automatic sync...")
 
-            async def grafana_sync_task():
-                await asyncio.sleep(5)
-                try:
-                    await grafana_service.sync_service_statuses()
-                    print("Initial Grafana sync completed")
-                except Exception as error:
-                    print(f"Initial Grafana sync failed: {error}")
-
-                while True:
-                    await asyncio.sleep(30)
-                    try:
-                        await grafana_service.sync_service_statuses()
-                    except Exception as error:
-                        print(f"Periodic Grafana sync failed: {error}")
-
-            asyncio.create_task(grafana_sync_task())
+            async def sync_grafana() -> bool:
+                result = await grafana_service.sync_service_statuses()
+                await services_snapshot.refresh_local(storage)
+                services_snapshot.refresh_overlay()
+                return not result.get("skipped")
+
+            sync_scheduler.add_job(
+                "grafana", sync_grafana,
+                interval=config.GRAFANA_SYNC_INTERVAL_SECONDS, initial_delay=5
+            )
         else:
             print("Grafana integration is not configured. Skipping automatic sync.")
 
-        # Запускаем фоновую задачу для синхронизации метрик
-        if metrics_available:
-            asyncio.create_task(sync_metrics_periodically())
-            print("🔄 Автообновление метрик активировано (каждые 30 сек)")
+        # Компакция хранилища (агрегаты метрик и сроки хранения)
+        sync_scheduler.add_job(
+            "compaction", compact_storage,
+            interval=config.COMPACTION_INTERVAL_SECONDS, initial_delay=config.COMPACTION_INTERVAL_SECONDS, jitter=0
+        )
 
+        sync_scheduler.add_job(
+            "external_writes", check_external_writes,
+            interval=config.EXTERNAL_WRITES_CHECK_SECONDS, initial_delay=config.EXTERNAL_WRITES_CHECK_SECONDS, jitter=0
+        )
+
+        if config.AVAILABILITY_SWEEP_INTERVAL_SECONDS > 0:
+            sync_scheduler.add_job(
+                "availability", sweep_availability,
+                interval=config.AVAILABILITY_SWEEP_INTERVAL_SECONDS, initial_delay=10
+            )
+
+        sync_scheduler.start()
 
         yield
 
     finally:
         print("Application shutting down")
-        # DatabaseStorage не требует disconnect() - SQLite закрывает соединения автоматически
+        await sync_scheduler.stop()
+        await http_clients.close()
+        storage.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -159,6 +216,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие ответов API и статики (опрашиваемые списки - JSON в десятки и сотни килобайт)
+app.add_middleware(CompressionMiddleware)
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = time.time()
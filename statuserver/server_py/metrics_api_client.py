@@ -1,42 +1,97 @@
-import httpx
 import os
-from typing import List, Optional, Dict, Any
+import asyncio
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
+from urllib.parse import quote
+import httpx
+
 from models import Service, InsertService, ServiceStatus
+from config import config
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from http_client import get_http_client, request_timeout
+
+class MetricsDelta:
+    """Изменения за цикл синхронизации относительно предыдущего ответа API"""
+    
+    def __init__(self):
+        self.services: List[Service] = []                   # все текущие серверы (неизменившиеся - прежние объекты)
+        self.new_services: List[Service] = []               # впервые увиденные с запуска процесса
+        self.status_changes: Dict[str, ServiceStatus] = {}  # смена статуса у уже известных
+        self.metrics_list: List[Dict[str, Any]] = []        # сэмплы только изменившихся серверов
+        self.changed = False                                # изменился ли список сервисов
+        self.skipped = 0
+
 
 class MetricsAPIClient:
     """Клиент для работы с Monitoring API (Prometheus + Loki)"""
     
-    def __init__(self, base_url: Optional[str] = None):
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
         self.base_url = base_url or os.getenv('METRICS_API_URL', 'http://10.183.45.198:8000')
-        self.timeout = 30.0
-        self.is_available = False
+        self.timeout = config.METRICS_API_TIMEOUT
+        # По умолчанию - общий пул соединений процесса (http_client)
+        self._client = client
+        self.breaker = breaker or CircuitBreaker(
+            "Metrics API",
+            failure_threshold=config.METRICS_API_FAILURE_THRESHOLD,
+            cooldown=config.METRICS_API_COOLDOWN_SECONDS
+        )
+        # Последнее увиденное состояние каждого сервера: (отпечаток метрик, Service)
+        self._last_seen: Dict[str, Tuple[tuple, Service]] = {}
+        self.sync_stats = {"cycles": 0, "skipped": 0, "changed": 0, "status_writes": 0}
+    
+    @property
+    def is_available(self) -> bool:
+        """Доступность по результатам последних запросов (без обращения к API)"""
+        return self.breaker.is_healthy
+    
+    async def _get(self, path: str) -> httpx.Response:
+        """GET через circuit breaker: сетевые ошибки и ответы 5xx считаются отказом источника"""
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Metrics API недоступен, повтор через {self.breaker.stats()['retryIn']} сек")
+        
+        try:
+            client = self._client or get_http_client()
+            response = await client.get(f"{self.base_url}{path}", timeout=request_timeout(self.timeout))
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
         
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+    
     async def check_availability(self) -> bool:
-        """Проверка доступности API"""
+        """Явная проверка доступности API (запрос к /metrics/available)"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.base_url}/metrics/available")
-                self.is_available = response.status_code == 200
-                return self.is_available
+            response = await self._get("/metrics/available")
+            return response.status_code == 200
+        except CircuitOpenError:
+            return False
         except Exception as e:
             print(f"Metrics API недоступен: {e}")
-            self.is_available = False
             return False
     
     async def get_all_servers_metrics(self) -> List[Dict[str, Any]]:
         """Получить метрики для всех серверов из /metrics/servers/all"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.base_url}/metrics/servers/all")
+            response = await self._get("/metrics/servers/all")
                 
-                if response.status_code != 200:
-                    print(f"Ошибка получения метрик: HTTP {response.status_code}")
-                    return []
+            if response.status_code != 200:
+                print(f"Ошибка получения метрик: HTTP {response.status_code}")
+                return []
                     
-                data = response.json()
-                print(f"✓ Получено метрик для {len(data)} серверов")
-                return data
+            data = response.json()
+            print(f"✓ Получено метрик для {len(data)} серверов")
+            return data
+        except CircuitOpenError:
+            return []
         except Exception as e:
             print(f"Ошибка при получении метрик серверов: {e}")
             return []
@@ -44,14 +99,15 @@ class MetricsAPIClient:
     async def get_servers_status(self) -> Dict[str, Any]:
         """Получить статус всех серверов из /metrics/servers"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.base_url}/metrics/servers")
+            response = await self._get("/metrics/servers")
                 
-                if response.status_code != 200:
-                    print(f"Ошибка получения статуса серверов: HTTP {response.status_code}")
-                    return {"servers": [], "total_count": 0}
+            if response.status_code != 200:
+                print(f"Ошибка получения статуса серверов: HTTP {response.status_code}")
+                return {"servers": [], "total_count": 0}
                     
-                return response.json()
+            return response.json()
+        except CircuitOpenError:
+            return {"servers": [], "total_count": 0}
         except Exception as e:
             print(f"Ошибка при получении статуса серверов: {e}")
             return {"servers": [], "total_count": 0}
@@ -59,14 +115,15 @@ class MetricsAPIClient:
     async def get_cpu_usage(self) -> List[Dict[str, Any]]:
         """Получить использование CPU всех серверов"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.base_url}/metrics/cpu/usage")
+            response = await self._get("/metrics/cpu/usage")
                 
-                if response.status_code != 200:
-                    return []
+            if response.status_code != 200:
+                return []
                     
-                data = response.json()
-                return data.get('data', []) if isinstance(data, dict) else []
+            data = response.json()
+            return data.get('data', []) if isinstance(data, dict) else []
+        except CircuitOpenError:
+            return []
         except Exception as e:
             print(f"Ошибка при получении CPU метрик: {e}")
             return []
@@ -74,18 +131,101 @@ class MetricsAPIClient:
     async def get_memory_usage(self) -> List[Dict[str, Any]]:
         """Получить использование памяти всех серверов"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.base_url}/metrics/memory/usage")
+            response = await self._get("/metrics/memory/usage")
                 
-                if response.status_code != 200:
-                    return []
+            if response.status_code != 200:
+                return []
                     
-                data = response.json()
-                return data.get('data', []) if isinstance(data, dict) else []
+            data = response.json()
+            return data.get('data', []) if isinstance(data, dict) else []
+        except CircuitOpenError:
+            return []
         except Exception as e:
             print(f"Ошибка при получении Memory метрик: {e}")
             return []
     
+    async def get_server_metrics(self, server_name: str) -> Optional[Dict[str, Any]]:
+        """Получить метрики одного сервера из /metrics/servers/{server_name}"""
+        try:
+            response = await self._get(f"/metrics/servers/{quote(server_name, safe='')}")
+            
+            if response.status_code != 200:
+                return None
+            
+            data = response.json()
+            return data if isinstance(data, dict) else None
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            print(f"Ошибка при получении метрик сервера {server_name}: {e}")
+            return None
+    
+    @staticmethod
+    def _server_name(item: Dict[str, Any]) -> Optional[str]:
+        return item.get('server_name') or item.get('server') or item.get('name')
+    
+    async def fetch_servers_snapshot(self) -> List[Dict[str, Any]]:
+        """
+        Пакетный режим: все эндпоинты запрашиваются параллельно (не больше METRICS_API_CONCURRENCY
+        одновременно) и сливаются по имени сервера. Если какой-то эндпоинт не ответил,
+        недостающие данные берутся из остальных.
+        """
+        semaphore = asyncio.Semaphore(max(1, config.METRICS_API_CONCURRENCY))
+        
+        async def limited(fetch, *args):
+            async with semaphore:
+                return await fetch(*args)
+        
+        all_metrics, servers_status, cpu_usage, memory_usage = await asyncio.gather(
+            limited(self.get_all_servers_metrics),
+            limited(self.get_servers_status),
+            limited(self.get_cpu_usage),
+            limited(self.get_memory_usage)
+        )
+        
+        merged: Dict[str, Dict[str, Any]] = {}
+        for item in all_metrics:
+            name = self._server_name(item)
+            if name:
+                merged[name] = {**item, 'server_name': name}
+        
+        # Серверы из списка, для которых нет общих метрик, догружаем по одному
+        status_servers = servers_status.get('servers', []) if isinstance(servers_status, dict) else []
+        missing = []
+        for item in status_servers:
+            name = self._server_name(item) if isinstance(item, dict) else None
+            if name and name not in merged and name not in missing:
+                missing.append(name)
+        
+        per_server = await asyncio.gather(*(limited(self.get_server_metrics, name) for name in missing))
+        for name, data in zip(missing, per_server):
+            entry = {'server_name': name}
+            if data:
+                entry.update(data)
+                entry['server_name'] = name
+                entry.setdefault('cpu_usage', data.get('cpu'))
+                entry.setdefault('memory_usage', data.get('memory'))
+            merged[name] = entry
+        
+        # Значения CPU/памяти из отдельных эндпоинтов заполняют пропуски
+        for field, items in (('cpu_usage', cpu_usage), ('memory_usage', memory_usage)):
+            for item in items:
+                name = self._server_name(item)
+                value = item.get('value', item.get('usage'))
+                if not name or value is None:
+                    continue
+                entry = merged.setdefault(name, {'server_name': name})
+                if entry.get(field) is None:
+                    entry[field] = value
+        
+        # Пустые значения - как у недоступного сервера
+        for entry in merged.values():
+            for field in ('cpu_usage', 'memory_usage', 'disk_usage'):
+                if entry.get(field) is None:
+                    entry[field] = 0
+        
+        return list(merged.values())
+    
     def _determine_service_status(self, metrics: Dict[str, Any]) -> ServiceStatus:
         """Определить статус сервиса на основе метрик"""
         cpu_usage = metrics.get('cpu_usage', 0)
@@ -144,65 +284,122 @@ class MetricsAPIClient:
         }
         return icons.get(category, "server")
     
+    def _convert_server(self, metrics: Dict[str, Any]) -> Tuple[Service, Dict[str, Any]]:
+        """Сервис и сэмпл метрик для одного сервера из ответа API"""
+        server_name = metrics.get('server_name', 'Unknown Server')
+        service_id = f"srv-{server_name.lower().replace(' ', '-')}"
+        
+        # Определяем статус на основе метрик
+        status = self._determine_service_status(metrics)
+        
+        # Определяем категорию
+        category = self._map_server_name_to_category(server_name)
+        
+        # Создаем сервер (без URL и портов)
+        service = Service(
+            id=service_id,
+            name=server_name,
+            description=f"{server_name} - CPU: {metrics.get('cpu_usage', 0):.1f}%, RAM: {metrics.get('memory_usage', 0):.1f}%, Disk: {metrics.get('disk_usage', 0):.1f}%",
+            category=category,
+            region="Production",
+            status=status,
+            type="Server",
+            icon=self._get_icon_for_category(category),
+            address=None,  # Серверы не имеют URL
+            port=None,     # Серверы не имеют портов
+            entity_type="server",  # Это сервер
+            updated_at=datetime.fromisoformat(metrics['timestamp']) if 'timestamp' in metrics else datetime.now()
+        )
+        
+        # Метрики сохраняются отдельно
+        sample = {
+            'service_id': service_id,
+            'cpu_usage': metrics.get('cpu_usage', 0),
+            'memory_usage': metrics.get('memory_usage', 0),
+            'disk_usage': metrics.get('disk_usage', 0),
+            'timestamp': metrics.get('timestamp', datetime.now().isoformat())
+        }
+        return service, sample
+    
     async def convert_metrics_to_services(self, metrics_data: List[Dict[str, Any]]) -> tuple[List[Service], List[Dict[str, Any]]]:
         """Конвертировать метрики серверов в формат Service"""
         services = []
         metrics_list = []
         
+        for metrics in metrics_data:
+            service, sample = self._convert_server(metrics)
+            services.append(service)
+            metrics_list.append(sample)
+        
+        return services, metrics_list
+    
+    def diff_metrics(self, metrics_data: List[Dict[str, Any]]) -> MetricsDelta:
+        """
+        Сравнить ответ API с предыдущим циклом. Сервер, у которого не изменились метрики и метка времени,
+        не пересобирается: в результат попадает прежний объект Service, сэмпл не пишется.
+        """
+        delta = MetricsDelta()
+        previous = self._last_seen
+        current: Dict[str, Tuple[tuple, Service]] = {}
+        
         for metrics in metrics_data:
             server_name = metrics.get('server_name', 'Unknown Server')
-            service_id = f"srv-{server_name.lower().replace(' ', '-')}"
-            
-            # Определяем статус на основе метрик
-            status = self._determine_service_status(metrics)
-            
-            # Определяем категорию
-            category = self._map_server_name_to_category(server_name)
-            
-            # Создаем сервер (без URL и портов)
-            service = Service(
-                id=service_id,
-                name=server_name,
-                description=f"{server_name} - CPU: {metrics.get('cpu_usage', 0):.1f}%, RAM: {metrics.get('memory_usage', 0):.1f}%, Disk: {metrics.get('disk_usage', 0):.1f}%",
-                category=category,
-                region="Production",
-                status=status,
-                type="Server",
-                icon=self._get_icon_for_category(category),
-                address=None,  # Серверы не имеют URL
-                port=None,     # Серверы не имеют портов
-                entity_type="server",  # Это сервер
-                updated_at=datetime.fromisoformat(metrics['timestamp']) if 'timestamp' in metrics else datetime.now()
+            fingerprint = (
+                metrics.get('cpu_usage'), metrics.get('memory_usage'),
+                metrics.get('disk_usage'), metrics.get('timestamp')
             )
-            services.append(service)
+            seen = previous.get(server_name)
+            if seen is not None and seen[0] == fingerprint:
+                current[server_name] = seen
+                delta.services.append(seen[1])
+                delta.skipped += 1
+                continue
             
-            # Сохраняем метрики отдельно
-            metrics_list.append({
-                'service_id': service_id,
-                'cpu_usage': metrics.get('cpu_usage', 0),
-                'memory_usage': metrics.get('memory_usage', 0),
-                'disk_usage': metrics.get('disk_usage', 0),
-                'timestamp': metrics.get('timestamp', datetime.now().isoformat())
-            })
+            service, sample = self._convert_server(metrics)
+            current[server_name] = (fingerprint, service)
+            delta.services.append(service)
+            delta.metrics_list.append(sample)
+            delta.changed = True
+            if seen is None:
+                delta.new_services.append(service)
+            elif seen[1].status != service.status:
+                delta.status_changes[service.id] = service.status
         
-        return services, metrics_list
+        # Новых серверов нет, значит при том же количестве набор серверов не изменился
+        if len(current) != len(previous):
+            delta.changed = True
+        
+        self._last_seen = current
+        self.sync_stats["cycles"] += 1
+        self.sync_stats["skipped"] += delta.skipped
+        self.sync_stats["changed"] += len(delta.services) - delta.skipped
+        self.sync_stats["status_writes"] += len(delta.status_changes)
+        return delta
     
-    async def sync_services_from_api(self) -> tuple[List[Service], List[Dict[str, Any]]]:
-        """Синхронизация сервисов из Monitoring API"""
+    def reset_diff(self):
+        """Забыть предыдущее состояние: следующий цикл обработает все серверы заново"""
+        self._last_seen = {}
+    
+    async def sync_services_from_api(self) -> MetricsDelta:
+        """Синхронизация сервисов из Monitoring API: только изменения относительно прошлого цикла"""
         print("🔄 Синхронизация с Monitoring API...")
         
         # Получаем метрики всех серверов
-        metrics_data = await self.get_all_servers_metrics()
+        if config.METRICS_API_FETCH_MODE == "batched":
+            metrics_data = await self.fetch_servers_snapshot()
+        else:
+            metrics_data = await self.get_all_servers_metrics()
         
         if not metrics_data:
             print("⚠️  Нет данных от Monitoring API")
-            return [], []
+            # Снапшот вернется к локальному хранилищу - после восстановления публикуем все заново
+            self.reset_diff()
+            return MetricsDelta()
         
-        # Конвертируем в формат Service
-        services, metrics_list = await self.convert_metrics_to_services(metrics_data)
+        delta = self.diff_metrics(metrics_data)
         
-        print(f"✓ Синхронизировано {len(services)} сервисов и {len(metrics_list)} метрик")
-        return services, metrics_list
+        print(f"✓ Синхронизировано {len(delta.services)} сервисов: изменилось {len(delta.services) - delta.skipped}, новых метрик {len(delta.metrics_list)}")
+        return delta
 
 
 # Создаем глобальный экземпляр клиента
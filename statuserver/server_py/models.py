@@ -98,6 +98,43 @@ class ServerMetrics(ServerMetricsBase):
 class InsertServerMetrics(ServerMetricsBase):
     pass
 
+class ServerMetricsBucket(BaseModel):
+    """Агрегат метрик сервиса за интервал step (avg/min/max)"""
+    service_id: str = Field(alias="serviceId")
+    timestamp: datetime  # Начало интервала
+    samples: int
+    cpu_usage: Optional[float] = Field(default=None, alias="cpuUsage")
+    cpu_min: Optional[float] = Field(default=None, alias="cpuMin")
+    cpu_max: Optional[float] = Field(default=None, alias="cpuMax")
+    ram_usage: Optional[float] = Field(default=None, alias="ramUsage")
+    ram_min: Optional[float] = Field(default=None, alias="ramMin")
+    ram_max: Optional[float] = Field(default=None, alias="ramMax")
+    disk_usage: Optional[float] = Field(default=None, alias="diskUsage")
+    disk_min: Optional[float] = Field(default=None, alias="diskMin")
+    disk_max: Optional[float] = Field(default=None, alias="diskMax")
+
+    class Config:
+        populate_by_name = True
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
+
+ReportPeriod = Literal["morning", "lunch", "evening"]
+
+class MetricsPeriodSummary(BaseModel):
+    """Средние метрики сервиса за время суток (утро, обед, вечер) в диапазоне отчета"""
+    service_id: str = Field(alias="serviceId")
+    service_name: str = Field(alias="serviceName")
+    category: str
+    period: ReportPeriod
+    samples: int
+    cpu_usage: Optional[float] = Field(default=None, alias="cpuUsage")
+    ram_usage: Optional[float] = Field(default=None, alias="ramUsage")
+    disk_usage: Optional[float] = Field(default=None, alias="diskUsage")
+
+    class Config:
+        populate_by_name = True
+
 class MetricsReport(BaseModel):
     """Отчет о метриках за определенный период"""
     report_time: Literal["morning", "afternoon", "evening"]  # Время отчета
@@ -0,0 +1,139 @@
+"""
+Read-through кэш результатов чтения хранилища
+Запись кэша - результат запроса с конкретными параметрами и версия таблицы (TableVersions),
+с которой он прочитан. Выросла версия - запись считается промахом и заменяется свежим
+результатом, поэтому устаревшие версии не копятся. Вытеснение LRU по оценке занимаемой памяти.
+Одновременные промахи по одному ключу читают хранилище один раз
+"""
+import asyncio
+import sys
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from config import config
+from table_versions import TableVersions
+
+# Сэмплы метрик пишутся только с текущим временем. Диапазон, закончившийся раньше, чем
+# столько секунд назад, уже не меняется записью - только компакцией (версия metric_rollups)
+METRICS_SETTLE_SECONDS = 60
+
+# Признак неудачного чтения для ожидающих того же ключа: они читают сами
+_FAILED = object()
+
+
+def metrics_table(end: Optional[datetime], cursor: Optional[Tuple[datetime, str]] = None) -> str:
+    """Версия, от которой зависит чтение метрик до end (курсор ограничивает выборку так же)"""
+    if cursor and (end is None or cursor[0] < end):
+        end = cursor[0]
+    if end is not None and end < datetime.now() - timedelta(seconds=METRICS_SETTLE_SECONDS):
+        return "metric_rollups"
+    return "server_metrics"
+
+
+def _object_size(obj: Any) -> int:
+    fields = getattr(obj, "__dict__", None)
+    if fields is None:
+        return sys.getsizeof(obj)
+    # У моделей pydantic заметную часть занимает множество заданных полей
+    fields_set = getattr(obj, "__pydantic_fields_set__", None)
+    return (
+        sys.getsizeof(obj) + sys.getsizeof(fields) + sum(sys.getsizeof(value) for value in fields.values())
+        + (sys.getsizeof(fields_set) if fields_set is not None else 0)
+    )
+
+
+def estimate_size(value: Any) -> int:
+    """Приблизительный размер результата в байтах: элементы списка оцениваются по первому"""
+    if isinstance(value, list):
+        return sys.getsizeof(value) + (len(value) * _object_size(value[0]) if value else 0)
+    return _object_size(value)
+
+
+class QueryCache:
+    """LRU-кэш результатов чтения с лимитом памяти и статистикой попаданий"""
+
+    def __init__(self, versions: TableVersions, max_bytes: Optional[int] = None):
+        self._versions = versions
+        self.max_bytes = int(config.QUERY_CACHE_MAX_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        # Один результат не может занять больше четверти кэша и вытеснить все остальное
+        self.max_entry_bytes = self.max_bytes // 4
+        # (запрос, параметры) -> (таблица, версия, результат, размер)
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[str, int, Any, int]]" = OrderedDict()
+        self._loading: Dict[Tuple[str, Hashable, str, int], asyncio.Future] = {}
+        self.bytes = 0
+        self.evictions = 0
+        self._queries: Dict[str, Dict[str, int]] = {}
+
+    async def get(self, query: str, params: Hashable, table: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Результат запроса query с параметрами params, зависящего от таблицы table.
+        Списки возвращаются копией: вызывающий код может их менять
+        """
+        if self.max_bytes <= 0:
+            return await load()
+
+        stats = self._queries.setdefault(query, {"hits": 0, "misses": 0, "coalesced": 0})
+        key = (query, params)
+        # Версия читается до запроса к хранилищу (см. TableVersions.bump)
+        version = self._versions.get(table)
+        entry = self._entries.get(key)
+        if entry is not None and entry[:2] == (table, version):
+            self._entries.move_to_end(key)
+            stats["hits"] += 1
+            return _copy(entry[2])
+
+        flight = (query, params, table, version)
+        waiter = self._loading.get(flight)
+        if waiter is not None:
+            stats["coalesced"] += 1
+            value = await asyncio.shield(waiter)
+            return _copy(value) if value is not _FAILED else await load()
+
+        stats["misses"] += 1
+        waiter = self._loading[flight] = asyncio.get_running_loop().create_future()
+        value = _FAILED
+        try:
+            value = await load()
+        finally:
+            del self._loading[flight]
+            waiter.set_result(value)
+        self._store(key, table, version, value)
+        return _copy(value)
+
+    def _store(self, key: Tuple[str, Hashable], table: str, version: int, value: Any):
+        current = self._entries.get(key)
+        if current is not None:
+            if current[0] == table and current[1] > version:
+                # Параллельное чтение уже положило более свежую версию
+                return
+            self.bytes -= current[3]
+            del self._entries[key]
+
+        size = estimate_size(value)
+        if size > self.max_entry_bytes:
+            return
+        self._entries[key] = (table, version, value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, _, _, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(stats["hits"] + stats["coalesced"] for stats in self._queries.values())
+        misses = sum(stats["misses"] for stats in self._queries.values())
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "maxBytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hitRatio": round(hits / (hits + misses), 4) if hits + misses else None,
+            "evictions": self.evictions,
+            "queries": {query: dict(stats) for query, stats in self._queries.items()},
+        }
+
+
+def _copy(value: Any) -> Any:
+    return list(value) if isinstance(value, list) else value
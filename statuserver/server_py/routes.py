@@ -1,27 +1,38 @@
 import os
-import csv
-import io
-import httpx
-from typing import Optional
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query, Depends
-from fastapi.responses import Response, JSONResponse
+from typing import List, Optional, Union
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, ValidationError
 
 from models import (
     Service, InsertService,
     Incident, InsertIncident,
-    InsertServerMetrics,
-    ServiceStatus, MetricsReport
+    ServerMetrics, InsertServerMetrics, ServerMetricsBucket,
+    ServiceStatus
 )
 from storage import storage
+from services_snapshot import services_snapshot, etag_matches
+from source_health import GRAFANA_SOURCE, source_health
+from event_hub import event_hub
+from scheduler import sync_scheduler
+from timeseries import to_local_naive, encode_cursor, decode_cursor
 from grafana_service import create_grafana_service
 from import_data import import_services_from_data
 from metrics_api_client import metrics_client
 from auth import require_admin
+from availability_checker import availability_checker, PROBE_MODES
+from analytics import analytics
+from fast_json import FastJSONResponse, dump_models
+from export import EXPORT_FORMATS, export_response, metric_buckets_chunks, metrics_chunks, services_chunks
+from uptime import UPTIME_GROUPS, add_durations, empty_durations, group_uptime, uptime_summary
+from config import config
 import asyncio
 
 router = APIRouter()
+
+# Максимальный размер страницы для /api/server-metrics
+MAX_METRICS_PAGE_SIZE = 10000
 grafana_service = create_grafana_service(storage)
 
 class StatusUpdate(BaseModel):
@@ -30,96 +41,36 @@ class StatusUpdate(BaseModel):
 class ImportData(BaseModel):
     data: dict
 
-async def check_service_availability(address: str, port: Optional[int] = None) -> bool:
-    try:
-        url = f"http://{address}:{port}" if port else address
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.head(url)
-            return response.status_code < 400
-    except:
-        return False
-
-def convert_to_csv(services: list) -> str:
-    if not services:
-        return ""
-
-    output = io.StringIO()
-    if services:
-        fieldnames = services[0].keys() if isinstance(services[0], dict) else list(vars(services[0]).keys())
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        for service in services:
-            if isinstance(service, dict):
-                writer.writerow(service)
-            else:
-                writer.writerow(vars(service))
+@router.get("/api/services")
+async def get_services(request: Request):
+    """
+    Список сервисов из снапшота.
+    Снапшот поддерживает фоновая синхронизация, запрос не ходит ни в Metrics API, ни в БД
+    и отдает JSON, закодированный один раз на версию снапшота.
+    """
+    services_snapshot.refresh_overlay()
+    etag = services_snapshot.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
 
-    return output.getvalue()
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
 
-@router.get("/api/services")
-async def get_services():
-    try:
-        # Проверяем доступность Metrics API
-        api_available = await metrics_client.check_availability()
-
-        if api_available:
-            # Получаем данные из Monitoring API
-            services, metrics_list = await metrics_client.sync_services_from_api()
-
-            # Синхронизируем с локальным хранилищем
-            for service in services:
-                existing = await storage.get_service(service.id)
-                if not existing:
-                    # Создаем новый сервис
-                    insert_data = InsertService(
-                        name=service.name,
-                        description=service.description,
-                        category=service.category,
-                        region=service.region,
-                        status=service.status,
-                        type=service.type,
-                        icon=service.icon,
-                        address=service.address,
-                        port=service.port
-                    )
-                    await storage.create_service(insert_data)
-                else:
-                    # Обновляем статус существующего
-                    await storage.update_service_status(service.id, service.status)
-
-            # Сохраняем метрики в базу данных
-            for metrics_data in metrics_list:
-                try:
-                    # Разделяем на категории и убираем URL/порты у серверов
-                    if service.category == "server":
-                        metrics = InsertServerMetrics(
-                            serviceId=metrics_data['service_id'],
-                            cpuUsage=metrics_data.get('cpu_usage'),
-                            ramUsage=metrics_data.get('memory_usage'),
-                            diskUsage=metrics_data.get('disk_usage')
-                        )
-                    else: # Для сервисов можем сохранить URL и порты, если они есть
-                        metrics = InsertServerMetrics(
-                            serviceId=metrics_data['service_id'],
-                            cpuUsage=metrics_data.get('cpu_usage'),
-                            ramUsage=metrics_data.get('memory_usage'),
-                            diskUsage=metrics_data.get('disk_usage')
-                        )
-                    await storage.create_server_metrics(metrics)
-                except Exception as e:
-                    print(f"Error saving metrics for {metrics_data['service_id']}: {e}")
-
-            return [s.model_dump(by_alias=True) for s in services]
-        else:
-            # API недоступен - возвращаем данные из локального хранилища
-            services = await storage.get_services()
-            # Возвращаем пустой массив если нет данных
-            return [s.model_dump(by_alias=True) for s in services]
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Error fetching services: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch services")
+    return Response(content=services_snapshot.body, media_type="application/json", headers=headers)
+
+@router.get("/api/stream")
+async def stream_events():
+    """
+    Live-обновления (Server-Sent Events) вместо опроса REST-эндпоинтов:
+    services - изменившиеся сервисы, metrics - новые сэмплы метрик, incidents - новые инциденты
+    """
+    if event_hub.is_full():
+        raise HTTPException(status_code=503, detail="Too many stream subscribers")
+
+    return StreamingResponse(
+        event_hub.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/api/services/{service_id}")
 async def get_service(service_id: str):
@@ -127,7 +78,7 @@ async def get_service(service_id: str):
         service = await storage.get_service(service_id)
         if not service:
             raise HTTPException(status_code=404, detail="Service not found")
-        return service.model_dump(by_alias=True)
+        return source_health.overlay(service).model_dump(by_alias=True)
     except HTTPException:
         raise
     except Exception as e:
@@ -137,6 +88,7 @@ async def get_service(service_id: str):
 async def create_service(service: InsertService, admin: str = Depends(require_admin)):
     try:
         created_service = await storage.create_service(service)
+        await services_snapshot.refresh_local(storage)
         return created_service.model_dump(by_alias=True)
     except ValidationError as e:
         raise HTTPException(status_code=400, detail={"error": "Invalid service data", "details": e.errors()})
@@ -154,6 +106,7 @@ async def update_service_status(service_id: str, status_update: StatusUpdate, ad
         if not service:
             raise HTTPException(status_code=404, detail="Service not found")
 
+        await services_snapshot.refresh_local(storage)
         return service.model_dump(by_alias=True)
     except HTTPException:
         raise
@@ -161,10 +114,15 @@ async def update_service_status(service_id: str, status_update: StatusUpdate, ad
         raise HTTPException(status_code=500, detail="Failed to update service status")
 
 @router.get("/api/incidents")
-async def get_incidents():
+async def get_incidents(request: Request):
+    # Версия читается до запроса: запись, попавшая между ними, лишь вызовет лишний 200 на следующем опросе
+    headers = {"ETag": storage.versions.etag("incidents"), "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
     try:
         incidents = await storage.get_incidents()
-        return [i.model_dump(by_alias=True) for i in incidents]
+        return FastJSONResponse(dump_models(incidents), headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch incidents")
 
@@ -184,6 +142,7 @@ async def get_incident(incident_id: str):
 async def create_incident(incident: InsertIncident, admin: str = Depends(require_admin)):
     try:
         created_incident = await storage.create_incident(incident)
+        event_hub.publish("incidents", [created_incident])
         return created_incident.model_dump(by_alias=True)
     except ValidationError as e:
         raise HTTPException(status_code=400, detail={"error": "Invalid incident data", "details": e.errors()})
@@ -191,25 +150,70 @@ async def create_incident(incident: InsertIncident, admin: str = Depends(require
         raise HTTPException(status_code=500, detail="Failed to create incident")
 
 @router.get("/api/status-history/{service_id}")
-async def get_status_history(service_id: str):
+async def get_status_history(service_id: str, request: Request):
+    headers = {"ETag": storage.versions.etag("status_history"), "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
     try:
         history = await storage.get_status_history(service_id)
-        return [h.model_dump(by_alias=True) for h in history]
+        return FastJSONResponse(dump_models(history), headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch status history")
 
 @router.get("/api/server-metrics")
-async def get_server_metrics(serviceId: Optional[str] = Query(None)):
+async def get_server_metrics(
+    request: Request,
+    serviceId: Optional[str] = Query(None),
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_METRICS_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    step: Optional[int] = Query(None, ge=1)
+):
+    """
+    Метрики серверов, новые сначала.
+    from/to - диапазон времени, limit + cursor - keyset-пагинация (следующий курсор в X-Next-Cursor),
+    step - агрегация по интервалам в секундах (avg/min/max на интервал).
+    Пока метрики не менялись, повторный опрос с If-None-Match получает 304 без запроса к БД.
+    """
+    headers = {"ETag": storage.versions.etag("server_metrics"), "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    start = to_local_naive(from_time)
+    end = to_local_naive(to_time)
+
     try:
-        metrics = await storage.get_server_metrics(serviceId)
-        return [m.model_dump(by_alias=True) for m in metrics]
+        if step:
+            buckets = await storage.get_server_metrics_buckets(step, serviceId, start, end, limit)
+            return FastJSONResponse(dump_models(buckets), headers=headers)
+
+        try:
+            decoded_cursor = decode_cursor(cursor) if cursor else None
+            metrics = await storage.get_server_metrics(serviceId, start, end, limit, decoded_cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        if limit and len(metrics) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(metrics[-1])
+        return FastJSONResponse(dump_models(metrics), headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch server metrics")
 
 @router.post("/api/server-metrics", status_code=201)
-async def create_server_metrics(metrics: InsertServerMetrics):
+async def create_server_metrics(metrics: Union[InsertServerMetrics, List[InsertServerMetrics]]):
+    """Запись метрик: один объект или массив (пишется одной транзакцией)"""
     try:
-        created_metrics = await storage.create_server_metrics(metrics)
+        if isinstance(metrics, list):
+            created_metrics = await storage.create_server_metrics_bulk(metrics)
+            event_hub.publish("metrics", created_metrics)
+            return FastJSONResponse(dump_models(created_metrics), status_code=201)
+
+        created_metrics = (await storage.create_server_metrics_bulk([metrics]))[0]
+        event_hub.publish("metrics", [created_metrics])
         return created_metrics.model_dump(by_alias=True)
     except ValidationError as e:
         raise HTTPException(status_code=400, detail={"error": "Invalid metrics data", "details": e.errors()})
@@ -217,14 +221,24 @@ async def create_server_metrics(metrics: InsertServerMetrics):
         raise HTTPException(status_code=500, detail="Failed to create server metrics")
 
 @router.post("/api/import-services")
-async def import_services(import_data: ImportData, admin: str = Depends(require_admin)):
+async def import_services(
+    import_data: ImportData,
+    dryRun: bool = Query(False),
+    admin: str = Depends(require_admin)
+):
+    """
+    Импорт каталога одной транзакцией: новые и измененные сервисы, неизменные не перезаписываются.
+    dryRun=true - только diff (что будет создано/изменено), без записи
+    """
     try:
         data = import_data.data
         if not data:
             raise HTTPException(status_code=400, detail="No data provided")
 
-        count = await import_services_from_data(storage, data)
-        return {"success": True, "imported": count}
+        report = await import_services_from_data(storage, data, dry_run=dryRun)
+        if not dryRun and (report["created"] or report["updated"]):
+            await services_snapshot.refresh_local(storage)
+        return report
     except HTTPException:
         raise
     except Exception as e:
@@ -233,45 +247,83 @@ async def import_services(import_data: ImportData, admin: str = Depends(require_
 
 @router.get("/api/export-services")
 async def export_services(format: str = Query("json")):
+    """Экспорт каталога: json (массив), ndjson или csv, потоком без сборки файла в памяти"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format")
     try:
-        services = await storage.get_services()
-        services_dict = [s.model_dump(by_alias=True) for s in services]
-
-        if format == "json":
-            return JSONResponse(
-                content=services_dict,
-                headers={
-                    "Content-Disposition": "attachment; filename=services.json"
-                }
-            )
-        elif format == "csv":
-            csv_content = convert_to_csv(services_dict)
-            return Response(
-                content=csv_content,
-                media_type="text/csv",
-                headers={
-                    "Content-Disposition": "attachment; filename=services.csv"
-                }
-            )
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported format")
-    except HTTPException:
-        raise
+        return await export_response(services_chunks(storage), format, "services", Service)
     except Exception as e:
+        print(f"Export error: {e}")
         raise HTTPException(status_code=500, detail="Failed to export services")
 
+@router.get("/api/export-metrics")
+async def export_metrics(
+    format: str = Query("csv"),
+    serviceId: Optional[str] = Query(None),
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
+    step: Optional[int] = Query(None, ge=1)
+):
+    """
+    Экспорт метрик потоком, новые сначала: без step - сырые сэмплы (хранятся
+    METRICS_RAW_RETENTION_HOURS), со step - агрегаты avg/min/max по интервалам
+    (по умолчанию за весь срок хранения часовых агрегатов)
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format")
+    start, end = to_local_naive(from_time), to_local_naive(to_time)
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+
+    try:
+        if step:
+            chunks = metric_buckets_chunks(storage, step, serviceId, start, end)
+            return await export_response(chunks, format, "server-metrics", ServerMetricsBucket)
+        chunks = metrics_chunks(storage, serviceId, start, end)
+        return await export_response(chunks, format, "server-metrics", ServerMetrics)
+    except Exception as e:
+        print(f"Export error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to export metrics")
+
 @router.post("/api/check-availability")
-async def check_availability_endpoint(address: str = Query(...), port: Optional[int] = Query(None)):
+async def check_availability_endpoint(
+    address: str = Query(...),
+    port: Optional[int] = Query(None),
+    mode: str = Query("http"),
+    fresh: bool = Query(False)
+):
     """
     Проверка доступности по введенному адресу.
-    Отправка curl-подобного запроса.
+    mode=http - curl-подобный HEAD-запрос, mode=tcp - только TCP-соединение.
+    Результат кэшируется на AVAILABILITY_CACHE_TTL_SECONDS, fresh=true - проверить заново.
     """
+    if mode not in PROBE_MODES:
+        raise HTTPException(status_code=400, detail="Invalid mode")
     try:
-        available = await check_service_availability(address, port)
-        return {"address": address, "port": port, "available": available}
+        return await availability_checker.check(address, port, mode, use_cache=not fresh)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to check availability: {str(e)}")
 
+@router.post("/api/check-availability/bulk")
+async def check_availability_bulk(
+    mode: Optional[str] = Query(None),
+    fresh: bool = Query(False),
+    admin: str = Depends(require_admin)
+):
+    """
+    Проверка всех сервисов каталога с адресом.
+    Смены статуса (operational/down) записываются в хранилище.
+    """
+    if mode is not None and mode not in PROBE_MODES:
+        raise HTTPException(status_code=400, detail="Invalid mode")
+    try:
+        result = await availability_checker.sweep(storage, mode, use_cache=not fresh)
+        await services_snapshot.refresh_local(storage)
+        return result
+    except Exception as e:
+        print(f"Availability sweep error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to check availability: {str(e)}")
+
 @router.post("/api/reports/generate-metrics-report")
 async def generate_metrics_report(
     start_time: datetime = Query(...),
@@ -281,63 +333,28 @@ async def generate_metrics_report(
     Генерация отчета по метрикам за указанный период.
     Поддержка метрик в определенные часы (утро, обед, вечер).
     """
+    start_time, end_time = to_local_naive(start_time), to_local_naive(end_time)
+    if start_time > end_time:
+        raise HTTPException(status_code=400, detail="start_time must be before end_time")
     try:
-        # Получаем все сервисы
-        services = await storage.get_services()
-        service_ids = [s.id for s in services]
-
-        # Получаем метрики за указанный период
-        # Здесь предполагается, что storage.get_server_metrics может фильтровать по времени
-        # Если нет, то нужно будет реализовать фильтрацию здесь
-        all_metrics = await storage.get_server_metrics() # Получаем все метрики
-        filtered_metrics = [
-            m for m in all_metrics
-            if start_time <= m.timestamp <= end_time
-        ]
-
-        # Группируем метрики по категориям (серверы, сервисы)
-        server_metrics = {s.id: [] for s in services if s.category == "server"}
-        service_metrics = {s.id: [] for s in services if s.category != "server"}
-
-        for metrics in filtered_metrics:
-            if metrics.serviceId in server_metrics:
-                server_metrics[metrics.serviceId].append(metrics)
-            elif metrics.serviceId in service_metrics:
-                service_metrics[metrics.serviceId].append(metrics)
-
-        # Вычисляем средние метрики за утро, обед, вечер
-        report_data = {}
+        # Агрегация по сервису и времени суток выполняется в хранилище одним запросом
+        summaries = await storage.get_metrics_report(start_time, end_time)
 
-        for category, metrics_dict in [("server", server_metrics), ("service", service_metrics)]:
-            for service_id, metrics_list in metrics_dict.items():
-                if not metrics_list:
-                    continue
-
-                # Разбиваем метрики по времени суток (утро, обед, вечер)
-                morning_metrics = [m for m in metrics_list if 6 <= m.timestamp.hour < 12]
-                lunch_metrics = [m for m in metrics_list if 12 <= m.timestamp.hour < 18]
-                evening_metrics = [m for m in metrics_list if 18 <= m.timestamp.hour < 24 or 0 <= m.timestamp.hour < 6]
-
-                service_name = await storage.get_service(service_id).name if await storage.get_service(service_id) else f"Unknown Service ({service_id})"
-
-
-                def calculate_average(metrics_subset):
-                    if not metrics_subset:
-                        return {"cpuUsage": None, "ramUsage": None, "diskUsage": None}
-                    count = len(metrics_subset)
-                    avg_cpu = sum(m.cpuUsage for m in metrics_subset if m.cpuUsage is not None) / count
-                    avg_ram = sum(m.ramUsage for m in metrics_subset if m.ramUsage is not None) / count
-                    avg_disk = sum(m.diskUsage for m in metrics_subset if m.diskUsage is not None) / count
-                    return {"cpuUsage": avg_cpu, "ramUsage": avg_ram, "diskUsage": avg_disk}
-
-                report_data[f"{category}_{service_id}"] = MetricsReport(
-                    service_id=service_id,
-                    service_name=service_name,
-                    category=category,
-                    morning_avg=calculate_average(morning_metrics),
-                    lunch_avg=calculate_average(lunch_metrics),
-                    evening_avg=calculate_average(evening_metrics)
-                )
+        empty = {"samples": 0, "cpuUsage": None, "ramUsage": None, "diskUsage": None}
+        report_data = {}
+        for summary in summaries:
+            category = "server" if summary.category == "server" else "service"
+            entry = report_data.setdefault(f"{category}_{summary.service_id}", {
+                "serviceId": summary.service_id,
+                "serviceName": summary.service_name,
+                "category": category,
+                "morningAvg": empty,
+                "lunchAvg": empty,
+                "eveningAvg": empty,
+            })
+            entry[f"{summary.period}Avg"] = summary.model_dump(
+                by_alias=True, include={"samples", "cpu_usage", "ram_usage", "disk_usage"}
+            )
 
         return {"report": report_data}
 
@@ -348,6 +365,73 @@ async def generate_metrics_report(
         raise HTTPException(status_code=500, detail="Failed to generate metrics report")
 
 
+@router.get("/api/analytics/summary")
+async def get_analytics_summary(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None)
+):
+    """
+    Сводка для страницы аналитики за дни [start, end] (по умолчанию - последние 30 дней):
+    счетчики по статусам и категориям, доступность, средние метрики, инциденты и MTTR.
+    Собирается из поддерживаемых при записи агрегатов и посуточных сводок истории статусов,
+    без чтения сырых метрик.
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    # Агрегаты хранятся ANALYTICS_RETENTION_DAYS дней
+    start = max(start, date.today() - timedelta(days=config.ANALYTICS_RETENTION_DAYS - 1))
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end and within retention")
+
+    # Доступность за те же дни, что и остальная сводка (текущие сутки - до текущего момента)
+    uptime_start = datetime.combine(start, datetime.min.time())
+    uptime_end = min(datetime.combine(end + timedelta(days=1), datetime.min.time()), datetime.now())
+    uptime = await storage.get_uptime(uptime_start, uptime_end) if uptime_start < uptime_end else {}
+    return FastJSONResponse(analytics.summary(start, end, uptime))
+
+@router.get("/api/uptime")
+async def get_uptime(
+    serviceId: Optional[str] = Query(None),
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
+    groupBy: str = Query("service")
+):
+    """
+    Доступность (SLA) за окно [from, to), по умолчанию - последние 30 дней,
+    по сервисам, категориям или регионам (groupBy). Целые сутки берутся из посуточных
+    сводок истории статусов, сырая история читается только для неполных суток на краях окна.
+    """
+    if groupBy not in UPTIME_GROUPS:
+        raise HTTPException(status_code=400, detail="Invalid groupBy")
+    end = to_local_naive(to_time) or datetime.now()
+    start = to_local_naive(from_time) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+
+    try:
+        services = await storage.get_services()
+        if serviceId:
+            services = [s for s in services if s.id == serviceId]
+            if not services:
+                raise HTTPException(status_code=404, detail="Service not found")
+        by_service = await storage.get_uptime(start, end, serviceId)
+
+        overall = empty_durations()
+        for service in services:
+            add_durations(overall, by_service.get(service.id) or ())
+        return FastJSONResponse({
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "groupBy": groupBy,
+            "overall": uptime_summary(overall),
+            "items": group_uptime(by_service, services, groupBy),
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Uptime error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to calculate uptime")
+
 @router.get("/api/grafana/status")
 async def grafana_status():
     try:
@@ -355,6 +439,7 @@ async def grafana_status():
         return {
             "configured": configured,
             "url": os.getenv('GRAFANA_URL') if configured else None,
+            "stale": source_health.is_stale(GRAFANA_SOURCE),
             "message": "Grafana is configured" if configured else "Grafana is not configured"
         }
     except Exception as e:
@@ -367,6 +452,8 @@ async def grafana_sync(admin: str = Depends(require_admin)):
             raise HTTPException(status_code=400, detail="Grafana is not configured")
 
         result = await grafana_service.sync_service_statuses()
+        await services_snapshot.refresh_local(storage)
+        services_snapshot.refresh_overlay()
         return {
             "success": True,
             **result,
@@ -406,20 +493,27 @@ async def grafana_metrics(query: str = Query('up{job="node_exporter"}')):
 
 @router.get("/api/metrics-api/status")
 async def get_metrics_api_status():
-    """Проверка доступности внешнего Metrics API"""
-    try:
-        available = await metrics_client.check_availability()
-        return {
-            "available": available,
-            "url": metrics_client.base_url,
-            "message": "Metrics API доступен" if available else "Metrics API недоступен"
-        }
-    except Exception as e:
-        return {
-            "available": False,
-            "url": metrics_client.base_url,
-            "message": f"Ошибка проверки Metrics API: {str(e)}"
-        }
+    """Доступность внешнего Metrics API по состоянию circuit breaker (без запроса к API)"""
+    available = metrics_client.is_available
+    return {
+        "available": available,
+        "url": metrics_client.base_url,
+        "message": "Metrics API доступен" if available else "Metrics API недоступен",
+        **metrics_client.breaker.stats(),
+        "sync": metrics_client.sync_stats
+    }
+
+@router.get("/api/sync/stats")
+async def get_sync_stats():
+    """
+    Статистика фоновых синхронизаций: длительность, задержка запуска, пропуски, ошибки;
+    заодно - попадания и промахи кэша запросов хранилища
+    """
+    return {
+        "jobs": sync_scheduler.stats(),
+        "availability": availability_checker.stats,
+        "queryCache": storage.query_cache.stats(),
+    }
 
 @router.get("/api/auth/verify")
 async def verify_auth(admin: str = Depends(require_admin)):
@@ -0,0 +1,177 @@
+"""
+Планировщик фоновых синхронизаций
+Один компонент владеет всеми опросами внешних источников: у каждой задачи свой интервал,
+случайный разброс запуска, экспоненциальная задержка при недоступности источника и пропуск
+запусков, пока предыдущий еще выполняется
+"""
+import asyncio
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import config
+
+# Задача возвращает False, если источник недоступен (считается неудачей, как и исключение)
+JobFunc = Callable[[], Awaitable[Optional[bool]]]
+
+
+class SyncJob:
+    """Периодическая задача и статистика ее запусков"""
+
+    def __init__(
+        self,
+        name: str,
+        func: JobFunc,
+        interval: float,
+        initial_delay: float = 0,
+        jitter: float = 0,
+        max_backoff: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.jitter = jitter
+        self.max_backoff = max(interval, max_backoff or interval)
+        self._clock = clock
+
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.overruns = 0
+        self.running = False
+        self.last_started_at: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_lag: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.next_run_at: Optional[float] = None
+
+    def current_interval(self) -> float:
+        """Интервал до следующего запуска: удваивается после каждой неудачи подряд, но не выше max_backoff"""
+        if not self.consecutive_failures:
+            return self.interval
+        return min(self.interval * 2 ** self.consecutive_failures, self.max_backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        next_run_in = None
+        if self.next_run_at is not None:
+            next_run_in = round(max(0.0, self.next_run_at - self._clock()), 3)
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "currentInterval": self.current_interval(),
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "consecutiveFailures": self.consecutive_failures,
+            "overruns": self.overruns,
+            "lastStartedAt": self.last_started_at.isoformat() if self.last_started_at else None,
+            "lastDurationMs": round(self.last_duration * 1000, 1) if self.last_duration is not None else None,
+            "lagMs": round(self.last_lag * 1000, 1) if self.last_lag is not None else None,
+            "lastError": self.last_error,
+            "nextRunIn": next_run_in,
+        }
+
+
+class SyncScheduler:
+    """
+    Запускает зарегистрированные задачи в фоне, у каждой задачи - свой цикл.
+    clock и sleep - монотонное время и ожидание (в тестах подменяются виртуальными)
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep
+    ):
+        self._jobs: Dict[str, SyncJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._clock = clock
+        self._sleep = sleep
+
+    def add_job(
+        self,
+        name: str,
+        func: JobFunc,
+        interval: float,
+        initial_delay: float = 0,
+        jitter: Optional[float] = None,
+        max_backoff: Optional[float] = None
+    ) -> SyncJob:
+        """Зарегистрировать задачу (до start())"""
+        job = SyncJob(
+            name, func, interval,
+            initial_delay=initial_delay,
+            jitter=config.SYNC_JITTER if jitter is None else jitter,
+            max_backoff=config.SYNC_MAX_BACKOFF_SECONDS if max_backoff is None else max_backoff,
+            clock=self._clock
+        )
+        self._jobs[name] = job
+        return job
+
+    def start(self):
+        for job in self._jobs.values():
+            self._tasks.append(asyncio.create_task(self._run_job(job)))
+            print(f"⏱️ Синхронизация '{job.name}': каждые {job.interval} сек")
+
+    async def stop(self):
+        """Остановить все задачи (при завершении приложения)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [job.stats() for job in self._jobs.values()]
+
+    async def _run_job(self, job: SyncJob):
+        """
+        Цикл задачи с фиксированным расписанием: запуски не накладываются друг на друга,
+        а пропущенные из-за долгого выполнения слоты считаются в overruns
+        """
+        scheduled = self._clock() + job.initial_delay
+        while True:
+            job.next_run_at = scheduled
+            await self._sleep(max(0.0, scheduled - self._clock()))
+
+            started = self._clock()
+            job.last_lag = started - scheduled
+            await self._execute(job)
+            finished = self._clock()
+
+            interval = job.current_interval()
+            scheduled += interval * (1 + random.uniform(-job.jitter, job.jitter))
+            if scheduled < finished:
+                missed = int((finished - scheduled) // interval) + 1
+                job.overruns += missed
+                scheduled += missed * interval
+
+    async def _execute(self, job: SyncJob):
+        job.running = True
+        job.last_started_at = datetime.now()
+        started = self._clock()
+        try:
+            ok = await job.func() is not False
+            job.last_error = None if ok else "source unavailable"
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            ok = False
+            job.last_error = str(error) or type(error).__name__
+            print(f"Sync job '{job.name}' failed: {job.last_error}")
+        finally:
+            job.running = False
+            job.last_duration = self._clock() - started
+
+        job.runs += 1
+        if ok:
+            job.consecutive_failures = 0
+        else:
+            job.failures += 1
+            job.consecutive_failures += 1
+
+
+# Глобальный планировщик синхронизаций
+sync_scheduler = SyncScheduler()
@@ -0,0 +1,93 @@
+"""
+Сопоставление instance из Prometheus с сервисами
+Подстрочные проверки выполняются автоматами Ахо-Корасик за один проход по строке
+вместо перебора всех пар (instance, сервис)
+"""
+from typing import Dict, Generic, Iterable, List, Set, Tuple, TypeVar
+
+from models import Service
+
+T = TypeVar("T")
+
+
+class AhoCorasick(Generic[T]):
+    """Автомат для поиска всех образцов, входящих в строку как подстрока"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, T]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[T]] = [[]]
+
+        for word, value in patterns:
+            if not word:
+                continue
+            node = 0
+            for char in word:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][char] = next_node
+                node = next_node
+            self._out[node].append(value)
+
+        # Суффиксные ссылки строятся обходом в ширину, выходы наследуются по ним
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                if self._out[self._fail[child]]:
+                    self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def search(self, text: str) -> Set[T]:
+        """Значения всех образцов, найденных в text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[T] = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class ServiceMatcher:
+    """
+    Индекс сервисов с адресом. Правила те же, что при попарной проверке:
+    адрес сервиса входит в instance, имя сервиса входит в instance или instance входит в имя (без учета регистра)
+    """
+
+    def __init__(self, services: Iterable[Service]):
+        self.services = [service for service in services if service.address]
+        self._addresses = AhoCorasick((service.address, index) for index, service in enumerate(self.services))
+        self._lower_names = [service.name.lower() if service.name else "" for service in self.services]
+        self._names = AhoCorasick((name, index) for index, name in enumerate(self._lower_names))
+
+    @staticmethod
+    def fingerprint(services: Iterable[Service]) -> int:
+        """Отпечаток полей, влияющих на сопоставление: индекс пересобирается только при их изменении"""
+        return hash(tuple((s.id, s.name, s.address) for s in services))
+
+    def match(self, instances: List[str]) -> List[Set[int]]:
+        """Для каждого instance - индексы подходящих сервисов в self.services"""
+        lower_instances = [instance.lower() for instance in instances]
+        matches = [
+            self._addresses.search(instance) | self._names.search(lower) if instance else set()
+            for instance, lower in zip(instances, lower_instances)
+        ]
+
+        # instance как подстрока имени: автомат строится по instance текущего ответа
+        by_instance = AhoCorasick((lower, index) for index, lower in enumerate(lower_instances))
+        for service_index, name in enumerate(self._lower_names):
+            for instance_index in by_instance.search(name):
+                matches[instance_index].add(service_index)
+        return matches
@@ -0,0 +1,109 @@
+"""
+Снапшот списка сервисов
+Версионированный in-memory кэш для GET /api/services, который обновляет только фоновая синхронизация.
+Тело ответа кодируется в JSON один раз на версию
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Literal, Optional
+
+from event_hub import event_hub
+from fast_json import dumps
+from models import Service
+from source_health import GRAFANA_SOURCE, apply_overlay, source_health
+
+SnapshotSource = Literal["storage", "metrics_api"]
+
+
+class ServicesSnapshot:
+    """Готовый к отдаче список сервисов с версией и ETag"""
+
+    def __init__(self):
+        # Префикс ETag уникален для процесса, чтобы версии не пересекались после рестарта
+        self._boot_id = format(int(time.time() * 1000), "x")
+        self.version = 0
+        self.source: SnapshotSource = "storage"
+        self.updated_at: Optional[datetime] = None
+        self._payload: List[Dict[str, Any]] = []
+        self._body = b"[]"
+        # Данные как в хранилище; _payload - они же с перекрытием статусов недоступных источников
+        self._stored: List[Dict[str, Any]] = []
+        self._stale = False
+
+    @property
+    def etag(self) -> str:
+        return f'"services-{self._boot_id}-{self.version}"'
+
+    @property
+    def payload(self) -> List[Dict[str, Any]]:
+        return self._payload
+
+    @property
+    def body(self) -> bytes:
+        """payload, уже закодированный в JSON"""
+        return self._body
+
+    def publish(self, services: Iterable[Service], source: SnapshotSource) -> bool:
+        """Опубликовать новый снимок. Версия растет только при изменении данных"""
+        self._stored = [s.model_dump(mode="json", by_alias=True) for s in services]
+        self.source = source
+        return self._render()
+
+    def refresh_overlay(self) -> bool:
+        """Пересобрать снимок, если с момента сборки изменилась доступность источников"""
+        if source_health.is_stale(GRAFANA_SOURCE) == self._stale:
+            return False
+        return self._render()
+
+    def _render(self) -> bool:
+        self._stale = source_health.is_stale(GRAFANA_SOURCE)
+        payload = apply_overlay(self._stored, self._stale)
+        if self.version and payload == self._payload:
+            return False
+
+        previous = {item["id"]: item for item in self._payload}
+        self._payload = payload
+        self._body = dumps(payload)
+        self.version += 1
+        self.updated_at = datetime.now()
+        self._publish_delta(previous, payload)
+        return True
+
+    def _publish_delta(self, previous: Dict[str, Dict[str, Any]], payload: List[Dict[str, Any]]):
+        """Отправить подписчикам /api/stream только изменившиеся и удаленные сервисы"""
+        changed = [item for item in payload if previous.get(item["id"]) != item]
+        current_ids = {item["id"] for item in payload}
+        removed = [service_id for service_id in previous if service_id not in current_ids]
+        if changed or removed:
+            event_hub.publish("services", {"changed": changed, "removed": removed})
+
+    async def refresh(self, storage) -> bool:
+        """Пересобрать снимок из локального хранилища"""
+        services = await storage.get_services()
+        return self.publish(services, "storage")
+
+    async def refresh_local(self, storage) -> bool:
+        """Обновить снимок после локальных изменений, если он строится из хранилища"""
+        if self.source != "storage":
+            return False
+        return await self.refresh(storage)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match (слабое сравнение, RFC 9110)"""
+    if not if_none_match:
+        return False
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+# Глобальный экземпляр снапшота
+services_snapshot = ServicesSnapshot()
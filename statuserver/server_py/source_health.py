@@ -0,0 +1,77 @@
+"""
+Состояние внешних источников статусов
+Недоступность источника не записывается в БД: статус "loading" вычисляется при чтении
+по времени последней успешной синхронизации, в хранилище попадают только реальные переходы
+"""
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from config import config
+from models import Service
+
+# Источник, статусы которого перекрываются при недоступности: сервисы с адресом обновляет Grafana
+GRAFANA_SOURCE = "grafana"
+
+
+class SourceHealth:
+    """Время последней успешной синхронизации и флаг ошибки для каждого источника"""
+
+    def __init__(self):
+        self._started_at = time.monotonic()
+        self._last_success: Dict[str, float] = {}
+        self._failing: Set[str] = set()
+
+    def mark_success(self, source: str):
+        self._last_success[source] = time.monotonic()
+        if source in self._failing:
+            self._failing.discard(source)
+            print(f"✓ Источник {source} снова доступен")
+
+    def mark_failure(self, source: str):
+        if source not in self._failing:
+            self._failing.add(source)
+            print(f"✗ Источник {source} недоступен: статусы сервисов будут показаны как loading")
+
+    def is_stale(self, source: str, stale_after: Optional[float] = None) -> bool:
+        """
+        Данные источника устарели: последняя синхронизация неудачна и с последней успешной
+        (или с запуска, если успешных не было) прошло больше stale_after секунд
+        """
+        if source not in self._failing:
+            return False
+        if stale_after is None:
+            stale_after = config.GRAFANA_STALE_AFTER_SECONDS
+        last_success = self._last_success.get(source, self._started_at)
+        return time.monotonic() - last_success >= stale_after
+
+    def overlay(self, service: Service) -> Service:
+        """Сервис в том виде, в котором его нужно отдавать с учетом состояния источника"""
+        if service.address and service.status != "loading" and self.is_stale(GRAFANA_SOURCE):
+            return service.model_copy(update={"status": "loading"})
+        return service
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        sources = set(self._last_success) | self._failing
+        return {
+            source: {
+                "stale": self.is_stale(source),
+                "failing": source in self._failing,
+                "lastSuccessAgo": round(now - self._last_success[source], 1) if source in self._last_success else None,
+            }
+            for source in sorted(sources)
+        }
+
+
+def apply_overlay(payload: List[Dict[str, Any]], stale: bool) -> List[Dict[str, Any]]:
+    """Перекрыть статусы в уже сериализованном списке сервисов (для снапшота)"""
+    if not stale:
+        return payload
+    return [
+        {**item, "status": "loading"} if item.get("address") and item.get("status") != "loading" else item
+        for item in payload
+    ]
+
+
+# Глобальный экземпляр
+source_health = SourceHealth()
@@ -1,7 +1,7 @@
 import uuid
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 
 from models import (
@@ -9,8 +9,18 @@ from models import (
     Incident, InsertIncident,
     StatusHistory, InsertStatusHistory,
     ServerMetrics, InsertServerMetrics,
-    ServiceStatus
+    ServerMetricsBucket, ServiceStatus, MetricsPeriodSummary
 )
+from config import config
+from timeseries import (
+    RAW_RESOLUTION, ROLLUP_NAMES, ROLLUP_RESOLUTIONS, from_epoch, to_epoch, retention,
+    select_resolution, resolution_ranges, filter_samples, raw_partials, group_partials, merge_partials,
+    REPORT_STEP, fold_report_partials
+)
+from import_data import ImportProgress, plan_services_upsert
+from uptime import DAY, Transition, accumulate_intervals, add_durations, empty_durations, split_window, sum_by_service
+from table_versions import TableVersions, compacted_tables
+from query_cache import QueryCache, metrics_table
 
 class MemStorage:
     def __init__(self):
@@ -18,11 +28,29 @@ class MemStorage:
         self.incidents: Dict[str, Incident] = {}
         self.status_history: Dict[str, StatusHistory] = {}
         self.server_metrics: Dict[str, ServerMetrics] = {}
+        # Агрегаты метрик по разрешению: (service_id, bucket) -> [samples, cpu_sum, cpu_min, ...]
+        self.metric_rollups: Dict[int, Dict[Tuple[str, int], list]] = {r: {} for r in ROLLUP_RESOLUTIONS}
+        self.rollup_watermarks: Dict[int, int] = {}
+        # Посуточные сводки истории статусов: (service_id, day) -> секунды по UPTIME_STATUSES
+        self.status_daily: Dict[Tuple[str, int], List[int]] = {}
+        self.uptime_watermark: Optional[int] = None
+        # Версии таблиц для условных GET и кэша запросов. Кэшируются только чтения с фильтрацией
+        # и сортировкой (история, метрики): списки сервисов и инцидентов и так лежат в памяти
+        self.versions = TableVersions()
+        self.query_cache = QueryCache(self.versions)
         
     async def seed_data(self):
         # Тестовые данные отключены - приложение работает только с данными из Metrics API
         pass
     
+    def close(self):
+        # In-memory хранилищу нечего закрывать
+        pass
+    
+    async def detect_external_writes(self) -> bool:
+        # In-memory данные меняет только этот процесс
+        return False
+    
     def _generate_deterministic_id(self, service: InsertService) -> str:
         key = f"{service.name}-{service.region}-{service.category}-{service.address or ''}-{service.port or ''}"
         hash_val = 0
@@ -36,6 +64,12 @@ class MemStorage:
     async def get_services(self) -> List[Service]:
         return list(self.services.values())
     
+    async def get_services_page(self, limit: int, after: Optional[Tuple[str, str]] = None) -> List[Service]:
+        services = sorted(self.services.values(), key=lambda s: (s.name, s.id))
+        if after:
+            services = [s for s in services if (s.name, s.id) > after]
+        return services[:limit]
+    
     async def get_service(self, service_id: str) -> Optional[Service]:
         return self.services.get(service_id)
     
@@ -54,36 +88,75 @@ class MemStorage:
             port=insert_service.port,
             updated_at=datetime.now()
         )
+        previous = self.services.get(service_id)
         self.services[service_id] = service
+        self.versions.bump("services")
         
-        await self.create_status_history(InsertStatusHistory(
-            service_id=service_id,
-            status=service.status,
-            timestamp=datetime.now()
-        ))
+        if previous is None or previous.status != service.status:
+            await self.create_status_history(InsertStatusHistory(
+                service_id=service_id,
+                status=service.status,
+                timestamp=datetime.now()
+            ))
         
         return service
     
+    async def upsert_services(
+        self,
+        services: List[InsertService],
+        dry_run: bool = False,
+        progress: Optional[ImportProgress] = None
+    ) -> Dict[str, Any]:
+        incoming = [(self._generate_deterministic_id(service), service) for service in services]
+        writes, report = plan_services_upsert(incoming, self.services)
+        if dry_run:
+            return report
+        
+        for done, (service_id, insert_service, record_history) in enumerate(writes, 1):
+            service = Service(
+                id=service_id,
+                **insert_service.model_dump(exclude={"status"}),
+                status=insert_service.status or "operational",
+                updated_at=datetime.now()
+            )
+            self.services[service_id] = service
+            if record_history:
+                await self.create_status_history(InsertStatusHistory(
+                    service_id=service_id,
+                    status=service.status,
+                    timestamp=service.updated_at
+                ))
+            if progress and (done % 5000 == 0 or done == len(writes)):
+                progress(done, len(writes))
+        if writes:
+            self.versions.bump("services")
+        return report
+    
     async def update_service_status(self, service_id: str, status: ServiceStatus) -> Optional[Service]:
         service = self.services.get(service_id)
-        if not service:
-            return None
+        if not service or service.status == status:
+            return service
         
-        updated_service = Service(
-            **service.model_dump(),
-            status=status,
-            updated_at=datetime.now()
-        )
+        updated_service = service.model_copy(update={"status": status, "updated_at": datetime.now()})
         self.services[service_id] = updated_service
+        self.versions.bump("services")
         
         await self.create_status_history(InsertStatusHistory(
             service_id=service_id,
             status=status,
-            timestamp=datetime.now()
+            timestamp=updated_service.updated_at
         ))
         
         return updated_service
     
+    async def update_service_statuses(self, statuses: Dict[str, ServiceStatus]) -> List[Service]:
+        changed = []
+        for service_id, status in statuses.items():
+            service = self.services.get(service_id)
+            if service and service.status != status:
+                changed.append(await self.update_service_status(service_id, status))
+        return changed
+    
     async def get_incidents(self) -> List[Incident]:
         return list(self.incidents.values())
     
@@ -104,11 +177,14 @@ class MemStorage:
             created_at=datetime.now()
         )
         self.incidents[incident_id] = incident
+        self.versions.bump("incidents")
         return incident
     
     async def get_status_history(self, service_id: str) -> List[StatusHistory]:
-        history = [h for h in self.status_history.values() if h.service_id == service_id]
-        return sorted(history, key=lambda h: h.timestamp, reverse=True)
+        async def load():
+            history = [h for h in self.status_history.values() if h.service_id == service_id]
+            return sorted(history, key=lambda h: h.timestamp, reverse=True)
+        return await self.query_cache.get("status_history", service_id, "status_history", load)
     
     async def create_status_history(self, insert_history: InsertStatusHistory) -> StatusHistory:
         history_id = str(uuid.uuid4())
@@ -119,13 +195,191 @@ class MemStorage:
             timestamp=insert_history.timestamp or datetime.now()
         )
         self.status_history[history_id] = history
+        self.versions.bump("status_history")
+        # Запись задним числом: уже сведенные сутки пересчитаются на следующей компакции
+        timestamp = to_epoch(history.timestamp)
+        if self.uptime_watermark is not None and self.uptime_watermark > timestamp:
+            self.uptime_watermark = timestamp // DAY * DAY
         return history
     
-    async def get_server_metrics(self, service_id: Optional[str] = None) -> List[ServerMetrics]:
-        metrics = list(self.server_metrics.values())
-        if service_id:
-            metrics = [m for m in metrics if m.service_id == service_id]
-        return sorted(metrics, key=lambda m: m.timestamp, reverse=True)
+    async def get_uptime(self, start: datetime, end: datetime, service_id: Optional[str] = None) -> Dict[str, List[int]]:
+        full_days, edges = split_window(to_epoch(start), to_epoch(end), self.uptime_watermark)
+        by_service: Dict[str, List[int]] = {}
+        if full_days:
+            for (key, day), values in self.status_daily.items():
+                if full_days[0] <= day < full_days[1] and (not service_id or key == service_id):
+                    add_durations(by_service.setdefault(key, empty_durations()), values)
+        for lower, upper in edges:
+            sum_by_service(accumulate_intervals(self._history_transitions(upper, service_id), lower, upper), by_service)
+        return by_service
+    
+    def _history_transitions(self, upper: int, service_id: Optional[str] = None) -> List[Transition]:
+        return sorted((
+            (h.service_id, h.status, to_epoch(h.timestamp))
+            for h in self.status_history.values()
+            if (not service_id or h.service_id == service_id) and to_epoch(h.timestamp) < upper
+        ), key=lambda transition: (transition[0], transition[2]))
+    
+    async def get_server_metrics(
+        self,
+        service_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[Tuple[datetime, str]] = None,
+        use_cache: bool = True
+    ) -> List[ServerMetrics]:
+        async def load():
+            metrics = filter_samples(self.server_metrics.values(), service_id, start, end)
+            if cursor:
+                metrics = [m for m in metrics if (m.timestamp, m.id) < cursor]
+            metrics.sort(key=lambda m: (m.timestamp, m.id), reverse=True)
+            return metrics[:limit] if limit else metrics
+        if not use_cache:
+            return await load()
+        return await self.query_cache.get(
+            "server_metrics", (service_id, start, end, limit, cursor), metrics_table(end, cursor), load
+        )
+    
+    async def get_server_metrics_buckets(
+        self,
+        step: int,
+        service_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        use_cache: bool = True
+    ) -> List[ServerMetricsBucket]:
+        async def load():
+            buckets = merge_partials(self._partials(step, service_id, start, end), step)
+            return buckets[:limit] if limit else buckets
+        if not use_cache:
+            return await load()
+        return await self.query_cache.get(
+            "server_metrics_buckets", (step, service_id, start, end, limit), metrics_table(end), load
+        )
+    
+    async def get_metrics_report(self, start: datetime, end: datetime) -> List[MetricsPeriodSummary]:
+        """Средние метрики каждого сервиса по времени суток за [start, end]"""
+        rows = self._partials(REPORT_STEP, None, start, end)
+        return fold_report_partials(rows, self.services.values())
+    
+    def _partials(
+        self,
+        step: int,
+        service_id: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime]
+    ) -> list:
+        """Частичные агрегаты с шагом step со всех уровней хранения"""
+        resolution = select_resolution(step, start, datetime.now())
+        rows = []
+        for level, lower, upper in resolution_ranges(resolution, self.rollup_watermarks):
+            if level == RAW_RESOLUTION:
+                samples = filter_samples(self.server_metrics.values(), service_id, start, end)
+                if lower is not None:
+                    samples = [m for m in samples if to_epoch(m.timestamp) >= lower]
+                rows.extend(raw_partials(samples, step))
+                continue
+            
+            start_epoch = to_epoch(start) - level if start else None
+            end_epoch = to_epoch(end) if end else None
+            rows.extend(
+                (key[0], key[1], *group)
+                for key, group in self.metric_rollups[level].items()
+                if (not service_id or key[0] == service_id)
+                and (start_epoch is None or key[1] > start_epoch)
+                and (end_epoch is None or key[1] <= end_epoch)
+                and (lower is None or key[1] >= lower)
+                and (upper is None or key[1] < upper)
+            )
+        return rows
+    
+    async def compact(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        now = now or datetime.now()
+        stats = {}
+        
+        # Свертка: сырые -> 1 мин -> 1 час
+        source = None
+        for resolution in ROLLUP_RESOLUTIONS:
+            lower = self.rollup_watermarks.get(resolution, 0)
+            cutoff = to_epoch(now) // resolution * resolution
+            if source is not None:
+                cutoff = min(cutoff, self.rollup_watermarks.get(source, 0) // resolution * resolution)
+            
+            rolled = 0
+            if cutoff > lower:
+                if source is None:
+                    rows = raw_partials(
+                        [m for m in self.server_metrics.values() if lower <= to_epoch(m.timestamp) < cutoff],
+                        resolution
+                    )
+                else:
+                    rows = [(k[0], k[1], *g) for k, g in self.metric_rollups[source].items() if lower <= k[1] < cutoff]
+                
+                target = self.metric_rollups[resolution]
+                for key, group in group_partials(rows, resolution).items():
+                    if key in target:
+                        group = group_partials([(*key, *target[key]), (*key, *group)], resolution)[key]
+                    target[key] = group
+                    rolled += 1
+                self.rollup_watermarks[resolution] = cutoff
+            
+            stats[f"rolled_{ROLLUP_NAMES[resolution]}"] = rolled
+            source = resolution
+        
+        # Удаляем данные старше сроков хранения, но только уже свернутые в следующий уровень
+        raw_cutoff = min(to_epoch(now - retention(RAW_RESOLUTION)), self.rollup_watermarks.get(ROLLUP_RESOLUTIONS[0], 0))
+        expired = [k for k, m in self.server_metrics.items() if to_epoch(m.timestamp) < raw_cutoff]
+        for key in expired:
+            del self.server_metrics[key]
+        stats["deleted_raw"] = len(expired)
+        
+        for index, resolution in enumerate(ROLLUP_RESOLUTIONS):
+            cutoff = to_epoch(now - retention(resolution))
+            if index + 1 < len(ROLLUP_RESOLUTIONS):
+                cutoff = min(cutoff, self.rollup_watermarks.get(ROLLUP_RESOLUTIONS[index + 1], 0))
+            rollups = self.metric_rollups[resolution]
+            expired = [k for k in rollups if k[1] < cutoff]
+            for key in expired:
+                del rollups[key]
+            stats[f"deleted_{ROLLUP_NAMES[resolution]}"] = len(expired)
+        
+        # Закрытые сутки истории статусов -> посуточные сводки
+        cutoff = to_epoch(now) // DAY * DAY
+        watermark = self.uptime_watermark
+        if watermark is None and self.status_history:
+            watermark = min(to_epoch(h.timestamp) for h in self.status_history.values()) // DAY * DAY
+        stats["summarized_status_days"] = 0
+        if watermark is not None and cutoff > watermark:
+            self.status_daily.update(accumulate_intervals(self._history_transitions(cutoff), watermark, cutoff))
+            self.uptime_watermark = cutoff
+            stats["summarized_status_days"] = (cutoff - watermark) // DAY
+        
+        # История статусов: сводки хранятся столько же; для каждого сервиса оставляем последнюю запись
+        # до границы, и только уже сведенную в сводки
+        history_cutoff = now - timedelta(days=config.STATUS_HISTORY_RETENTION_DAYS)
+        expired = [key for key in self.status_daily if key[1] < to_epoch(history_cutoff) // DAY * DAY]
+        for key in expired:
+            del self.status_daily[key]
+        stats["deleted_status_daily"] = len(expired)
+        history_cutoff = min(history_cutoff, from_epoch(self.uptime_watermark or 0))
+        latest_before_cutoff: Dict[str, StatusHistory] = {}
+        for h in self.status_history.values():
+            if h.timestamp < history_cutoff:
+                current = latest_before_cutoff.get(h.service_id)
+                if current is None or h.timestamp > current.timestamp:
+                    latest_before_cutoff[h.service_id] = h
+        expired = [
+            k for k, h in self.status_history.items()
+            if h.timestamp < history_cutoff and latest_before_cutoff[h.service_id].id != h.id
+        ]
+        for key in expired:
+            del self.status_history[key]
+        stats["deleted_status_history"] = len(expired)
+        
+        self.versions.bump(*compacted_tables(stats))
+        return stats
     
     async def create_server_metrics(self, insert_metrics: InsertServerMetrics) -> ServerMetrics:
         metrics_id = str(uuid.uuid4())
@@ -138,7 +392,26 @@ class MemStorage:
             timestamp=datetime.now()
         )
         self.server_metrics[metrics_id] = metrics
+        self.versions.bump("server_metrics")
         return metrics
+    
+    async def create_server_metrics_bulk(self, insert_metrics_list: List[InsertServerMetrics]) -> List[ServerMetrics]:
+        timestamp = datetime.now()
+        created = []
+        for insert_metrics in insert_metrics_list:
+            metrics = ServerMetrics(
+                id=str(uuid.uuid4()),
+                service_id=insert_metrics.service_id,
+                cpu_usage=insert_metrics.cpu_usage,
+                ram_usage=insert_metrics.ram_usage,
+                disk_usage=insert_metrics.disk_usage,
+                timestamp=timestamp
+            )
+            self.server_metrics[metrics.id] = metrics
+            created.append(metrics)
+        if created:
+            self.versions.bump("server_metrics")
+        return created
 
 import os
 
@@ -150,6 +423,15 @@ def get_storage():
     if storage_type == "memory":
         print("📝 In-memory хранилище")
         return MemStorage()
+    elif storage_type == "columnar":
+        try:
+            from columnar_storage import ColumnarStorage
+            db_path = os.getenv("DATABASE_PATH", "data/services.db")
+            print(f"💾 Постоянное хранилище (колоночные метрики): {db_path}")
+            return ColumnarStorage(db_path)
+        except:
+            print("⚠️ Fallback to in-memory")
+            return MemStorage()
     else:
         try:
             from db_storage import DatabaseStorage
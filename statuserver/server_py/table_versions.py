@@ -0,0 +1,50 @@
+"""
+Счетчики изменений таблиц хранилища
+У каждой таблицы монотонная версия, которая растет после каждой зафиксированной записи.
+По версиям строятся ETag для условных GET и ключи кэша запросов без обращения к БД.
+Счетчики живут в памяти процесса, поэтому в ETag входит метка запуска: после рестарта
+старые ETag клиентов не совпадут. Записи других процессов хранилище замечает периодической
+проверкой (detect_external_writes) и поднимает версии всех таблиц
+"""
+import time
+from typing import Dict, List
+
+from timeseries import ROLLUP_NAMES
+
+# metric_rollups меняет только компакция (агрегаты и удаление устаревших сэмплов):
+# от нее зависят чтения метрик за прошедшие диапазоны, которые новые сэмплы не затрагивают
+TABLES = ("services", "incidents", "status_history", "server_metrics", "metric_rollups")
+
+
+class TableVersions:
+    """Версии таблиц одного экземпляра хранилища"""
+
+    def __init__(self):
+        self._boot_id = format(int(time.time() * 1000), "x")
+        self._versions: Dict[str, int] = dict.fromkeys(TABLES, 0)
+
+    def get(self, table: str) -> int:
+        return self._versions[table]
+
+    def bump(self, *tables: str):
+        """
+        Отметить изменение таблиц. Вызывается после фиксации транзакции: иначе запрос,
+        прочитавший старые данные, получил бы уже новую версию и закэшировался бы навсегда
+        """
+        for table in tables:
+            self._versions[table] += 1
+
+    def etag(self, table: str) -> str:
+        """Сильный ETag содержимого таблицы"""
+        return f'"{table}-{self._boot_id}-{self._versions[table]}"'
+
+
+def compacted_tables(stats: Dict[str, int]) -> List[str]:
+    """Таблицы, содержимое которых изменила компакция (по статистике compact())"""
+    metrics_keys = {"deleted_raw", *(f"{action}_{name}" for name in ROLLUP_NAMES.values() for action in ("rolled", "deleted"))}
+    tables = []
+    if any(stats.get(key) for key in metrics_keys):
+        tables.extend(("server_metrics", "metric_rollups"))
+    if stats.get("deleted_status_history"):
+        tables.append("status_history")
+    return tables
@@ -0,0 +1,237 @@
+"""
+Вспомогательные функции для временных рядов метрик
+Метки времени в хранилище - наивное локальное время, в эпоху переводятся "как UTC",
+чтобы границы интервалов совпадали с границами часов и суток по локальным часам
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import config
+from models import MetricsPeriodSummary, ReportPeriod, Service, ServerMetrics, ServerMetricsBucket
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(dt: datetime) -> int:
+    """Наивное время -> секунды от эпохи (дробная часть отбрасывается)"""
+    return int((dt - EPOCH).total_seconds())
+
+
+def from_epoch(seconds: int) -> datetime:
+    """Секунды от эпохи -> наивное время"""
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def to_local_naive(dt: Optional[datetime]) -> Optional[datetime]:
+    """Привести время из запроса к формату хранилища (наивное локальное время)"""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone().replace(tzinfo=None)
+
+
+def filter_samples(
+    samples: Iterable[ServerMetrics],
+    service_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[ServerMetrics]:
+    """Отфильтровать сэмплы по сервису и диапазону [start, end]"""
+    return [
+        m for m in samples
+        if (not service_id or m.service_id == service_id)
+        and (start is None or m.timestamp >= start)
+        and (end is None or m.timestamp <= end)
+    ]
+
+
+# Уровни хранения метрик: разрешение в секундах (1 - сырые записи)
+RAW_RESOLUTION = 1
+ROLLUP_NAMES = {60: "1m", 3600: "1h"}
+ROLLUP_RESOLUTIONS = tuple(ROLLUP_NAMES)
+
+# Частичный агрегат: (service_id, bucket, samples,
+#                     cpu_sum, cpu_min, cpu_max, ram_sum, ram_min, ram_max, disk_sum, disk_min, disk_max)
+Partial = Tuple[str, int, int, float, float, float, float, float, float, float, float, float]
+
+
+def retention(resolution: int) -> timedelta:
+    """Срок хранения уровня по настройкам из config"""
+    if resolution == RAW_RESOLUTION:
+        return timedelta(hours=config.METRICS_RAW_RETENTION_HOURS)
+    if resolution == 60:
+        return timedelta(days=config.METRICS_1M_RETENTION_DAYS)
+    return timedelta(days=config.METRICS_1H_RETENTION_DAYS)
+
+
+def select_resolution(step: int, start: Optional[datetime], now: datetime) -> int:
+    """
+    Самый грубый уровень, разрешение которого делит step и который еще хранит начало диапазона.
+    Если начало старше всех уровней - самый долгоживущий из подходящих.
+    """
+    candidates = [r for r in (*reversed(ROLLUP_RESOLUTIONS), RAW_RESOLUTION) if step % r == 0]
+    for resolution in candidates:
+        if start is not None and start >= now - retention(resolution):
+            return resolution
+    return candidates[0]
+
+
+def resolution_ranges(resolution: int, watermarks: Dict[int, int]) -> List[Tuple[int, Optional[int], Optional[int]]]:
+    """
+    Разбить запрос на непересекающиеся диапазоны по уровням: выбранный уровень отдает данные
+    до своего watermark, более детальные уровни - хвост, который еще не свернут.
+    Возвращает [(resolution, from_epoch, to_epoch)], границы - полуинтервал [from, to).
+    """
+    levels = [r for r in (*reversed(ROLLUP_RESOLUTIONS), RAW_RESOLUTION) if r <= resolution]
+    ranges = []
+    lower = None
+    for level in levels:
+        upper = watermarks.get(level) if level != RAW_RESOLUTION else None
+        ranges.append((level, lower, upper))
+        if upper is not None:
+            lower = upper if lower is None else max(lower, upper)
+    return ranges
+
+
+def narrow_range(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    lower: Optional[int],
+    upper: Optional[int]
+) -> Tuple[Optional[datetime], Optional[datetime], Optional[int], Optional[int]]:
+    """
+    Оставить по одной границе с каждой стороны: из двух нижних границ по одному столбцу
+    SQLite берет в диапазон индекса только одну, а вторую проверяет построчно
+    """
+    if start is not None and lower is not None:
+        if from_epoch(lower) >= start:
+            start = None
+        else:
+            lower = None
+    if end is not None and upper is not None:
+        if from_epoch(upper) <= end:
+            end = None
+        else:
+            upper = None
+    return start, end, lower, upper
+
+
+def group_partials(rows: Iterable[Partial], step: int) -> Dict[Tuple[str, int], list]:
+    """Объединить частичные агрегаты по (сервис, интервал step)"""
+    groups: Dict[Tuple[str, int], list] = {}
+    for row in rows:
+        key = (row[0], row[1] // step * step)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = list(row[2:])
+            continue
+        group[0] += row[2]
+        for offset in (1, 4, 7):
+            group[offset] += row[offset + 2]
+            group[offset + 1] = min(group[offset + 1], row[offset + 3])
+            group[offset + 2] = max(group[offset + 2], row[offset + 4])
+    return groups
+
+
+def raw_partials(samples: Iterable[ServerMetrics], step: int) -> List[Partial]:
+    """Частичные агрегаты по сырым сэмплам"""
+    rows = (
+        (m.service_id, to_epoch(m.timestamp), 1,
+         m.cpu_usage, m.cpu_usage, m.cpu_usage,
+         m.ram_usage, m.ram_usage, m.ram_usage,
+         m.disk_usage, m.disk_usage, m.disk_usage)
+        for m in samples
+    )
+    return [(key[0], key[1], *group) for key, group in group_partials(rows, step).items()]
+
+
+def merge_partials(rows: Iterable[Partial], step: int) -> List[ServerMetricsBucket]:
+    """Собрать итоговые интервалы (avg/min/max), новые сначала"""
+    buckets = [
+        ServerMetricsBucket(
+            service_id=service_id,
+            timestamp=from_epoch(bucket),
+            samples=g[0],
+            cpu_usage=g[1] / g[0], cpu_min=g[2], cpu_max=g[3],
+            ram_usage=g[4] / g[0], ram_min=g[5], ram_max=g[6],
+            disk_usage=g[7] / g[0], disk_min=g[8], disk_max=g[9],
+        )
+        for (service_id, bucket), g in group_partials(rows, step).items()
+    ]
+    buckets.sort(key=lambda b: (-to_epoch(b.timestamp), b.service_id))
+    return buckets
+
+
+def bucket_samples(samples: Iterable[ServerMetrics], step: int) -> List[ServerMetricsBucket]:
+    """Агрегация сырых сэмплов по (сервис, интервал step) - аналог GROUP BY в DatabaseStorage"""
+    return merge_partials(raw_partials(samples, step), step)
+
+
+# Время суток для отчета по метрикам: [с, до) по локальным часам, остальное - вечер
+REPORT_PERIODS = {"morning": (6, 12), "lunch": (12, 18)}
+REPORT_STEP = 3600
+
+
+def report_period(hour: int) -> ReportPeriod:
+    for period, (first, last) in REPORT_PERIODS.items():
+        if first <= hour < last:
+            return period
+    return "evening"
+
+
+def report_period_sql(bucket: str) -> str:
+    """То же, что report_period, для SQL-выражения с началом часа в секундах от эпохи"""
+    hour = f"({bucket} / {REPORT_STEP}) % 24"
+    cases = " ".join(
+        f"WHEN {hour} >= {first} AND {hour} < {last} THEN '{period}'"
+        for period, (first, last) in REPORT_PERIODS.items()
+    )
+    return f"CASE {cases} ELSE 'evening' END"
+
+
+def fold_report_partials(rows: Iterable[Partial], services: Iterable[Service]) -> List[MetricsPeriodSummary]:
+    """Свернуть почасовые частичные агрегаты в отчет по времени суток (аналог запроса в DatabaseStorage)"""
+    catalogue = {service.id: service for service in services}
+    groups: Dict[Tuple[str, str], List[float]] = {}
+    for row in rows:
+        if row[0] not in catalogue:
+            continue
+        key = (row[0], report_period(row[1] // REPORT_STEP % 24))
+        group = groups.setdefault(key, [0, 0.0, 0.0, 0.0])
+        group[0] += row[2]
+        group[1] += row[3]
+        group[2] += row[6]
+        group[3] += row[9]
+    return [
+        report_summary(service_id, catalogue[service_id].name, catalogue[service_id].category, period, *group)
+        for (service_id, period), group in groups.items()
+    ]
+
+
+def report_summary(service_id: str, name: str, category: str, period: str, samples: int,
+                   cpu_sum: Optional[float], ram_sum: Optional[float], disk_sum: Optional[float]) -> MetricsPeriodSummary:
+    return MetricsPeriodSummary(
+        service_id=service_id, service_name=name, category=category, period=period, samples=samples,
+        cpu_usage=cpu_sum / samples if cpu_sum is not None else None,
+        ram_usage=ram_sum / samples if ram_sum is not None else None,
+        disk_usage=disk_sum / samples if disk_sum is not None else None,
+    )
+
+
+def encode_cursor(metrics: ServerMetrics) -> str:
+    """Непрозрачный курсор keyset-пагинации: (timestamp, id) последней отданной записи"""
+    raw = f"{metrics.timestamp.isoformat()}|{metrics.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Разобрать курсор, ValueError при неверном формате"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    timestamp, _, metrics_id = raw.partition("|")
+    if not metrics_id:
+        raise ValueError("Invalid cursor")
+    return datetime.fromisoformat(timestamp), metrics_id
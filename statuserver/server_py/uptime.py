@@ -0,0 +1,133 @@
+"""
+Расчет доступности (uptime/SLA) по истории статусов
+История хранит только переходы: запись действует до следующей записи того же сервиса.
+Переходы превращаются в интервалы и раскладываются по суткам. Закрытые сутки хранятся
+готовыми сводками (секунды в каждом статусе), сырая история читается только для краев окна
+"""
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple
+
+from models import Service
+
+DAY = 86400
+
+# Порядок статусов в массиве длительностей
+UPTIME_STATUSES = ("operational", "degraded", "down", "maintenance", "loading")
+_STATUS_INDEX = {status: index for index, status in enumerate(UPTIME_STATUSES)}
+
+# Переход: (service_id, status, секунды от эпохи), отсортированы по сервису и времени
+Transition = Tuple[str, str, int]
+
+UptimeGroup = Literal["service", "category", "region"]
+UPTIME_GROUPS = ("service", "category", "region")
+
+
+def empty_durations() -> List[int]:
+    return [0] * len(UPTIME_STATUSES)
+
+
+def add_durations(target: List[int], durations: Iterable[int]):
+    for index, seconds in enumerate(durations):
+        target[index] += seconds
+
+
+def accumulate_intervals(transitions: Iterable[Transition], start: int, end: int) -> Dict[Tuple[str, int], List[int]]:
+    """
+    Секунды в каждом статусе по (сервис, сутки) внутри [start, end).
+    Для статуса на начало окна в transitions должна быть последняя запись сервиса не позже start;
+    время до первой записи сервиса не учитывается (данных нет)
+    """
+    result: Dict[Tuple[str, int], List[int]] = {}
+
+    def add(service_id: str, status: str, since: int, until: int):
+        index = _STATUS_INDEX.get(status)
+        if index is None:
+            return
+        while since < until:
+            day = since // DAY * DAY
+            boundary = min(until, day + DAY)
+            durations = result.get((service_id, day))
+            if durations is None:
+                durations = result[(service_id, day)] = empty_durations()
+            durations[index] += boundary - since
+            since = boundary
+
+    for service_id, rows in groupby(transitions, key=itemgetter(0)):
+        status = since = None
+        for _, row_status, timestamp in rows:
+            if timestamp <= start:
+                status, since = row_status, start
+                continue
+            if timestamp >= end:
+                break
+            if status is not None:
+                add(service_id, status, since, timestamp)
+            status, since = row_status, timestamp
+        if status is not None:
+            add(service_id, status, since, end)
+    return result
+
+
+def sum_by_service(durations: Dict[Tuple[str, int], List[int]], into: Optional[Dict[str, List[int]]] = None) -> Dict[str, List[int]]:
+    """Сложить посуточные длительности по сервисам"""
+    into = {} if into is None else into
+    for (service_id, _), values in durations.items():
+        add_durations(into.setdefault(service_id, empty_durations()), values)
+    return into
+
+
+def split_window(start: int, end: int, watermark: Optional[int]) -> Tuple[Optional[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Разбить окно [start, end): целые сутки до watermark берутся из сводок,
+    остальное (неполные первые/последние сутки и еще не сведенный хвост) - из сырой истории.
+    Возвращает (диапазон суток для сводок или None, список диапазонов для истории)
+    """
+    full_from = -(-start // DAY) * DAY
+    full_to = min(end // DAY * DAY, watermark if watermark is not None else full_from)
+    if full_to <= full_from:
+        return None, [(start, end)] if end > start else []
+    edges = [(lo, hi) for lo, hi in ((start, full_from), (full_to, end)) if hi > lo]
+    return (full_from, full_to), edges
+
+
+def uptime_summary(durations: List[int]) -> Dict[str, Any]:
+    """
+    Доступность по длительностям статусов. Плановые работы (maintenance) и время без данных
+    от источника (loading) в SLA не учитываются, degraded считается доступным
+    """
+    seconds = dict(zip(UPTIME_STATUSES, durations))
+    available = seconds["operational"] + seconds["degraded"]
+    measured = available + seconds["down"]
+    return {
+        "uptimePercentage": round(available / measured * 100, 4) if measured else None,
+        "measuredSeconds": measured,
+        "downtimeSeconds": seconds["down"],
+        "seconds": seconds,
+    }
+
+
+def group_uptime(by_service: Dict[str, List[int]], services: List[Service], group_by: UptimeGroup = "service") -> List[Dict[str, Any]]:
+    """Доступность по сервисам, категориям или регионам (только сервисы из каталога)"""
+    if group_by == "service":
+        return [
+            {
+                "serviceId": service.id,
+                "name": service.name,
+                "category": service.category,
+                "region": service.region,
+                **uptime_summary(by_service.get(service.id) or empty_durations()),
+            }
+            for service in services
+        ]
+
+    groups: Dict[str, List[int]] = {}
+    counts: Dict[str, int] = {}
+    for service in services:
+        key = getattr(service, group_by)
+        add_durations(groups.setdefault(key, empty_durations()), by_service.get(service.id) or ())
+        counts[key] = counts.get(key, 0) + 1
+    return [
+        {group_by: key, "services": counts[key], **uptime_summary(groups[key])}
+        for key in sorted(groups)
+    ]
@@ -84,4 +84,48 @@ export const serviceSchema = insertServiceSchema.extend({
   id: z.string(),
   updatedAt: z.string().datetime(),
   entityType: z.enum(["server", "service"]).optional(),
-});
\ No newline at end of file
+});
+// Ответ /api/analytics/summary: агрегаты для страницы аналитики
+export interface MetricsMeans {
+  samples: number;
+  cpuUsage: number | null;
+  ramUsage: number | null;
+  diskUsage: number | null;
+  maxCpu: number | null;
+  maxRam: number | null;
+  maxDisk: number | null;
+}
+
+export interface AnalyticsSummary {
+  generatedAt: string;
+  range: { start: string; end: string };
+  services: {
+    total: number;
+    statusCounts: Record<ServiceStatus, number>;
+    operationalPercentage: number;
+    uptimePercentage: number | null;
+    categories: Record<string, Record<ServiceStatus, number> & { total: number; operationalPercentage: number; uptimePercentage: number | null; rolling: MetricsMeans }>;
+    types: Record<string, number>;
+    regions: Record<string, number>;
+  };
+  incidents: {
+    total: number;
+    active: number;
+    bySeverity: Record<IncidentSeverity, number>;
+    mttrMinutes: number;
+    byDay: Array<{ date: string; total: number } & Record<IncidentSeverity, number>>;
+  };
+  metrics: {
+    rollingWindowSeconds: number;
+    rolling: MetricsMeans;
+    range: MetricsMeans;
+    services: Array<MetricsMeans & {
+      serviceId: string;
+      name: string;
+      category: string;
+      status: ServiceStatus;
+      incidents: number;
+      critical: number;
+    }>;
+  };
+}
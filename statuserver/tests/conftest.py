@@ -0,0 +1,69 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Модули сервера импортируются по имени, как при запуске из server_py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "server_py"))
+
+# Глобальное хранилище создается при импорте storage - уводим его во временный каталог,
+# а Metrics API - на адрес, который не отвечает
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="statuserver-tests-"), "services.db"))
+os.environ.setdefault("METRICS_API_URL", "http://127.0.0.1:1")
+
+from db_storage import DatabaseStorage  # noqa: E402
+from storage import MemStorage  # noqa: E402
+
+
+@pytest.fixture
+def db_storage(tmp_path):
+    storage = DatabaseStorage(str(tmp_path / "services.db"))
+    yield storage
+    storage.close()
+
+
+@pytest.fixture(params=["memory", "database"])
+def any_storage(request, tmp_path):
+    """Оба хранилища: поведение должно совпадать"""
+    if request.param == "memory":
+        yield MemStorage()
+        return
+    storage = DatabaseStorage(str(tmp_path / "services.db"))
+    yield storage
+    storage.close()
+
+
+class FakeClock:
+    """Виртуальное монотонное время: sleep сдвигает его мгновенно"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def columnar_storage(tmp_path):
+    from columnar_storage import ColumnarStorage
+
+    storage = ColumnarStorage(str(tmp_path / "services.db"))
+    yield storage
+    storage.close()
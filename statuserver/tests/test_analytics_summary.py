@@ -0,0 +1,53 @@
+import asyncio
+from datetime import date, datetime, time, timedelta
+
+import httpx
+
+import main
+import routes
+from config import config
+from models import InsertService, InsertStatusHistory
+from services_snapshot import services_snapshot
+
+
+def get_summary(params) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://statuserver") as http:
+            return await http.get("/api/analytics/summary", params=params)
+
+    return asyncio.run(run())
+
+
+def test_summary_uptime_is_computed_for_the_requested_days(any_storage, monkeypatch):
+    monkeypatch.setattr(routes, "storage", any_storage)
+    yesterday = date.today() - timedelta(days=1)
+    midnight = datetime.combine(yesterday, time())
+
+    async def scenario():
+        stable = await any_storage.create_service(InsertService(name="stable", category="Infrastructure", region="Production"))
+        flaky = await any_storage.create_service(InsertService(name="flaky", category="Infrastructure", region="Production"))
+        # Вчера: stable весь день работал, flaky с полудня лежал
+        for service_id, status, moment in (
+            (stable.id, "operational", midnight),
+            (flaky.id, "operational", midnight),
+            (flaky.id, "down", midnight + timedelta(hours=12)),
+        ):
+            await any_storage.create_status_history(InsertStatusHistory(serviceId=service_id, status=status, timestamp=moment))
+        # Сейчас оба работают
+        services_snapshot.publish(await any_storage.get_services(), "storage")
+
+    asyncio.run(scenario())
+    response = get_summary({"start": yesterday.isoformat(), "end": yesterday.isoformat()})
+    assert response.status_code == 200
+    services = response.json()["services"]
+
+    assert services["operationalPercentage"] == 100.0
+    assert services["uptimePercentage"] == 75.0
+    assert services["categories"]["Infrastructure"]["uptimePercentage"] == 75.0
+
+
+def test_summary_range_entirely_before_retention_is_rejected():
+    end = date.today() - timedelta(days=config.ANALYTICS_RETENTION_DAYS + 5)
+    response = get_summary({"start": (end - timedelta(days=3)).isoformat(), "end": end.isoformat()})
+    assert response.status_code == 400
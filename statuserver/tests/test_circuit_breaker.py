@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+
+from circuit_breaker import CircuitBreaker
+from metrics_api_client import MetricsAPIClient
+
+COOLDOWN = 30
+
+
+class StubMetricsAPI:
+    """Заглушка Metrics API: отвечает по очереди заданными кодами, "error" - обрыв соединения"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        outcome = self.outcomes.pop(0)
+        if outcome == "error":
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(outcome, json={"available": outcome == 200})
+
+
+def run_with_stub(clock, stub, scenario):
+    async def run():
+        breaker = CircuitBreaker("Metrics API", failure_threshold=2, cooldown=COOLDOWN, clock=clock)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(stub)) as http:
+            client = MetricsAPIClient(base_url="http://metrics.test", client=http, breaker=breaker)
+            await scenario(client, breaker)
+
+    asyncio.run(run())
+
+
+def test_closed_open_half_open_closed(clock):
+    stub = StubMetricsAPI(200, 500, "error", 200)
+
+    async def scenario(client, breaker):
+        assert await client.check_availability()
+        assert breaker.state == "closed" and client.is_available
+
+        # Первая ошибка: цепь еще закрыта, но источник уже не считается здоровым
+        assert not await client.check_availability()
+        assert breaker.state == "closed" and not client.is_available
+
+        # Вторая ошибка подряд открывает цепь, запросы к API больше не уходят
+        assert not await client.check_availability()
+        assert breaker.state == "open"
+        assert not await client.check_availability()
+        assert stub.requests == 3
+        assert breaker.stats()["retryIn"] == COOLDOWN
+
+        clock.advance(COOLDOWN - 1)
+        assert breaker.state == "open"
+        clock.advance(1)
+        assert breaker.state == "half_open"
+
+        # Успешный пробный запрос закрывает цепь
+        assert await client.check_availability()
+        assert stub.requests == 4
+        assert breaker.state == "closed" and client.is_available
+        assert breaker.stats() == {"state": "closed", "failures": 0, "retryIn": None}
+
+    run_with_stub(clock, stub, scenario)
+
+
+def test_failed_probe_reopens_for_full_cooldown(clock):
+    stub = StubMetricsAPI(503, 503, 503, 200)
+
+    async def scenario(client, breaker):
+        await client.check_availability()
+        await client.check_availability()
+        assert breaker.state == "open"
+
+        clock.advance(COOLDOWN)
+        assert not await client.check_availability()
+        assert breaker.state == "open"
+        assert breaker.stats()["retryIn"] == COOLDOWN
+
+        # Пока пауза после неудачной пробы не истекла, запросы не отправляются
+        clock.advance(COOLDOWN / 2)
+        assert not await client.check_availability()
+        assert stub.requests == 3
+
+        clock.advance(COOLDOWN / 2)
+        assert await client.check_availability()
+        assert breaker.state == "closed"
+
+    run_with_stub(clock, stub, scenario)
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker("Metrics API", failure_threshold=1, cooldown=COOLDOWN, clock=clock)
+    breaker.record_failure()
+    clock.advance(COOLDOWN)
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # Зависшая проба не блокирует цепь дольше паузы
+    clock.advance(COOLDOWN)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == "closed"
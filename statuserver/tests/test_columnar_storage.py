@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+from datetime import datetime
+
+from columnar_storage import ColumnarStorage, to_micros
+from models import InsertServerMetrics
+
+
+def samples(count: int, cpu: float):
+    return [
+        InsertServerMetrics(serviceId=f"service-{i % 3}", cpuUsage=cpu + i, ramUsage=50.0, diskUsage=60.0)
+        for i in range(count)
+    ]
+
+
+def read_all_pages(storage, limit: int):
+    """Все сэмплы постранично по keyset-курсору (timestamp, id) последней записи"""
+    async def pages():
+        result, cursor = [], None
+        while True:
+            page = await storage.get_server_metrics(limit=limit, cursor=cursor, use_cache=False)
+            if not page:
+                return result
+            result.extend(page)
+            cursor = (page[-1].timestamp, page[-1].id)
+
+    return asyncio.run(pages())
+
+
+def test_sample_ids_survive_deletes_and_vacuum(columnar_storage):
+    async def write():
+        return [await columnar_storage.create_server_metrics_bulk(samples(5, cpu)) for cpu in (10.0, 20.0, 30.0)]
+
+    first, second, third = asyncio.run(write())
+    assert len({sample.id for sample in first + second + third}) == 15
+
+    # Пропуски в id, как после удаления устаревших сэмплов, затем VACUUM
+    deleted = [int(sample.id) for sample in first + second[:2]]
+    columnar_storage._executor.write_sync(
+        lambda conn: conn.executemany("DELETE FROM metric_samples WHERE id = ?", [(i,) for i in deleted])
+    )
+    columnar_storage._executor.write_sync(lambda conn: conn.execute("VACUUM"))
+
+    kept = {sample.id: sample.cpu_usage for sample in second[2:] + third}
+    stored = asyncio.run(columnar_storage.get_server_metrics(use_cache=False))
+    assert {sample.id: sample.cpu_usage for sample in stored} == kept
+
+    paged = read_all_pages(columnar_storage, limit=4)
+    assert [sample.id for sample in paged] == [sample.id for sample in stored]
+
+
+def test_bulk_insert_continues_after_existing_ids(columnar_storage):
+    async def write():
+        first = await columnar_storage.create_server_metrics_bulk(samples(3, 10.0))
+        second = await columnar_storage.create_server_metrics_bulk(samples(2, 20.0))
+        return first, second
+
+    first, second = asyncio.run(write())
+    assert [int(sample.id) for sample in first + second] == [1, 2, 3, 4, 5]
+
+
+def test_implicit_rowid_table_is_migrated_with_same_ids(tmp_path):
+    path = str(tmp_path / "services.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE metric_series (id INTEGER PRIMARY KEY, service_id TEXT NOT NULL UNIQUE)")
+    conn.execute("CREATE TABLE metric_samples (series INTEGER NOT NULL, ts INTEGER NOT NULL, cpu_usage REAL, ram_usage REAL, disk_usage REAL)")
+    conn.execute("INSERT INTO metric_series (id, service_id) VALUES (1, 'service')")
+    conn.executemany(
+        "INSERT INTO metric_samples (rowid, series, ts, cpu_usage, ram_usage, disk_usage) VALUES (?, 1, ?, ?, 0, 0)",
+        [(rowid, to_micros(datetime(2026, 1, 1, 0, rowid)), float(rowid)) for rowid in (3, 7, 42)]
+    )
+    conn.commit()
+    conn.close()
+
+    storage = ColumnarStorage(path)
+    try:
+        stored = asyncio.run(storage.get_server_metrics(use_cache=False))
+        assert [(sample.id, sample.cpu_usage) for sample in stored] == [("42", 42.0), ("7", 7.0), ("3", 3.0)]
+        created = asyncio.run(storage.create_server_metrics_bulk(samples(1, 10.0)))
+        assert created[0].id == "43"
+    finally:
+        storage.close()
@@ -0,0 +1,45 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from compression import CompressionMiddleware
+
+MINIMUM_SIZE = 500
+
+
+def make_app() -> Starlette:
+    async def small(request):
+        return PlainTextResponse("ok")
+
+    async def large(request):
+        return PlainTextResponse("x" * MINIMUM_SIZE * 4, headers={"Vary": "Origin"})
+
+    app = Starlette(routes=[Route("/small", small), Route("/large", large)])
+    app.add_middleware(CompressionMiddleware, minimum_size=MINIMUM_SIZE)
+    return app
+
+
+def fetch(path: str, accept_encoding: str) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=make_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+    return asyncio.run(run())
+
+
+def test_vary_is_sent_for_compressed_and_uncompressed_responses():
+    compressed = fetch("/large", "gzip")
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Origin, Accept-Encoding"
+
+    below_threshold = fetch("/small", "gzip")
+    assert "content-encoding" not in below_threshold.headers
+    assert below_threshold.headers["vary"] == "Accept-Encoding"
+
+    identity = fetch("/large", "identity")
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["vary"] == "Origin, Accept-Encoding"
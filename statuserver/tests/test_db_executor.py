@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+
+import main
+from models import InsertService
+
+# Чтение не ждет писателя: с запасом на медленную машину, но много меньше удержания записи
+READ_BOUND_SECONDS = 0.5
+WRITER_HOLD_SECONDS = 5
+
+# Большая выборка метрик: ее чтение заметно дольше любого отдельного запроса к API
+LARGE_READ_ROWS = 80000
+# Запрос к /api/services за время большого чтения может подождать GIL потока-читателя,
+# но не само чтение целиком
+LATENCY_ALLOWANCE_SECONDS = 0.1
+
+
+def test_read_is_not_blocked_by_busy_writer(db_storage):
+    release = threading.Event()
+    writer_holds_lock = threading.Event()
+
+    def long_write(conn):
+        # Открытая транзакция с записью держит блокировку писателя SQLite до выхода из задачи
+        conn.execute("UPDATE services SET status = status")
+        writer_holds_lock.set()
+        release.wait(WRITER_HOLD_SECONDS)
+
+    async def scenario():
+        await db_storage.create_service(InsertService(name="API", category="Web", region="Prod"))
+        write = asyncio.ensure_future(db_storage._executor.write(long_write))
+        try:
+            assert await asyncio.to_thread(writer_holds_lock.wait, WRITER_HOLD_SECONDS)
+
+            # Следующая запись встает в очередь за занятым писателем
+            queued_write = asyncio.ensure_future(
+                db_storage.create_service(InsertService(name="Queued", category="Web", region="Prod"))
+            )
+
+            # Чтение мимо кэша запросов - прямо в пул читателей
+            started = time.perf_counter()
+            services = await asyncio.wait_for(db_storage.get_services_page(10), READ_BOUND_SECONDS)
+            elapsed = time.perf_counter() - started
+
+            assert not write.done() and not queued_write.done()
+        finally:
+            release.set()
+            await write
+        await queued_write
+        return services, elapsed
+
+    services, elapsed = asyncio.run(scenario())
+    assert [service.name for service in services] == ["API"]
+    assert elapsed < READ_BOUND_SECONDS
+
+
+def p99(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))]
+
+
+def fill_metrics(storage, rows: int):
+    now = datetime.now()
+    storage._executor.write_sync(lambda conn: conn.executemany(
+        "INSERT INTO server_metrics (id, service_id, cpu_usage, ram_usage, disk_usage, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (str(uuid.uuid4()), f"service-{i % 50}", 40.0, 50.0, 60.0, (now - timedelta(seconds=i)).isoformat())
+            for i in range(rows)
+        )
+    ))
+
+
+async def probe_latencies(http: httpx.AsyncClient, count: int = None, until: asyncio.Future = None):
+    """Задержки запросов к /api/services и тиков event loop (запросы идут по одному)"""
+    requests, ticks = [], []
+    while (count is None or len(requests) < count) and (until is None or not until.done()):
+        started = time.perf_counter()
+        await asyncio.sleep(0)
+        ticks.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        response = await http.get("/api/services")
+        requests.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    return requests, ticks
+
+
+def test_services_latency_flat_during_large_metrics_read(db_storage):
+    fill_metrics(db_storage, LARGE_READ_ROWS)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://statuserver") as http:
+            await probe_latencies(http, count=20)
+            baseline, baseline_ticks = await probe_latencies(http, count=100)
+
+            started = time.perf_counter()
+            read = asyncio.ensure_future(db_storage.get_server_metrics(use_cache=False))
+            during, during_ticks = await probe_latencies(http, until=read)
+            rows = await read
+            return baseline, baseline_ticks, during, during_ticks, len(rows), time.perf_counter() - started
+
+    baseline, baseline_ticks, during, during_ticks, rows, read_seconds = asyncio.run(scenario())
+    assert rows == LARGE_READ_ROWS
+
+    # Чтение в event loop заблокировало бы его целиком: ни одного ответа до конца выборки
+    assert len(during) >= 10
+    assert p99(during) < p99(baseline) + LATENCY_ALLOWANCE_SECONDS
+    assert p99(during_ticks) < p99(baseline_ticks) + LATENCY_ALLOWANCE_SECONDS
+    assert max(during) < read_seconds / 2
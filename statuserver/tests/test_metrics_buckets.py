@@ -0,0 +1,19 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+MINUTE = 60
+
+
+def test_sample_at_end_of_second_stays_in_its_bucket(db_storage):
+    minute = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=5)
+    timestamps = [minute, minute + timedelta(seconds=59, microseconds=999999)]
+    db_storage._executor.write_sync(lambda conn: conn.executemany(
+        "INSERT INTO server_metrics (id, service_id, cpu_usage, ram_usage, disk_usage, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+        [(str(uuid.uuid4()), "service", 10.0, 20.0, 30.0, timestamp.isoformat()) for timestamp in timestamps]
+    ))
+
+    buckets = asyncio.run(db_storage.get_server_metrics_buckets(
+        MINUTE, start=minute - timedelta(minutes=1), end=minute + timedelta(minutes=2), use_cache=False
+    ))
+    assert [(bucket.timestamp, bucket.samples) for bucket in buckets] == [(minute, 2)]
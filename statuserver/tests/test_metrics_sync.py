@@ -0,0 +1,117 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import main
+import routes
+from analytics import analytics
+from metrics_api_client import MetricsAPIClient
+
+
+def api_response(cpu: float):
+    return [
+        {"server_name": "Main DB", "cpu_usage": cpu, "memory_usage": 40.0, "disk_usage": 50.0},
+        {"server_name": "Auth SSO", "cpu_usage": cpu + 10, "memory_usage": 30.0, "disk_usage": 20.0},
+    ]
+
+
+def stub_metrics_api(monkeypatch, storage, *responses):
+    """Циклы синхронизации main.sync_metrics_api получают responses по очереди"""
+    client = MetricsAPIClient(base_url="http://metrics.test")
+    responses = iter(responses)
+
+    async def get_all_servers_metrics():
+        client.breaker.record_success()
+        return next(responses)
+
+    monkeypatch.setattr(client, "get_all_servers_metrics", get_all_servers_metrics)
+    monkeypatch.setattr(main, "metrics_client", client)
+    monkeypatch.setattr(main, "storage", storage)
+    monkeypatch.setattr(routes, "storage", storage)
+    monkeypatch.setattr(main, "storage_service_ids", {})
+
+
+def test_synced_metrics_are_in_report(any_storage, monkeypatch):
+    stub_metrics_api(monkeypatch, any_storage, api_response(10.0), api_response(30.0))
+
+    async def scenario():
+        assert await main.sync_metrics_api()
+        assert await main.sync_metrics_api()
+        now = datetime.now()
+        return (
+            await any_storage.get_services(),
+            await any_storage.get_server_metrics(),
+            await any_storage.get_metrics_report(now - timedelta(hours=1), now + timedelta(minutes=1)),
+        )
+
+    services, metrics, report = asyncio.run(scenario())
+    stored_ids = {service.name: service.id for service in services}
+    assert set(stored_ids) == {"Main DB", "Auth SSO"}
+
+    # Сэмплы записаны под id сервиса в хранилище, а не под id из Metrics API
+    assert {sample.service_id for sample in metrics} == set(stored_ids.values())
+    assert len(metrics) == 4
+
+    by_service = {}
+    for summary in report:
+        entry = by_service.setdefault(summary.service_name, [0, 0.0])
+        entry[0] += summary.samples
+        entry[1] += summary.cpu_usage * summary.samples
+    assert by_service.keys() == {"Main DB", "Auth SSO"}
+    assert by_service["Main DB"][0] == 2
+    assert by_service["Main DB"][1] / 2 == 20.0
+    assert by_service["Auth SSO"][1] / 2 == 30.0
+    assert {summary.service_id for summary in report} == set(stored_ids.values())
+
+
+def test_snapshot_and_samples_share_service_ids(any_storage, monkeypatch):
+    stub_metrics_api(monkeypatch, any_storage, api_response(10.0), api_response(30.0))
+
+    async def scenario():
+        assert await main.sync_metrics_api()
+        assert await main.sync_metrics_api()
+
+    asyncio.run(scenario())
+    client = TestClient(main.app)
+    services = client.get("/api/services").json()
+    service_ids = {service["id"] for service in services}
+    assert {service["name"] for service in services} == {"Main DB", "Auth SSO"}
+    assert service_ids == {service.id for service in asyncio.run(any_storage.get_services())}
+
+    metrics = client.get("/api/server-metrics").json()
+    assert {sample["serviceId"] for sample in metrics} == service_ids
+    for service_id in service_ids:
+        assert len(client.get("/api/server-metrics", params={"serviceId": service_id}).json()) == 2
+
+    rows = analytics.summary(date.today(), date.today(), {})["metrics"]["services"]
+    assert {row["serviceId"] for row in rows} == service_ids
+    assert all(row["samples"] >= 2 for row in rows)
+
+
+def test_failed_service_write_is_retried_next_cycle(any_storage, monkeypatch):
+    stub_metrics_api(monkeypatch, any_storage, api_response(10.0), api_response(30.0))
+    create_service = any_storage.create_service
+    failures = []
+
+    async def flaky_create_service(insert_service):
+        if not failures:
+            failures.append(insert_service.name)
+            raise RuntimeError("database is locked")
+        return await create_service(insert_service)
+
+    monkeypatch.setattr(any_storage, "create_service", flaky_create_service)
+
+    async def scenario():
+        try:
+            await main.sync_metrics_api()
+        except RuntimeError:
+            pass
+        # Diff уже считает оба сервера известными - запись должна восстановиться
+        assert await main.sync_metrics_api()
+        return await any_storage.get_services(), await any_storage.get_server_metrics()
+
+    services, metrics = asyncio.run(scenario())
+    assert failures == ["Main DB"]
+    assert {service.name for service in services} == {"Main DB", "Auth SSO"}
+    assert {sample.service_id for sample in metrics} == {service.id for service in services}
@@ -0,0 +1,61 @@
+import asyncio
+
+from scheduler import SyncScheduler
+
+INTERVAL = 10
+MAX_BACKOFF = 60
+
+
+def run_job(clock, outcomes, **options):
+    """Запустить задачу в планировщике с виртуальным временем; время каждого запуска"""
+    scheduler = SyncScheduler(clock=clock, sleep=clock.sleep)
+    starts = []
+
+    async def func():
+        starts.append(clock())
+        outcome = outcomes[len(starts) - 1]
+        if len(starts) == len(outcomes):
+            done.set()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def run():
+        job = scheduler.add_job("metrics_api", func, interval=INTERVAL, jitter=0, max_backoff=MAX_BACKOFF, **options)
+        scheduler.start()
+        await done.wait()
+        await scheduler.stop()
+        return job
+
+    done = asyncio.Event()
+    job = asyncio.run(run())
+    return job, [later - earlier for earlier, later in zip(starts, starts[1:])]
+
+
+def test_backoff_doubles_until_max_and_resets_on_success(clock):
+    outcomes = [False, RuntimeError("connection refused"), False, False, True, None, True]
+    job, gaps = run_job(clock, outcomes)
+
+    assert gaps == [20, 40, 60, 60, 10, 10]
+    assert job.failures == 4
+    assert job.consecutive_failures == 0
+    assert job.current_interval() == INTERVAL
+    assert job.last_error is None
+
+
+def test_failure_reason_is_kept_in_stats(clock):
+    job, gaps = run_job(clock, [True, RuntimeError("connection refused")])
+
+    assert gaps == [10]
+    assert job.runs == 2
+    assert job.consecutive_failures == 1
+    assert job.last_error == "connection refused"
+    assert job.stats()["currentInterval"] == 20
+
+
+def test_initial_delay_is_respected(clock):
+    job, gaps = run_job(clock, [True, True], initial_delay=5)
+
+    assert gaps == [10]
+    assert clock.sleeps[:2] == [5, 10]
+    assert job.last_lag == 0
@@ -0,0 +1,23 @@
+import asyncio
+
+from models import InsertService
+
+
+def test_status_update_bumps_versions_only_on_change(any_storage):
+    async def scenario():
+        service = await any_storage.create_service(InsertService(name="API", category="Web", region="Prod", status="operational"))
+        before = any_storage.versions.etag("services")
+
+        await any_storage.update_service_status(service.id, "operational")
+        unchanged = any_storage.versions.etag("services")
+
+        await any_storage.update_service_status(service.id, "down")
+        changed = any_storage.versions.etag("services")
+
+        await any_storage.update_service_status("missing", "down")
+        return before, unchanged, changed, any_storage.versions.etag("services")
+
+    before, unchanged, changed, missing = asyncio.run(scenario())
+    assert unchanged == before
+    assert changed != before
+    assert missing == changed